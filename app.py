@@ -1,24 +1,32 @@
-from flask import render_template, Flask, request, flash, redirect, url_for, session
+from flask import render_template, Flask, request, flash, redirect, url_for, session, jsonify, Response, make_response
 from flask_wtf.csrf import CSRFProtect
 from models.user import User
 from models.patient import Patient
-from init_db import init_database
+from models.patient_aggregate import load_patient_aggregate
+from models.patient_export import EXPORT_FORMATS, export_records
+from models.patient_import import import_csv
+from init_db import ensure_database
 from utils.decorators import auth_required, admin_required, doctor_required
 from utils.patient_utils import validate_patient, get_user_role
-from utils.mongo_validation import validate_allergy, validate_assessment
-from models.mongo.allergy_model import (get_allergies_by_patient_id, create_allergy, 
-                                        get_allergy_by_id, update_allergy, delete_allergy)
-from models.mongo.assessment_model import get_assessments_by_patient_id, create_assessment
+from utils.identity import load_user
+from utils.password_hashing import HashingBusy
+from utils.mongo_validation import SEVERITIES, validate_allergy, validate_assessment
+from models.mongo.allergy_model import create_allergy, get_allergy_by_id, update_allergy, delete_allergy
+from models.mongo.assessment_model import create_assessment
+from models.mongo.summary_model import get_clinical_summaries
 from config import Config
+from utils.metrics import instrument_app, render_prometheus
+from utils.http_cache import conditional, init_static_caching
+from utils.compression import init_compression
+from utils.streaming import stream_page
+from utils.routes import RouteTable
+from models import audit, versions
 import re
 
-app = Flask(__name__)
-app.secret_key = Config.SECRET_KEY
+# Routes are collected here and added to each app create_app() builds
+views = RouteTable()
 
-# Initialize CSRF protection
-csrf = CSRFProtect(app)
-
-init_database()
+csrf = CSRFProtect()
 
 def get_current_user():
     """Return the logged-in User object or None."""
@@ -26,33 +34,29 @@ def get_current_user():
     if not user_id:
         return None
     try:
-        # adjust method name if your User model uses a different finder
-        return User.get_user_by_id(user_id)
+        return load_user(user_id)
     except Exception:
         return None
 
-@app.context_processor
+@views.context_processor
 def inject_user():
-    if 'user_id' in session:
-        user = User.get_user_by_id(session['user_id'])
-        return dict(current_user=user)
-    return dict(current_user=None)
+    return dict(current_user=get_current_user())
 
-@app.route('/')
+@views.route('/')
 def home():
     """Render the home page."""
     return render_template('home.html')
 
 # Route for about page
 
-@app.route('/about')
+@views.route('/about')
 def about():
     """Render the about page."""
     return render_template('about.html')
 
 # Route for login page
 
-@app.route('/login', methods=['GET', 'POST'])
+@views.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         try:
@@ -71,6 +75,9 @@ def login():
             else:
                 raise ValueError('Invalid email or password')
                 
+        except HashingBusy as e:
+            flash(f'Login failed: {str(e)}', 'warning')
+            return render_template('login.html'), 503
         except Exception as e:
             flash(f'Login failed: {str(e)}', 'danger')
             return render_template('login.html')
@@ -79,7 +86,7 @@ def login():
 
 # Route for registration page
 
-@app.route('/register', methods=['GET', 'POST'])
+@views.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         try:
@@ -120,16 +127,110 @@ def register():
 
 # Route for patient management dashboard
 
-@app.route('/patient-management')
+def listing_args():
+    sort = request.args.get('sort', 'id')
+    direction = request.args.get('dir', 'asc')
+    per_page = request.args.get('per_page', Config.PATIENTS_PER_PAGE, type=int)
+    per_page = max(1, min(per_page, Config.PATIENTS_MAX_PER_PAGE))
+    return dict(sort=sort, direction=direction, after=request.args.get('after'),
+                before=request.args.get('before'), limit=per_page)
+
+def listing_summaries(patients):
+    """Clinical badges for one page of patients; None if Mongo failed."""
+    try:
+        return get_clinical_summaries([p.id for p in patients])
+    except Exception as e:
+        print(f"[summary] Failed to load clinical summaries: {e}")
+        return None
+
+def render_listing(args, page, total_patients, summaries):
+    patients, next_cursor, prev_cursor = page
+    response = stream_page('patient_management.html', patients=patients,
+                           user_role=get_user_role(session['user_id']),
+                           sort=args['sort'], direction=args['direction'], per_page=args['limit'],
+                           next_cursor=next_cursor, prev_cursor=prev_cursor,
+                           total_patients=total_patients, summaries=summaries or {})
+    if summaries is None:
+        # A page without its badges must not be revalidated as current
+        response.cache_control.no_store = True
+    return response
+
+# The badges come from allergies and assessments, so their writes count too
+LISTING_SCOPES = [versions.PATIENTS, versions.ALLERGIES, versions.ASSESSMENTS]
+
+@views.route('/patient-management')
 @auth_required
+@conditional(lambda: LISTING_SCOPES)
 def patient_managment():
-    user_role = get_user_role(session['user_id'])
-    patients = Patient.get_all_patients()
-    return render_template('patient_management.html', patients=patients, user_role=user_role)
+    args = listing_args()
+    try:
+        page = Patient.get_patients_page(**args)
+    except ValueError as e:
+        flash(f'{str(e)}, showing the first page', 'warning')
+        return redirect(url_for('patient_managment'))
+    return render_listing(args, page, Patient.count_patients(), listing_summaries(page[0]))
+
+# Route for patient search (type-ahead)
+
+def search_args():
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), Config.PATIENTS_MAX_PER_PAGE))
+    return query, page, per_page
+
+def search_response(query, page, patients, has_more):
+    return jsonify(
+        query=query,
+        page=page,
+        next_page=page + 1 if has_more else None,
+        results=[{
+            'id': p.id,
+            'first_name': p.first_name,
+            'last_name': p.last_name,
+            'email': p.email,
+            'gender': p.gender,
+        } for p in patients],
+    )
+
+@views.route('/search-patients')
+@auth_required
+def search_patients():
+    query, page, per_page = search_args()
+    patients, has_more = Patient.search_patients(query, limit=per_page, offset=(page - 1) * per_page)
+    return search_response(query, page, patients, has_more)
+
+# Route for per-patient clinical summaries (one aggregate for all ids)
+
+@views.route('/clinical-summary')
+@auth_required
+@conditional(lambda: [versions.ALLERGIES, versions.ASSESSMENTS])
+def clinical_summary():
+    try:
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+    except ValueError:
+        return jsonify(error='ids must be a comma-separated list of patient ids'), 400
+    if not ids or len(ids) > Config.PATIENTS_MAX_PER_PAGE:
+        return jsonify(error=f'Pass between 1 and {Config.PATIENTS_MAX_PER_PAGE} patient ids'), 400
+    summaries = get_clinical_summaries(ids)
+    return jsonify(summaries={str(pid): summary for pid, summary in summaries.items()})
+
+# Route for the stroke-risk analytics dashboard
+
+@views.route('/analytics')
+@admin_required
+def analytics():
+    # NumPy is only loaded once someone opens the dashboard
+    from models.mongo.analytics_model import get_dashboard, FIELD_LABELS
+    try:
+        summary = get_dashboard()
+    except Exception as e:
+        flash(f'Failed to load analytics: {str(e)}', 'danger')
+        return redirect(url_for('patient_managment'))
+    return render_template('analytics.html', summary=summary, field_labels=FIELD_LABELS)
 
 # Route to add a new patient
 
-@app.route('/add-patient', methods=['POST'])
+@views.route('/add-patient', methods=['POST'])
 @admin_required
 def add_patient():
     try:
@@ -150,22 +251,33 @@ def add_patient():
 
 # Route to edit a patient
 
-@app.route('/edit-patient/<int:patient_id>')
+@views.route('/edit-patient/<int:patient_id>')
 @doctor_required
+@conditional(lambda patient_id: [versions.patient_scope(patient_id)])
 def edit_patient(patient_id):
-    patient = Patient.get_patient_by_id(patient_id)
-    if not patient:
+    try:
+        aggregate = load_patient_aggregate(patient_id)
+    except Exception as e:
+        # The patient row itself failed or timed out; Mongo failures still render
+        flash(f'Failed to load patient: {str(e) or "timed out"}', 'danger')
+        return redirect(url_for('patient_managment'))
+    if not aggregate.patient:
         flash('Patient not found', 'danger')
         return redirect(url_for('patient_managment'))
-    
-    allergies = get_allergies_by_patient_id(patient_id)
-    assessments = get_assessments_by_patient_id(patient_id)
-    
-    return render_template('edit_patient.html', patient=patient, allergies=allergies, assessments=assessments)
+    return render_patient_page(aggregate)
+
+def render_patient_page(aggregate):
+    response = make_response(render_template(
+        'edit_patient.html', patient=aggregate.patient, allergies=aggregate.allergies,
+        assessments=aggregate.assessments, timings=aggregate.timings, load_errors=aggregate.errors))
+    if aggregate.errors:
+        # A partial page must not be revalidated as current
+        response.cache_control.no_store = True
+    return response
 
 # Route to update a patient
 
-@app.route('/update-patient/<int:patient_id>', methods=['POST'])
+@views.route('/update-patient/<int:patient_id>', methods=['POST'])
 @doctor_required
 def update_patient(patient_id):
     try:
@@ -185,7 +297,7 @@ def update_patient(patient_id):
 
 # Route to delete a patient
 
-@app.route('/delete-patient/<int:patient_id>', methods=['POST'])
+@views.route('/delete-patient/<int:patient_id>', methods=['POST'])
 @admin_required
 def delete_patient(patient_id):
     try:
@@ -195,7 +307,24 @@ def delete_patient(patient_id):
         flash(f'Failed to delete patient: {str(e)}', 'danger')
     return redirect(url_for('patient_managment'))
 
-@app.route('/add-allergy/<int:patient_id>', methods=['POST'])
+# Modal bodies, fetched by the shared modal when a row action is opened
+
+PATIENT_MODALS = {'delete': 'modals/delete_patient.html'}
+ALLERGY_MODALS = {'edit': 'modals/edit_allergy.html', 'delete': 'modals/delete_allergy.html'}
+
+def modal_not_found(message):
+    return render_template('modals/not_found.html', message=message), 404
+
+@views.route('/patient-modal/<int:patient_id>/<action>')
+@admin_required
+@conditional(lambda patient_id, action: [versions.patient_scope(patient_id)])
+def patient_modal(patient_id, action):
+    patient = Patient.get_patient_by_id(patient_id)
+    if action not in PATIENT_MODALS or not patient:
+        return modal_not_found('This patient no longer exists.')
+    return render_template(PATIENT_MODALS[action], patient=patient)
+
+@views.route('/add-allergy/<int:patient_id>', methods=['POST'])
 @doctor_required
 def add_allergy(patient_id):
     try:
@@ -210,7 +339,7 @@ def add_allergy(patient_id):
         flash(f'Failed to add allergy: {str(e)}', 'danger')
     return redirect(url_for('edit_patient', patient_id=patient_id))
 
-@app.route('/update-allergy/<int:patient_id>/<allergy_id>', methods=['POST'])
+@views.route('/update-allergy/<int:patient_id>/<allergy_id>', methods=['POST'])
 @doctor_required
 def update_allergy_route(patient_id, allergy_id):
     try:
@@ -225,21 +354,37 @@ def update_allergy_route(patient_id, allergy_id):
         flash(f'Failed to update allergy: {str(e)}', 'danger')
     return redirect(url_for('edit_patient', patient_id=patient_id))
 
-@app.route('/delete-allergy/<int:patient_id>/<allergy_id>', methods=['POST'])
+@views.route('/delete-allergy/<int:patient_id>/<allergy_id>', methods=['POST'])
 @doctor_required
 def delete_allergy_route(patient_id, allergy_id):
     try:
-        delete_allergy(allergy_id)
+        if not delete_allergy(allergy_id, patient_id):
+            raise ValueError('allergy not found for this patient')
         flash('Allergy deleted successfully', 'success')
     except Exception as e:
         flash(f'Failed to delete allergy: {str(e)}', 'danger')
     return redirect(url_for('edit_patient', patient_id=patient_id))
 
-@app.route('/add-assessment/<int:patient_id>', methods=['POST'])
+@views.route('/allergy-modal/<int:patient_id>/<allergy_id>/<action>')
+@doctor_required
+@conditional(lambda patient_id, allergy_id, action: [versions.patient_scope(patient_id)])
+def allergy_modal(patient_id, allergy_id, action):
+    from bson.errors import InvalidId
+    try:
+        allergy = get_allergy_by_id(allergy_id)
+    except InvalidId:
+        allergy = None
+    if action not in ALLERGY_MODALS or not allergy or allergy['patient_id'] != patient_id:
+        return modal_not_found('This allergy no longer exists.')
+    return render_template(ALLERGY_MODALS[action], allergy=allergy, patient_id=patient_id,
+                           severities=SEVERITIES)
+
+@views.route('/add-assessment/<int:patient_id>', methods=['POST'])
 @doctor_required
 def add_assessment(patient_id):
     try:
         hypertension = request.form.get('hypertension', '').strip()
+        heart_disease = request.form.get('heart_disease', '').strip()
         ever_married = request.form.get('ever_married', '').strip()
         work_type = request.form.get('work_type', '').strip()
         residence_type = request.form.get('residence_type', '').strip()
@@ -248,26 +393,119 @@ def add_assessment(patient_id):
         smoking_status = request.form.get('smoking_status', '').strip()
         stroke = request.form.get('stroke', '').strip()
         
-        validate_assessment(hypertension, ever_married, work_type, residence_type, 
+        validate_assessment(hypertension, heart_disease, ever_married, work_type, residence_type, 
                           avg_glucose_level, bmi, smoking_status, stroke)
-        create_assessment(patient_id, hypertension, ever_married, work_type, residence_type, 
+        create_assessment(patient_id, hypertension, heart_disease, ever_married, work_type, residence_type, 
                         avg_glucose_level, bmi, smoking_status, stroke)
         flash('Assessment added successfully', 'success')
     except Exception as e:
         flash(f'Failed to add assessment: {str(e)}', 'danger')
     return redirect(url_for('edit_patient', patient_id=patient_id))
 
-@app.route('/logout')
+# Route to bulk import patients and assessments from a CSV upload
+
+@views.route('/import-patients', methods=['POST'])
+@admin_required
+def import_patients():
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify(error='No CSV file uploaded'), 400
+    try:
+        report = import_csv(upload.stream, created_by=session['user_id'])
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(report)
+
+# Route to stream every patient with assessments and allergies as CSV or NDJSON
+
+@views.route('/export-patients')
+@admin_required
+def export_patients():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        flash('Unsupported export format', 'warning')
+        return redirect(url_for('patient_managment'))
+    try:
+        records = export_records()
+    except Exception as e:
+        flash(f'Export failed: {str(e)}', 'danger')
+        return redirect(url_for('patient_managment'))
+    serialize, mimetype = EXPORT_FORMATS[fmt]
+    return Response(serialize(records), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=patients.{fmt}'})
+
+# Route for the audit trail of one patient or one user (JSON, newest first)
+
+@views.route('/audit-log')
+@admin_required
+def audit_log():
+    limit = max(1, min(request.args.get('limit', 50, type=int), Config.PATIENTS_MAX_PER_PAGE))
+    before = request.args.get('before', type=int)
+    patient_id = request.args.get('patient_id', type=int)
+    user_id = request.args.get('user_id', type=int)
+    if (patient_id is None) == (user_id is None):
+        return jsonify(error='Pass exactly one of patient_id or user_id'), 400
+    # Include changes still queued for the background writer
+    audit.flush(Config.AUDIT_FLUSH_TIMEOUT)
+    if patient_id is not None:
+        events = audit.history_for_patient(patient_id, limit=limit, before=before)
+    else:
+        events = audit.history_for_user(user_id, limit=limit, before=before)
+    return jsonify(events=events, next_before=events[-1]['id'] if len(events) == limit else None)
+
+# Route exposing metrics in Prometheus text format
+
+@views.route('/metrics')
+@admin_required
+def metrics():
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@views.route('/logout')
 def logout():
     session.clear()
     flash('You have been logged out successfully', 'info')
     return redirect(url_for('login'))
 
 # Error handler for 404
-@app.errorhandler(404)
+@views.errorhandler(404)
 def page_not_found(e):
     return render_template('404.html'), 404
 
+# Application factory
+
+def create_app(config=Config):
+    """Build the Flask app; the database is set up on the first request, not here."""
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.secret_key = config.SECRET_KEY
+
+    # Initialize CSRF protection
+    csrf.init_app(app)
+
+    # Per-route, SQL, Mongo and template timings for /metrics
+    instrument_app(app)
+
+    # Long-lived cache headers for static files
+    init_static_caching(app, config.STATIC_MAX_AGE)
+
+    # gzip for pages, JSON and exports
+    init_compression(app)
+
+    app.before_request(ensure_database)
+    views.init_app(app)
+    return app
+
+_app = None
+
+def __getattr__(name):
+    # ``from app import app`` builds the default app the first time it is asked for
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # Main execution
 if __name__ == '__main__':
-    app.run(debug=True, port=8080)
\ No newline at end of file
+    create_app().run(debug=True, port=8080)
\ No newline at end of file
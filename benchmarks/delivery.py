@@ -0,0 +1,136 @@
+import argparse
+import json
+import tempfile
+import time
+
+from benchmarks.routes import ADMIN, DOCTOR, build_environment, percentile
+
+# Time to first byte and bytes on the wire, with and without streamed
+# rendering and gzip.
+#
+# Each target is fetched --requests times in every mode. TTFB is the time
+# from issuing the request to receiving the first body chunk; "total" is
+# until the last chunk. Wire bytes are the body as sent, and "on link" adds
+# the time those bytes take over a --link-kbps connection, which is what a
+# clinic on a slow line actually waits for.
+#
+#   python -m benchmarks.delivery --scale 1 --requests 30 --link-kbps 2000
+
+MODES = (
+    ('buffered', False, False),
+    ('streamed', True, False),
+    ('buffered+gzip', False, True),
+    ('streamed+gzip', True, True),
+)
+
+TARGETS = (
+    ('GET /patient-management?per_page=200', 'admin', '/patient-management?per_page=200'),
+    ('GET /search-patients', 'doctor', '/search-patients?q=av&per_page=100'),
+    ('GET /export-patients?format=ndjson', 'admin', '/export-patients?format=ndjson'),
+)
+
+def fetch(client, url, gzip):
+    """Return (ttfb_ms, total_ms, wire_bytes) for one unbuffered GET."""
+    headers = {'Accept-Encoding': 'gzip'} if gzip else {}
+    started = time.perf_counter()
+    response = client.get(url, headers=headers, buffered=False)
+    ttfb, size = None, 0
+    try:
+        for chunk in response.response:
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+            size += len(chunk)
+    finally:
+        response.close()
+    total = time.perf_counter() - started
+    return (ttfb if ttfb is not None else total) * 1000, total * 1000, size
+
+def bench_target(app, url, role, user_ids, requests, gzip):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_ids[role]
+    ttfb, total, sizes = [], [], []
+    for _ in range(requests):
+        first, last, size = fetch(client, url, gzip)
+        ttfb.append(first)
+        total.append(last)
+        sizes.append(size)
+    ttfb.sort()
+    total.sort()
+    return {
+        'ttfb_p50_ms': percentile(ttfb, 50),
+        'ttfb_p95_ms': percentile(ttfb, 95),
+        'total_p50_ms': percentile(total, 50),
+        'wire_bytes': sizes[-1],
+    }
+
+def run(scale=1.0, requests=30, link_kbps=2000, seed=1234):
+    from app import app
+    from config import Config
+    from models.db import init_pool
+    from models.mongo import connection
+    from models.user import User
+
+    saved = (Config.STREAM_TEMPLATES, Config.COMPRESS_RESPONSES)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            env = build_environment(workdir, scale, seed)
+            app.config['TESTING'] = True
+            app.config['WTF_CSRF_ENABLED'] = False
+            user_ids = {
+                'admin': User.authenticate_user(*ADMIN).id,
+                'doctor': User.authenticate_user(*DOCTOR).id,
+            }
+            for name, role, url in TARGETS:
+                results[name] = {}
+                for mode, streamed, gzip in MODES:
+                    Config.STREAM_TEMPLATES, Config.COMPRESS_RESPONSES = streamed, gzip
+                    result = bench_target(app, url, role, user_ids, requests, gzip)
+                    result['on_link_ms'] = result['total_p50_ms'] + result['wire_bytes'] * 8 / link_kbps
+                    results[name][mode] = result
+        finally:
+            Config.STREAM_TEMPLATES, Config.COMPRESS_RESPONSES = saved
+            init_pool()
+            connection.close_client()
+
+    return {
+        'meta': {
+            'scale': scale,
+            'patients': env['patients'],
+            'requests_per_mode': requests,
+            'link_kbps': link_kbps,
+            'stream_chunk_size': Config.STREAM_CHUNK_SIZE,
+            'compress_level': Config.COMPRESS_LEVEL,
+        },
+        'targets': results,
+    }
+
+def print_report(results):
+    meta = results['meta']
+    print(f"{meta['patients']} patients, {meta['requests_per_mode']} requests per mode, "
+          f"link {meta['link_kbps']} kbit/s")
+    for name, modes in results['targets'].items():
+        print(name)
+        print(f"  {'mode':<15} {'ttfb p50':>9} {'ttfb p95':>9} {'total p50':>10} {'bytes':>10} {'on link':>9}")
+        for mode, r in modes.items():
+            print(f"  {mode:<15} {r['ttfb_p50_ms']:>9.2f} {r['ttfb_p95_ms']:>9.2f} {r['total_p50_ms']:>10.2f} "
+                  f"{r['wire_bytes']:>10} {r['on_link_ms']:>9.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare TTFB and wire size with streaming and gzip on and off.')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiple of seeded_dataset.csv to load')
+    parser.add_argument('--requests', type=int, default=30, help='requests per target and mode')
+    parser.add_argument('--link-kbps', type=float, default=2000, help='link speed for the on-link estimate')
+    parser.add_argument('--output', help='write JSON results here')
+    args = parser.parse_args(argv)
+
+    results = run(args.scale, args.requests, args.link_kbps)
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
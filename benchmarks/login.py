@@ -0,0 +1,93 @@
+import argparse
+import json
+import tempfile
+import threading
+import time
+
+from benchmarks.routes import DOCTOR, bench_route, build_environment, percentile
+
+# Login throughput against client concurrency.
+#
+# Each level fires --requests POST /login calls from that many threads while
+# a probe thread keeps fetching GET /about, so the report shows both how
+# many logins per second the hashing pool sustains and whether other pages
+# stay responsive during the storm. Rejections (503 from a full hashing
+# queue) are counted as errors.
+#
+#   python -m benchmarks.login --levels 1 2 4 8 16 32 --requests 64
+
+DEFAULT_LEVELS = (1, 2, 4, 8, 16)
+
+def _probe(app, stop, latencies):
+    client = app.test_client()
+    while not stop.is_set():
+        started = time.perf_counter()
+        client.get('/about').get_data()
+        latencies.append((time.perf_counter() - started) * 1000)
+        time.sleep(0.01)
+
+def run(levels=DEFAULT_LEVELS, requests=64, seed=1234):
+    from app import app
+    from config import Config
+    from models.db import init_pool
+    from models.mongo import connection
+
+    login = ('POST /login', None, 'POST', lambda rng: '/login',
+             lambda rng: {'email': DOCTOR[0], 'password': DOCTOR[1]})
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            build_environment(workdir, scale=0.01, seed=seed)
+            app.config['TESTING'] = True
+            app.config['WTF_CSRF_ENABLED'] = False
+            for level in levels:
+                stop, probe_latencies = threading.Event(), []
+                probe = threading.Thread(target=_probe, args=(app, stop, probe_latencies))
+                probe.start()
+                try:
+                    result = bench_route(app, login, requests, level, {}, seed)
+                finally:
+                    stop.set()
+                    probe.join()
+                probe_latencies.sort()
+                result['probe_p50_ms'] = percentile(probe_latencies, 50)
+                result['probe_p95_ms'] = percentile(probe_latencies, 95)
+                results[str(level)] = result
+        finally:
+            init_pool()
+            connection.close_client()
+
+    return {
+        'meta': {
+            'requests_per_level': requests,
+            'hash_method': Config.PASSWORD_HASH_METHOD,
+            'hash_workers': Config.HASH_WORKERS,
+            'hash_max_queue': Config.HASH_MAX_QUEUE,
+        },
+        'levels': results,
+    }
+
+def print_report(results):
+    meta = results['meta']
+    print(f"hash method {meta['hash_method']}, {meta['hash_workers']} workers, queue limit {meta['hash_max_queue']}")
+    print(f"{'clients':>7} {'logins/s':>9} {'p50':>8} {'p95':>8} {'rejected':>8} {'/about p95':>11}")
+    for level, r in results['levels'].items():
+        print(f"{level:>7} {r['throughput_rps']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['errors']:>8} {r['probe_p95_ms']:>11.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure login throughput at increasing client concurrency.')
+    parser.add_argument('--levels', type=int, nargs='+', default=list(DEFAULT_LEVELS), help='client thread counts')
+    parser.add_argument('--requests', type=int, default=64, help='logins per level')
+    parser.add_argument('--output', help='write JSON results here')
+    args = parser.parse_args(argv)
+
+    results = run(args.levels, args.requests)
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
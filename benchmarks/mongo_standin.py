@@ -0,0 +1,329 @@
+import threading
+import time
+from bson.objectid import ObjectId
+from pymongo.results import DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+# In-process stand-in for the small part of the pymongo API the models use.
+#
+# It lets the benchmarks (and tests) drive the real routes without a MongoDB
+# server. Documents live in dicts; fields passed to create_index get a hash
+# index so equality/$in lookups on them avoid a full scan, as they would on
+# a real server once the migrations have run. ``latency`` adds a sleep to
+# every command, outside the collection lock, to stand in for the network
+# round trip to a real server. aggregate() runs the pipeline stages the
+# summary model builds ($match, $project, $unionWith, $sort, $group, $limit).
+
+_OPERATORS = {
+    '$in': lambda value, arg: value in arg,
+    '$nin': lambda value, arg: value not in arg,
+    '$ne': lambda value, arg: value != arg,
+    '$gt': lambda value, arg: value is not None and value > arg,
+    '$gte': lambda value, arg: value is not None and value >= arg,
+    '$lt': lambda value, arg: value is not None and value < arg,
+    '$lte': lambda value, arg: value is not None and value <= arg,
+    '$exists': lambda value, arg: (value is not None) == bool(arg),
+}
+
+def _matches(doc, query):
+    for field, condition in (query or {}).items():
+        value = doc.get(field)
+        if isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+            for op, arg in condition.items():
+                if op not in _OPERATORS:
+                    raise NotImplementedError(f'Operator {op} is not supported by the stand-in')
+                if not _OPERATORS[op](value, arg):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+def _project(doc, projection):
+    if not projection:
+        return dict(doc)
+    include = {k for k, v in projection.items() if v and k != '_id'}
+    if include:
+        out = {k: doc[k] for k in include if k in doc}
+        if projection.get('_id', 1) and '_id' in doc:
+            out['_id'] = doc['_id']
+        return out
+    return {k: v for k, v in doc.items() if projection.get(k, 1)}
+
+def _evaluate(expr, doc):
+    if isinstance(expr, str) and expr.startswith('$'):
+        return doc.get(expr[1:])
+    if isinstance(expr, dict):
+        if len(expr) == 1 and next(iter(expr)).startswith('$'):
+            op, arg = next(iter(expr.items()))
+            if op == '$literal':
+                return arg
+            if op == '$indexOfArray':
+                array, value = (_evaluate(a, doc) for a in arg)
+                return array.index(value) if value in array else -1
+            raise NotImplementedError(f'Expression {op} is not supported by the stand-in')
+        return {k: _evaluate(v, doc) for k, v in expr.items()}
+    return expr
+
+def _project_stage(doc, spec):
+    out = {}
+    if spec.get('_id', 1) and '_id' in doc:
+        out['_id'] = doc['_id']
+    for field, value in spec.items():
+        if field == '_id':
+            continue
+        if isinstance(value, (bool, int)):
+            if value and field in doc:
+                out[field] = doc[field]
+        else:
+            out[field] = _evaluate(value, doc)
+    return out
+
+def _sort_stage(docs, spec):
+    # MongoDB orders missing and null below every other value
+    for field, order in reversed(list(spec.items())):
+        docs.sort(key=lambda d: (d.get(field) is not None, d.get(field)), reverse=order < 0)
+    return docs
+
+_ACCUMULATORS = {
+    '$sum': lambda values: sum(v for v in values if isinstance(v, (int, float))),
+    '$max': lambda values: max((v for v in values if v is not None), default=None),
+    '$first': lambda values: values[0] if values else None,
+}
+
+def _group_stage(docs, spec):
+    groups = {}
+    for doc in docs:
+        groups.setdefault(_evaluate(spec['_id'], doc), []).append(doc)
+    out = []
+    for key, members in groups.items():
+        row = {'_id': key}
+        for field, accumulator in spec.items():
+            if field == '_id':
+                continue
+            (op, expr), = accumulator.items()
+            if op not in _ACCUMULATORS:
+                raise NotImplementedError(f'Accumulator {op} is not supported by the stand-in')
+            row[field] = _ACCUMULATORS[op]([_evaluate(expr, d) for d in members])
+        out.append(row)
+    return out
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, key, direction=1):
+        if isinstance(key, list):
+            for field, order in reversed(key):
+                self._docs.sort(key=lambda d: (d.get(field) is None, d.get(field)), reverse=order < 0)
+        else:
+            self._docs.sort(key=lambda d: (d.get(key) is None, d.get(key)), reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def __iter__(self):
+        return iter(self._docs)
+
+class FakeCollection:
+    def __init__(self, name, latency=0.0, database=None):
+        self.name = name
+        self.latency = latency
+        self.database = database
+        self._docs = {}
+        self._indexes = {}
+        self._lock = threading.RLock()
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    # Indexes
+
+    def create_index(self, keys, **kwargs):
+        field = keys if isinstance(keys, str) else keys[0][0]
+        with self._lock:
+            if field not in self._indexes:
+                index = {}
+                for _id, doc in self._docs.items():
+                    index.setdefault(doc.get(field), set()).add(_id)
+                self._indexes[field] = index
+        return f'{field}_1'
+
+    def _index_add(self, doc):
+        for field, index in self._indexes.items():
+            index.setdefault(doc.get(field), set()).add(doc['_id'])
+
+    def _index_remove(self, doc):
+        for field, index in self._indexes.items():
+            ids = index.get(doc.get(field))
+            if ids:
+                ids.discard(doc['_id'])
+
+    def _in_insertion_order(self, ids):
+        # Generated ObjectIds increase, so this matches the order MongoDB
+        # returns documents with equal index keys in
+        return [self._docs[i] for i in sorted(ids)]
+
+    def _candidates(self, query):
+        for field, condition in (query or {}).items():
+            index = self._indexes.get(field)
+            if index is None:
+                continue
+            if isinstance(condition, dict) and set(condition) == {'$in'}:
+                ids = set()
+                for value in condition['$in']:
+                    ids |= index.get(value, set())
+                return self._in_insertion_order(ids)
+            if not isinstance(condition, dict):
+                return self._in_insertion_order(index.get(condition, ()))
+        return list(self._docs.values())
+
+    # Reads
+
+    def find(self, filter=None, projection=None, batch_size=None, sort=None, **kwargs):
+        self._round_trip()
+        with self._lock:
+            docs = [d for d in self._candidates(filter) if _matches(d, filter)]
+        if sort:
+            # Before projecting, which may drop the sort keys
+            docs = list(FakeCursor(docs).sort(sort))
+        return FakeCursor([_project(d, projection) for d in docs])
+
+    def find_one(self, filter=None, projection=None):
+        for doc in self.find(filter, projection):
+            return doc
+        return None
+
+    def count_documents(self, filter):
+        self._round_trip()
+        with self._lock:
+            return sum(1 for d in self._candidates(filter) if _matches(d, filter))
+
+    def aggregate(self, pipeline, **kwargs):
+        self._round_trip()
+        return iter(self._run_pipeline(pipeline))
+
+    def _run_pipeline(self, pipeline):
+        with self._lock:
+            first = pipeline[0].get('$match') if pipeline else None
+            docs = [dict(d) for d in self._candidates(first)]
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == '$match':
+                docs = [d for d in docs if _matches(d, spec)]
+            elif name == '$project':
+                docs = [_project_stage(d, spec) for d in docs]
+            elif name == '$unionWith':
+                docs += self.database[spec['coll']]._run_pipeline(spec.get('pipeline', []))
+            elif name == '$sort':
+                docs = _sort_stage(docs, spec)
+            elif name == '$group':
+                docs = _group_stage(docs, spec)
+            elif name == '$limit':
+                docs = docs[:spec]
+            else:
+                raise NotImplementedError(f'Stage {name} is not supported by the stand-in')
+        return docs
+
+    # Writes
+
+    def insert_one(self, document):
+        self._round_trip()
+        return self._insert(document)
+
+    def _insert(self, document):
+        with self._lock:
+            document.setdefault('_id', ObjectId())
+            stored = dict(document)
+            self._docs[stored['_id']] = stored
+            self._index_add(stored)
+        return InsertOneResult(document['_id'], True)
+
+    def insert_many(self, documents, ordered=True):
+        self._round_trip()
+        ids = [self._insert(doc).inserted_id for doc in documents]
+        return InsertManyResult(ids, True)
+
+    def update_one(self, filter, update):
+        self._round_trip()
+        with self._lock:
+            for doc in self._candidates(filter):
+                if _matches(doc, filter):
+                    self._index_remove(doc)
+                    before = dict(doc)
+                    doc.update(update.get('$set', {}))
+                    self._index_add(doc)
+                    modified = int(doc != before)
+                    return UpdateResult({'n': 1, 'nModified': modified}, True)
+        return UpdateResult({'n': 0, 'nModified': 0}, True)
+
+    def delete_one(self, filter):
+        return self._delete(filter, many=False)
+
+    def delete_many(self, filter):
+        return self._delete(filter, many=True)
+
+    def find_one_and_delete(self, filter, projection=None):
+        self._round_trip()
+        with self._lock:
+            for doc in self._candidates(filter):
+                if _matches(doc, filter):
+                    self._index_remove(doc)
+                    del self._docs[doc['_id']]
+                    return _project(doc, projection)
+        return None
+
+    def _delete(self, filter, many):
+        self._round_trip()
+        deleted = 0
+        with self._lock:
+            for doc in self._candidates(filter):
+                if _matches(doc, filter):
+                    self._index_remove(doc)
+                    del self._docs[doc['_id']]
+                    deleted += 1
+                    if not many:
+                        break
+        return DeleteResult({'n': deleted}, True)
+
+class FakeDatabase:
+    def __init__(self, name, latency=0.0):
+        self.name = name
+        self.latency = latency
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = FakeCollection(name, self.latency, self)
+            return self._collections[name]
+
+    def command(self, name, *args, **kwargs):
+        if name != 'ping':
+            raise NotImplementedError(f'Command {name} is not supported by the stand-in')
+        return {'ok': 1.0}
+
+class FakeMongoClient:
+    """Drop-in for MongoClient in benchmarks and tests."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._databases = {}
+
+    def __getitem__(self, name):
+        if name not in self._databases:
+            self._databases[name] = FakeDatabase(name, self.latency)
+        return self._databases[name]
+
+    @property
+    def admin(self):
+        return self['admin']
+
+    def close(self):
+        pass
@@ -0,0 +1,251 @@
+import argparse
+import csv
+import json
+import math
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Route-level benchmarks.
+#
+# Builds a throwaway SQLite database and an in-process Mongo stand-in,
+# seeds them from seeded_dataset.csv (scaled by --scale), then drives the
+# real Flask routes through the test client and reports p50/p95/p99
+# latency and throughput per route. Results are written as JSON so runs
+# can be compared with --compare.
+#
+#   python -m benchmarks.routes --scale 2 --requests 200 --output bench_routes.json
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CSV_PATH = BASE_DIR / 'seeded_dataset.csv'
+
+ADMIN = ('admin@example.com', 'Admin123!')
+DOCTOR = ('doctor@example.com', 'Doctor123!')
+
+SEARCH_TERMS = ['av', 'jam', 'wil', 'dav', 'mor', 'tay', 'smi', 'tho', 'joh', 'lee']
+
+def _scaled_csv(scale, path):
+    """Write seeded_dataset.csv repeated ``scale`` times (fractions allowed) to ``path``."""
+    with CSV_PATH.open(newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+        fieldnames = reader.fieldnames
+    target = max(int(len(rows) * scale), 1)
+    with open(path, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.DictWriter(out, fieldnames=fieldnames)
+        writer.writeheader()
+        for i in range(target):
+            copy, index = divmod(i, len(rows))
+            row = dict(rows[index])
+            if copy:
+                row['email'] = f"{copy}.{row['email']}"
+            writer.writerow(row)
+    return target
+
+def build_environment(workdir, scale=1.0, seed=1234, mongo_latency=0.0):
+    """Create and seed a fresh SQLite database and Mongo stand-in under ``workdir``.
+
+    ``mongo_latency`` is a per-command delay in seconds for the stand-in.
+    """
+    from benchmarks.mongo_standin import FakeMongoClient
+    from models.db import init_pool
+    from models.mongo import connection
+    from models.mongo.allergy_model import get_allergy_collection
+    from init_db import init_database
+    import migrations
+    import seed_db
+
+    init_pool(os.path.join(workdir, 'bench.db'))
+    connection.use_client(FakeMongoClient(latency=mongo_latency))
+    init_database()
+    migrations.run_mongo_migrations()
+
+    seed_db.seed_admin_and_doctor_users()
+    csv_path = os.path.join(workdir, 'bench.csv')
+    _scaled_csv(scale, csv_path)
+    report = seed_db.seed_patients_and_assessments_from_csv(csv_path=csv_path, chunk_size=5000)
+
+    # Give roughly a third of the patients one to three allergies
+    rng = random.Random(seed)
+    patient_count = report['patients']
+    allergies = []
+    for patient_id in range(1, patient_count + 1, 3):
+        for _ in range(rng.randint(1, 3)):
+            allergies.append({
+                'patient_id': patient_id,
+                'allergen': rng.choice(['Penicillin', 'Peanuts', 'Latex', 'Aspirin', 'Shellfish']),
+                'severity': rng.choice(['Mild', 'Moderate', 'Severe']),
+                'date_added': '2024-01-01',
+            })
+    client, coll = get_allergy_collection()
+    if allergies:
+        coll.insert_many(allergies)
+
+    return {'patients': patient_count, 'allergies': len(allergies), 'seed_seconds': report['seconds']}
+
+def _routes(patient_count):
+    """(name, role, method, url, form) factories; each factory takes a Random."""
+    def any_patient(rng):
+        return rng.randint(1, patient_count)
+
+    assessment_form = {
+        'hypertension': '0', 'heart_disease': '0', 'ever_married': 'Yes', 'work_type': 'Private',
+        'residence_type': 'Urban', 'avg_glucose_level': '105.5', 'bmi': '27.1',
+        'smoking_status': 'Never smoked', 'stroke': '0',
+    }
+    return [
+        ('GET /login', None, 'GET', lambda rng: '/login', None),
+        ('POST /login', None, 'POST', lambda rng: '/login',
+         lambda rng: {'email': DOCTOR[0], 'password': DOCTOR[1]}),
+        ('GET /patient-management', 'admin', 'GET', lambda rng: '/patient-management', None),
+        ('GET /patient-management?sort=last_name', 'admin', 'GET',
+         lambda rng: '/patient-management?sort=last_name&dir=desc', None),
+        ('GET /search-patients', 'doctor', 'GET',
+         lambda rng: f'/search-patients?q={rng.choice(SEARCH_TERMS)}', None),
+        ('GET /edit-patient/<id>', 'doctor', 'GET', lambda rng: f'/edit-patient/{any_patient(rng)}', None),
+        ('POST /add-allergy/<id>', 'doctor', 'POST', lambda rng: f'/add-allergy/{any_patient(rng)}',
+         lambda rng: {'allergen': 'Pollen', 'severity': 'Mild', 'date_added': '2024-06-01'}),
+        ('POST /add-assessment/<id>', 'doctor', 'POST', lambda rng: f'/add-assessment/{any_patient(rng)}',
+         lambda rng: dict(assessment_form)),
+    ]
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def _client_for(app, role, user_ids):
+    client = app.test_client()
+    if role is not None:
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_ids[role]
+    return client
+
+def bench_route(app, route, requests, concurrency, user_ids, seed=0):
+    """Issue ``requests`` calls to one route from ``concurrency`` threads."""
+    name, role, method, url_for_rng, form_for_rng = route
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    def worker(index, count):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + index)
+        client = _client_for(app, role, user_ids)
+        local, local_errors = [], 0
+        for _ in range(count):
+            url = url_for_rng(rng)
+            data = form_for_rng(rng) if form_for_rng else None
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            response.get_data()
+            local.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 500:
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            errors += local_errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i, n)) for i, n in enumerate(per_worker) if n]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'mean_ms': sum(latencies) / len(latencies) if latencies else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'throughput_rps': len(latencies) / elapsed if elapsed > 0 else 0.0,
+    }
+
+def run(scale=1.0, requests=200, concurrency=1, only=None, seed=1234, mongo_latency_ms=0.0):
+    """Build the environment, benchmark every route and return the results dict."""
+    from app import app
+    from models.db import init_pool, pool_stats
+    from models.mongo import connection
+    from models.user import User
+
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            env = build_environment(workdir, scale, seed, mongo_latency=mongo_latency_ms / 1000)
+            app.config['TESTING'] = True
+            app.config['WTF_CSRF_ENABLED'] = False
+            user_ids = {
+                'admin': User.authenticate_user(*ADMIN).id,
+                'doctor': User.authenticate_user(*DOCTOR).id,
+            }
+            results = {}
+            for route in _routes(env['patients']):
+                if only and route[0] not in only:
+                    continue
+                results[route[0]] = bench_route(app, route, requests, concurrency, user_ids, seed)
+            stats = pool_stats()
+        finally:
+            init_pool()
+            connection.close_client()
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'scale': scale,
+            'requests_per_route': requests,
+            'concurrency': concurrency,
+            'mongo_latency_ms': mongo_latency_ms,
+            'patients': env['patients'],
+            'allergies': env['allergies'],
+            'seed_seconds': env['seed_seconds'],
+            'sqlite_pool': stats,
+        },
+        'routes': results,
+    }
+
+def print_report(results, baseline=None):
+    print(f"{'route':<40} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>9} {'err':>4}")
+    for name, r in results['routes'].items():
+        line = (f"{name:<40} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+                f"{r['throughput_rps']:>9.1f} {r['errors']:>4}")
+        previous = (baseline or {}).get('routes', {}).get(name)
+        if previous and previous['p50_ms']:
+            change = (r['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] * 100
+            line += f"   p50 {change:+.1f}% vs baseline"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Flask routes against a seeded local environment.')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiple of seeded_dataset.csv to load')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads per route')
+    parser.add_argument('--route', action='append', help='only run this route (repeatable)')
+    parser.add_argument('--mongo-latency-ms', type=float, default=0.0, help='simulated delay per Mongo command')
+    parser.add_argument('--output', default='bench_routes.json', help='where to write JSON results')
+    parser.add_argument('--compare', help='previous JSON results to compare against')
+    args = parser.parse_args(argv)
+
+    results = run(args.scale, args.requests, args.concurrency, args.route, mongo_latency_ms=args.mongo_latency_ms)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Cold-start cost of importing the app, from python -X importtime.
+#
+# Each run imports the module in a fresh interpreter and reads the
+# cumulative time the import tree reports for it; the fastest run is kept,
+# since the slower ones only add scheduling noise. test.py checks that the
+# modules in DEFERRED_MODULES are not loaded until they are needed, and
+# holds the app to IMPORT_BUDGET_SECONDS when that variable is set.
+#
+#   python -m benchmarks.startup --runs 5
+
+IMPORT_BUDGET_SECONDS = float(os.environ.get('IMPORT_BUDGET_SECONDS', '0.4'))
+DEFERRED_MODULES = ('pymongo', 'bson', 'numpy')
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_once(module, cwd=None):
+    """Return (cumulative_seconds, imported module names) for one cold import."""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=cwd or REPO_DIR, env=env, capture_output=True, text=True, check=True)
+    seconds, modules = None, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+        if name.strip() == module and not name[1:].startswith(' '):
+            seconds = int(cumulative) / 1e6
+    return seconds, modules
+
+def measure_import(module='app', runs=3, cwd=None):
+    timings, modules = [], set()
+    for _ in range(runs):
+        seconds, imported = import_once(module, cwd)
+        timings.append(seconds)
+        modules |= imported
+    return {
+        'module': module,
+        'best_seconds': min(timings),
+        'runs': timings,
+        'deferred_loaded': sorted(m for m in DEFERRED_MODULES if m in modules),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the cold import time of the app.')
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    result = measure_import(args.module, args.runs)
+    print(f"import {result['module']}: best {result['best_seconds'] * 1000:.1f} ms "
+          f"(budget {IMPORT_BUDGET_SECONDS * 1000:.0f} ms) over {args.runs} runs")
+    print(f"deferred modules loaded at import: {', '.join(result['deferred_loaded']) or 'none'}")
+
+if __name__ == '__main__':
+    main()
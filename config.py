@@ -7,9 +7,83 @@ load_dotenv()
 class Config:
     BASE_DIR = os.getcwd()
     SECRET_KEY = os.environ.get("SECRET_KEY", "change_me_dev_key")
-    DB_PATH = os.path.join(BASE_DIR, "stroke_project.db")
+    DB_PATH = os.environ.get("DB_PATH", os.path.join(BASE_DIR, "stroke_project.db"))
 
     MONGO_URI = os.environ.get("MONGO_URI")
     MONGO_DB = os.environ.get("MONGO_DB", "stroke_project")
     MONGO_ALLERGY_COL = os.environ.get("MONGO_ALLERGY_COL", "allergies")
-    MONGO_ASSESSMENT_COL = os.environ.get("MONGO_ASSESSMENT_COL", "assessments")
\ No newline at end of file
+    MONGO_ASSESSMENT_COL = os.environ.get("MONGO_ASSESSMENT_COL", "assessments")
+    MONGO_POOL_SIZE = int(os.environ.get("MONGO_POOL_SIZE", "50"))
+    MONGO_TIMEOUT_MS = int(os.environ.get("MONGO_TIMEOUT_MS", "5000"))
+    ANALYTICS_CACHE_TTL = float(os.environ.get("ANALYTICS_CACHE_TTL", "300"))
+    MONGO_MIGRATE_ON_STARTUP = os.environ.get("MONGO_MIGRATE_ON_STARTUP", "false").lower() == "true"
+
+    # SQLite connection pool
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+    DB_TIMEOUT = float(os.environ.get("DB_TIMEOUT", "5"))
+    DB_CACHED_STATEMENTS = int(os.environ.get("DB_CACHED_STATEMENTS", "128"))
+
+
+    # Password hashing pool; PASSWORD_HASH_METHOD is any werkzeug method string,
+    # e.g. "scrypt" or "scrypt:65536:8:1". Changing it rehashes users on next login.
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+    HASH_WORKERS = int(os.environ.get("HASH_WORKERS", str(min(os.cpu_count() or 2, 4))))
+    HASH_MAX_QUEUE = int(os.environ.get("HASH_MAX_QUEUE", "32"))
+    HASH_TIMEOUT = float(os.environ.get("HASH_TIMEOUT", "10"))
+
+    # Process-wide identity cache; 0 disables it (per-request caching always applies)
+    IDENTITY_CACHE_TTL = float(os.environ.get("IDENTITY_CACHE_TTL", "0"))
+    IDENTITY_CACHE_SIZE = int(os.environ.get("IDENTITY_CACHE_SIZE", "1024"))
+
+    # Concurrent loading of the patient detail page
+    AGGREGATE_WORKERS = int(os.environ.get("AGGREGATE_WORKERS", "12"))
+    AGGREGATE_SQLITE_TIMEOUT = float(os.environ.get("AGGREGATE_SQLITE_TIMEOUT", "5"))
+    AGGREGATE_MONGO_TIMEOUT = float(os.environ.get("AGGREGATE_MONGO_TIMEOUT", "3"))
+
+    # Patient listing pagination
+    PATIENTS_PER_PAGE = int(os.environ.get("PATIENTS_PER_PAGE", "25"))
+    PATIENTS_MAX_PER_PAGE = int(os.environ.get("PATIENTS_MAX_PER_PAGE", "200"))
+
+    # Streaming export
+    EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+
+    # Bulk CSV import
+    IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "1000"))
+    IMPORT_MAX_ERRORS = int(os.environ.get("IMPORT_MAX_ERRORS", "1000"))
+
+    # HTTP caching; static URLs carry the file's mtime, so a long max-age is safe
+    STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", str(365 * 24 * 3600)))
+
+    # Streamed page rendering and gzip compression. Streamed pages are sent in
+    # STREAM_CHUNK_SIZE pieces; responses of these content types are not compressed.
+    STREAM_TEMPLATES = os.environ.get("STREAM_TEMPLATES", "true").lower() == "true"
+    STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", "4096"))
+    COMPRESS_RESPONSES = os.environ.get("COMPRESS_RESPONSES", "true").lower() == "true"
+    COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", "6"))
+    COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+    COMPRESS_FLUSH_SIZE = int(os.environ.get("COMPRESS_FLUSH_SIZE", "16384"))
+    COMPRESS_EXCLUDED_TYPES = tuple(t.strip() for t in os.environ.get(
+        "COMPRESS_EXCLUDED_TYPES",
+        "image/,video/,audio/,font/woff,application/zip,application/gzip,application/pdf,text/event-stream",
+    ).split(",") if t.strip())
+
+    # Audit trail: events are queued (up to AUDIT_MAX_QUEUE) and group-committed
+    # by a background writer in batches of up to AUDIT_BATCH_SIZE
+    AUDIT_MAX_QUEUE = int(os.environ.get("AUDIT_MAX_QUEUE", "10000"))
+    AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "500"))
+    AUDIT_COMMIT_INTERVAL = float(os.environ.get("AUDIT_COMMIT_INTERVAL", "0.05"))
+    AUDIT_FLUSH_TIMEOUT = float(os.environ.get("AUDIT_FLUSH_TIMEOUT", "5"))
+
+    # Mongo documents removed per delete_many when patients are deleted or
+    # orphans swept; the sweeper pauses ORPHAN_SWEEP_PAUSE seconds between batches
+    MONGO_DELETE_BATCH_SIZE = int(os.environ.get("MONGO_DELETE_BATCH_SIZE", "1000"))
+    ORPHAN_SWEEP_PAUSE = float(os.environ.get("ORPHAN_SWEEP_PAUSE", "0.05"))
+
+    # Pre-forked production server (serve.py). Idle keep-alive connections are
+    # closed after SERVE_KEEPALIVE_TIMEOUT; on shutdown, workers get
+    # SHUTDOWN_TIMEOUT seconds to finish in-flight requests before being killed.
+    SERVE_HOST = os.environ.get("SERVE_HOST", "0.0.0.0")
+    SERVE_PORT = int(os.environ.get("SERVE_PORT", "8080"))
+    SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", str(os.cpu_count() or 1)))
+    SERVE_KEEPALIVE_TIMEOUT = float(os.environ.get("SERVE_KEEPALIVE_TIMEOUT", "5"))
+    SHUTDOWN_TIMEOUT = float(os.environ.get("SHUTDOWN_TIMEOUT", "30"))
\ No newline at end of file
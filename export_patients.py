@@ -0,0 +1,45 @@
+import argparse
+import sys
+import time
+from models.patient_export import EXPORT_FORMATS, export_records
+
+# Export every patient with their assessments and allergies.
+#
+#   python export_patients.py --format ndjson --output cohort.ndjson
+
+def export(output, fmt='csv', batch_size=None):
+    """Stream the export to a text file object; returns the number of patients written."""
+    serialize, _ = EXPORT_FORMATS[fmt]
+    count = 0
+
+    def counted(records):
+        nonlocal count
+        for record in records:
+            count += 1
+            yield record
+
+    for chunk in serialize(counted(export_records(batch_size))):
+        output.write(chunk)
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export patients joined with assessments and allergies.')
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--output', help='file to write (default: stdout)')
+    parser.add_argument('--batch-size', type=int, help='patients per SQLite/MongoDB batch')
+    args = parser.parse_args(argv)
+
+    from init_db import init_database
+    init_database()
+
+    started = time.perf_counter()
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            count = export(f, args.format, args.batch_size)
+    else:
+        count = export(sys.stdout, args.format, args.batch_size)
+    seconds = time.perf_counter() - started
+    print(f"[export] Wrote {count} patients in {seconds:.2f}s", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -1,41 +1,70 @@
-import sqlite3
+import threading
+from config import Config
+from models.db import get_db, on_pool_reset
+from migrations import run_sqlite_migrations, run_mongo_migrations
 
-DB_NAME = 'stroke_project.db'
+_initialized = False
+_init_lock = threading.Lock()
 
-def init_database():
-    """Initialize the database with users table"""
+def init_database(migrate=True):
+    """Initialize the database tables, then apply pending migrations"""
+    global _initialized
    
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            first_name TEXT NOT NULL,
-            last_name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            role TEXT NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS patients (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            first_name TEXT NOT NULL,
-            last_name TEXT NOT NULL,
-            email TEXT NOT NULL,
-            gender TEXT NOT NULL,
-            date_of_birth TEXT NOT NULL,
-            created_by INTEGER NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (created_by) REFERENCES users(id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                first_name TEXT NOT NULL,
+                last_name TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                role TEXT NOT NULL,
+                password_hash TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS patients (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                first_name TEXT NOT NULL,
+                last_name TEXT NOT NULL,
+                email TEXT NOT NULL,
+                gender TEXT NOT NULL,
+                date_of_birth TEXT NOT NULL,
+                created_by INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (created_by) REFERENCES users(id)
+            )
+        ''')
+
+    if migrate:
+        run_sqlite_migrations()
+        if Config.MONGO_MIGRATE_ON_STARTUP:
+            try:
+                run_mongo_migrations()
+            except Exception as e:
+                print(f"MongoDB migration error: {str(e)}")
+        _initialized = True
+
+def ensure_database():
+    """Run init_database() the first time this process needs the database.
+
+    Forked workers inherit the flag, so a server that initialised the
+    database before forking does not migrate again in every worker.
+    """
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                init_database()
+
+def _reset():
+    global _initialized
+    _initialized = False
+
+# A replaced pool may point at a different, uninitialised database
+on_pool_reset(_reset)
 
 if __name__ == '__main__':
     init_database()
\ No newline at end of file
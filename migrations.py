@@ -0,0 +1,302 @@
+import argparse
+import sqlite3
+from datetime import datetime, timezone
+from config import Config
+from models.db import get_db
+
+# Versioned schema migrations for SQLite and MongoDB.
+#
+# Each store has its own ordered list of steps. Applied versions are
+# recorded in the SQLite ``schema_version`` table, so every step runs once
+# per database. Steps must still be idempotent (IF NOT EXISTS, create_index)
+# so that a step interrupted before its version row was written is safe to
+# re-run.
+
+SQLITE_MIGRATIONS = []
+MONGO_MIGRATIONS = []
+
+def sqlite_migration(version, description):
+    def register(fn):
+        SQLITE_MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+def mongo_migration(version, description):
+    def register(fn):
+        MONGO_MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+# SQLite steps
+
+@sqlite_migration(1, 'Patient listing sort indexes and trigger-maintained row count')
+def _patient_listing_indexes(conn):
+    for column in ('first_name', 'last_name', 'email'):
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_patients_{column} ON patients ({column}, id)')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS table_stats (
+            table_name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO table_stats (table_name, row_count)
+        SELECT 'patients', COUNT(*) FROM patients
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_patients_count_insert AFTER INSERT ON patients
+        BEGIN
+            UPDATE table_stats SET row_count = row_count + 1 WHERE table_name = 'patients';
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_patients_count_delete AFTER DELETE ON patients
+        BEGIN
+            UPDATE table_stats SET row_count = row_count - 1 WHERE table_name = 'patients';
+        END
+    ''')
+
+@sqlite_migration(2, 'Index patients.created_by')
+def _patients_created_by_index(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_patients_created_by ON patients (created_by)')
+
+@sqlite_migration(3, 'Full-text search index over patient names and email')
+def _patients_fts(conn):
+    # External-content FTS5 table: the text lives in patients, only the index is stored here
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(
+            first_name, last_name, email,
+            content='patients', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_patients_fts_insert AFTER INSERT ON patients
+        BEGIN
+            INSERT INTO patients_fts (rowid, first_name, last_name, email)
+            VALUES (new.id, new.first_name, new.last_name, new.email);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_patients_fts_delete AFTER DELETE ON patients
+        BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, first_name, last_name, email)
+            VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_patients_fts_update AFTER UPDATE OF first_name, last_name, email ON patients
+        BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, first_name, last_name, email)
+            VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+            INSERT INTO patients_fts (rowid, first_name, last_name, email)
+            VALUES (new.id, new.first_name, new.last_name, new.email);
+        END
+    ''')
+    # Index rows that existed before the triggers
+    conn.execute("INSERT INTO patients_fts (patients_fts) VALUES ('rebuild')")
+
+@sqlite_migration(4, 'Stroke risk scores on patients and trained risk models')
+def _risk_scores(conn):
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(patients)')}
+    if 'risk_score' not in columns:
+        conn.execute('ALTER TABLE patients ADD COLUMN risk_score REAL')
+    # Unscored patients sort below every score; queries must use the same expression
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_patients_risk_score ON patients (IFNULL(risk_score, -1), id)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS risk_models (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            trained_at TEXT NOT NULL,
+            samples INTEGER NOT NULL,
+            features TEXT NOT NULL,
+            weights TEXT NOT NULL,
+            means TEXT NOT NULL,
+            scales TEXT NOT NULL
+        )
+    ''')
+
+@sqlite_migration(5, 'Per-table and per-patient data versions for conditional GETs')
+def _data_versions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+@sqlite_migration(6, 'Append-only audit log indexed by patient and by user')
+def _audit_log(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            occurred_at TEXT NOT NULL,
+            user_id INTEGER,
+            action TEXT NOT NULL,
+            entity TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            patient_id INTEGER,
+            details TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_patient ON audit_log (patient_id, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_user ON audit_log (user_id, id)')
+    for statement in ('UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_audit_log_no_{statement.lower()} BEFORE {statement} ON audit_log
+            BEGIN
+                SELECT RAISE(ABORT, 'audit_log is append-only');
+            END
+        ''')
+
+# MongoDB steps
+
+@mongo_migration(1, 'Index patient_id on allergies and assessments')
+def _mongo_patient_id_indexes(mdb):
+    mdb[Config.MONGO_ALLERGY_COL].create_index('patient_id')
+    mdb[Config.MONGO_ASSESSMENT_COL].create_index('patient_id')
+
+# Runner
+
+def _ensure_version_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            store TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL,
+            PRIMARY KEY (store, version)
+        )
+    ''')
+
+def applied_versions(store):
+    with get_db() as conn:
+        _ensure_version_table(conn)
+        rows = conn.execute('SELECT version FROM schema_version WHERE store = ?', (store,)).fetchall()
+    return {row[0] for row in rows}
+
+def _record(conn, store, version, description):
+    conn.execute(
+        'INSERT INTO schema_version (store, version, description, applied_at) VALUES (?, ?, ?, ?)',
+        (store, version, description, datetime.now(timezone.utc).isoformat()),
+    )
+
+def run_sqlite_migrations(verbose=False):
+    """Apply pending SQLite steps in order; returns the versions applied."""
+    applied = []
+    for version, description, step in sorted(SQLITE_MIGRATIONS):
+        with get_db() as conn:
+            _ensure_version_table(conn)
+            # Serialise concurrent workers, then re-check under the write lock
+            if not conn.in_transaction:
+                conn.execute('BEGIN IMMEDIATE')
+            done = conn.execute(
+                "SELECT 1 FROM schema_version WHERE store = 'sqlite' AND version = ?", (version,)
+            ).fetchone()
+            if done:
+                continue
+            step(conn)
+            _record(conn, 'sqlite', version, description)
+        applied.append(version)
+        if verbose:
+            print(f"[migrations] sqlite v{version}: {description}")
+    return applied
+
+def run_mongo_migrations(verbose=False):
+    """Apply pending MongoDB steps in order; returns the versions applied."""
+    from models.mongo.connection import mongo_conn
+
+    done = applied_versions('mongo')
+    pending = [m for m in sorted(MONGO_MIGRATIONS) if m[0] not in done]
+    if not pending:
+        return []
+    client, mdb = mongo_conn()
+    if mdb is None:
+        raise RuntimeError('MongoDB is not available')
+
+    applied = []
+    for version, description, step in pending:
+        step(mdb)
+        with get_db() as conn:
+            _record(conn, 'mongo', version, description)
+        applied.append(version)
+        if verbose:
+            print(f"[migrations] mongo v{version}: {description}")
+    return applied
+
+# Query plans
+
+SQLITE_PLAN_QUERIES = [
+    ('patients by creator', 'SELECT id FROM patients WHERE created_by = ?', (1,)),
+    ('patient by email', 'SELECT id FROM patients WHERE email = ?', ('a@example.com',)),
+    ('patients sorted by last name', 'SELECT id FROM patients ORDER BY last_name, id LIMIT 25', ()),
+    ('patients sorted by risk', 'SELECT id FROM patients ORDER BY IFNULL(risk_score, -1) DESC, id DESC LIMIT 25', ()),
+    ('audit log by patient', 'SELECT id FROM audit_log WHERE patient_id = ? ORDER BY id DESC LIMIT 50', (1,)),
+    ('audit log by user', 'SELECT id FROM audit_log WHERE user_id = ? ORDER BY id DESC LIMIT 50', (1,)),
+]
+
+def sqlite_query_plans():
+    plans = []
+    with get_db() as conn:
+        for label, sql, params in SQLITE_PLAN_QUERIES:
+            try:
+                rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+            except sqlite3.OperationalError:
+                # A table or column a pending migration adds
+                plans.append((label, 'n/a (not migrated)'))
+                continue
+            plans.append((label, '; '.join(row[-1] for row in rows)))
+    return plans
+
+def _winning_stages(plan):
+    stages = []
+    while plan:
+        stages.append(plan.get('stage', '?'))
+        plan = plan.get('inputStage')
+    return ' <- '.join(stages)
+
+def mongo_query_plans():
+    from models.mongo.connection import mongo_conn
+
+    client, mdb = mongo_conn()
+    plans = []
+    for name in (Config.MONGO_ALLERGY_COL, Config.MONGO_ASSESSMENT_COL):
+        explained = mdb[name].find({'patient_id': 1}).explain()
+        plans.append((f'{name} by patient_id', _winning_stages(explained['queryPlanner']['winningPlan'])))
+    return plans
+
+def _print_plans(title, plans):
+    print(f"[migrations] {title}")
+    for label, plan in plans:
+        print(f"    {label}: {plan}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply pending schema migrations.')
+    parser.add_argument('--skip-mongo', action='store_true', help='only migrate SQLite')
+    parser.add_argument('--explain', action='store_true', help='print query plans before and after')
+    args = parser.parse_args(argv)
+
+    from init_db import init_database
+
+    if args.explain:
+        init_database(migrate=False)
+        _print_plans('SQLite plans before', sqlite_query_plans())
+        if not args.skip_mongo:
+            _print_plans('MongoDB plans before', mongo_query_plans())
+
+    init_database(migrate=False)
+    applied = run_sqlite_migrations(verbose=True)
+    if not args.skip_mongo:
+        applied += run_mongo_migrations(verbose=True)
+    if not applied:
+        print('[migrations] Schema is up to date')
+
+    if args.explain:
+        _print_plans('SQLite plans after', sqlite_query_plans())
+        if not args.skip_mongo:
+            _print_plans('MongoDB plans after', mongo_query_plans())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from config import Config
+from models.db import get_db, on_pool_reset
+from utils.metrics import Gauge, register
+
+# Append-only audit trail of patient, allergy and assessment changes.
+#
+# Writers call record() once their change has been committed. The event is
+# stamped with the time and the signed-in user, put on a bounded in-memory
+# queue, and a background thread group-commits everything that has piled up
+# (up to AUDIT_BATCH_SIZE events) in one SQLite transaction. A change costs
+# a queue put instead of a second synchronous insert, and the busier the
+# system the larger each commit. When the queue is full the caller writes
+# its own event inline: slower, but nothing is dropped. Pending events are
+# flushed at interpreter exit and before init_pool() swaps the database.
+#
+# The audit_log table (migration 6) rejects UPDATE and DELETE.
+
+CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+PATIENT, ALLERGY, ASSESSMENT = 'patient', 'allergy', 'assessment'
+
+AUDIT_COLUMNS = 'id, occurred_at, user_id, action, entity, entity_id, patient_id, details'
+
+_INSERT = '''
+    INSERT INTO audit_log (occurred_at, user_id, action, entity, entity_id, patient_id, details)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+def current_user_id():
+    """The signed-in user for changes made during a request; None for scripts."""
+    from flask import has_request_context, session
+    if has_request_context():
+        return session.get('user_id')
+    return None
+
+def _row(occurred_at, user_id, action, entity, entity_id, patient_id, details):
+    return (occurred_at, user_id, action, entity, str(entity_id),
+            int(patient_id) if patient_id is not None else None,
+            json.dumps(details, sort_keys=True, default=str) if details else None)
+
+def write_rows(rows):
+    with get_db() as conn:
+        conn.executemany(_INSERT, rows)
+
+class AuditWriter:
+    """Background thread that group-commits queued audit rows."""
+
+    def __init__(self, max_queue, batch_size, commit_interval=0.0):
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._idle = threading.Condition()
+        self._unwritten = 0
+        self.written = 0
+        self.batches = 0
+        self.inline_writes = 0
+        self.failures = 0
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        return self._unwritten
+
+    def submit(self, rows):
+        """Queue ``rows`` for the writer, or write them now if the queue is full."""
+        with self._idle:
+            self._unwritten += len(rows)
+        try:
+            self._queue.put_nowait(rows)
+        except queue.Full:
+            self._done(rows, self._write(rows), inline=True)
+
+    def _write(self, rows):
+        try:
+            write_rows(rows)
+            return True
+        except Exception as e:
+            print(f"[audit] Failed to write {len(rows)} audit events: {e}")
+            return False
+
+    def _done(self, rows, ok, inline=False):
+        with self._idle:
+            self._unwritten -= len(rows)
+            if ok:
+                self.written += len(rows)
+                if inline:
+                    self.inline_writes += len(rows)
+                else:
+                    self.batches += 1
+            else:
+                self.failures += len(rows)
+            self._idle.notify_all()
+
+    def _run(self):
+        while True:
+            rows = self._queue.get()
+            if rows is None:
+                return
+            batch, stop = list(rows), False
+            # Let events pile up for commit_interval, then take them all in
+            # one commit. Sleeping rather than waiting on the queue keeps
+            # producers from waking this thread once per event.
+            if self.commit_interval:
+                time.sleep(self.commit_interval)
+            while len(batch) < self.batch_size:
+                try:
+                    rows = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if rows is None:
+                    stop = True
+                    break
+                batch.extend(rows)
+            self._done(batch, self._write(batch))
+            if stop:
+                return
+
+    def flush(self, timeout=None):
+        """Wait until every submitted row is written; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._unwritten == 0, timeout)
+
+    def close(self, timeout=None):
+        self.flush(timeout)
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    global _writer, _writer_pid
+    pid = os.getpid()
+    if _writer is None or _writer_pid != pid:
+        with _writer_lock:
+            if _writer is None or _writer_pid != pid:
+                _writer = AuditWriter(Config.AUDIT_MAX_QUEUE, Config.AUDIT_BATCH_SIZE,
+                                      Config.AUDIT_COMMIT_INTERVAL)
+                _writer_pid = pid
+    return _writer
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds')
+
+def record(action, entity, entity_id, patient_id=None, details=None, user_id=None):
+    """Queue one audit event; ``user_id`` defaults to the signed-in user."""
+    if user_id is None:
+        user_id = current_user_id()
+    get_writer().submit([_row(_now(), user_id, action, entity, entity_id, patient_id, details)])
+
+def record_many(action, entity, events, user_id=None):
+    """Queue ``(entity_id, patient_id, details)`` events as one unit."""
+    if user_id is None:
+        user_id = current_user_id()
+    occurred_at = _now()
+    rows = [_row(occurred_at, user_id, action, entity, entity_id, patient_id, details)
+            for entity_id, patient_id, details in events]
+    if rows:
+        get_writer().submit(rows)
+
+def flush(timeout=None):
+    """Block until queued events are in SQLite (no-op if nothing was recorded)."""
+    if _writer is not None and _writer_pid == os.getpid():
+        return _writer.flush(timeout)
+    return True
+
+def _history(column, value, limit, before):
+    sql = f'SELECT {AUDIT_COLUMNS} FROM audit_log WHERE {column} = ?'
+    params = [value]
+    if before is not None:
+        sql += ' AND id < ?'
+        params.append(before)
+    sql += ' ORDER BY id DESC LIMIT ?'
+    params.append(limit)
+    with get_db() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    names = [name.strip() for name in AUDIT_COLUMNS.split(',')]
+    events = [dict(zip(names, row)) for row in rows]
+    for event in events:
+        event['details'] = json.loads(event['details']) if event['details'] else None
+    return events
+
+def history_for_patient(patient_id, limit=50, before=None):
+    """Newest-first events for one patient; pass the last id as ``before`` for the next page."""
+    return _history('patient_id', int(patient_id), limit, before)
+
+def history_for_user(user_id, limit=50, before=None):
+    """Newest-first events made by one user."""
+    return _history('user_id', int(user_id), limit, before)
+
+on_pool_reset(lambda: flush(Config.AUDIT_FLUSH_TIMEOUT))
+atexit.register(lambda: flush(Config.AUDIT_FLUSH_TIMEOUT))
+
+register(Gauge('audit_events_pending', 'Audit events queued but not yet written.',
+               lambda: _writer.pending if _writer else 0))
+register(Gauge('audit_events_written_total', 'Audit events written to SQLite.',
+               lambda: _writer.written if _writer else 0, kind='counter'))
+register(Gauge('audit_batches_total', 'Group commits made by the audit writer.',
+               lambda: _writer.batches if _writer else 0, kind='counter'))
+register(Gauge('audit_inline_writes_total', 'Audit events written by the caller because the queue was full.',
+               lambda: _writer.inline_writes if _writer else 0, kind='counter'))
+register(Gauge('audit_write_failures_total', 'Audit events that could not be written.',
+               lambda: _writer.failures if _writer else 0, kind='counter'))
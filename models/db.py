@@ -0,0 +1,220 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+from utils.metrics import observe_sql
+
+DB_NAME = Config.DB_PATH
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports statement timings to /metrics."""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observe_sql(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observe_sql(sql, time.perf_counter() - started)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose shortcut execute methods and cursors are timed."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observe_sql(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observe_sql(sql, time.perf_counter() - started)
+
+class ConnectionPool:
+    """Bounded pool of reusable SQLite connections.
+
+    A thread keeps the connection it checked out for the whole of a
+    ``connection()`` block, so nested model calls share one connection
+    and one transaction instead of opening their own.
+    """
+
+    def __init__(self, path, size=5, timeout=5.0, cached_statements=128):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._checkouts = 0
+        self._wait_seconds = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=InstrumentedConnection,
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.timeout * 1000)}')
+        return conn
+
+    def _acquire(self):
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._open < self.size:
+                    self._open += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise sqlite3.OperationalError('Timed out waiting for a database connection')
+        with self._lock:
+            self._checkouts += 1
+            self._wait_seconds += time.perf_counter() - start
+        return conn
+
+    def _release(self, conn):
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Yield a pooled connection, committing on success and rolling back on error."""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            # Nested call on the same thread: join the outer transaction
+            yield held
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    def close_all(self):
+        """Close every idle connection. Connections in use are closed when returned."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._open -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'checkouts': self._checkouts,
+                'wait_seconds': self._wait_seconds,
+                'open_connections': self._open,
+                'idle_connections': self._idle.qsize(),
+                'pool_size': self.size,
+            }
+
+_pool = None
+_pool_pid = None
+_pool_path = DB_NAME
+_pool_lock = threading.Lock()
+
+def _reset_after_fork():
+    # SQLite connections must not be used across fork(). The child drops the
+    # inherited pool without closing it (those connections belong to the
+    # parent) and opens its own for the same path on first use.
+    global _pool, _pool_pid, _pool_lock
+    _pool = None
+    _pool_pid = None
+    _pool_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(
+                    _pool_path,
+                    size=Config.DB_POOL_SIZE,
+                    timeout=Config.DB_TIMEOUT,
+                    cached_statements=Config.DB_CACHED_STATEMENTS,
+                )
+                _pool_pid = pid
+    return _pool
+
+_reset_hooks = []
+
+def on_pool_reset(fn):
+    """Call ``fn()`` before init_pool() replaces the pool, e.g. to flush buffered writes."""
+    _reset_hooks.append(fn)
+    return fn
+
+def init_pool(path=DB_NAME, **kwargs):
+    """Replace the shared pool with one for ``path`` (e.g. a test database)."""
+    global _pool, _pool_pid, _pool_path
+    if _pool is not None and _pool_pid == os.getpid():
+        for hook in _reset_hooks:
+            hook()
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close_all()
+        _pool_path = path
+        _pool_pid = os.getpid()
+        _pool = ConnectionPool(
+            path,
+            size=kwargs.get('size', Config.DB_POOL_SIZE),
+            timeout=kwargs.get('timeout', Config.DB_TIMEOUT),
+            cached_statements=kwargs.get('cached_statements', Config.DB_CACHED_STATEMENTS),
+        )
+    return _pool
+
+def get_db():
+    """Check out a connection from the shared pool (use as a context manager)."""
+    return get_pool().connection()
+
+def pool_stats():
+    return get_pool().stats()
@@ -1,6 +1,11 @@
 from config import Config
-from bson.objectid import ObjectId
-from models.mongo.connection import mongo_conn
+from models.mongo.connection import delete_by_patient, mongo_conn
+from models import audit, versions
+
+def _object_id(allergy_id):
+    # bson ships with pymongo, which is only imported once Mongo is used
+    from bson.objectid import ObjectId
+    return ObjectId(allergy_id)
 
 def get_allergy_collection():
     client, mdb = mongo_conn()
@@ -14,8 +19,8 @@ def get_allergies_by_patient_id(patient_id):
     if coll is None:
         return []
     
-    allergies = list(coll.find({"patient_id": int(patient_id)}))
-    client.close()
+    # patient_id is the filter, so it is not sent back with every document
+    allergies = list(coll.find({"patient_id": int(patient_id)}, {"patient_id": 0}))
     return allergies
 
 def create_allergy(patient_id, allergen, severity, date_added):
@@ -30,7 +35,9 @@ def create_allergy(patient_id, allergen, severity, date_added):
         "date_added": date_added
     }
     result = coll.insert_one(new_allergy)
-    client.close()
+    versions.bump(versions.ALLERGIES, versions.patient_scope(patient_id))
+    audit.record(audit.CREATE, audit.ALLERGY, result.inserted_id, patient_id,
+                 {'allergen': allergen, 'severity': severity, 'date_added': date_added})
     return str(result.inserted_id)
 
 def get_allergy_by_id(allergy_id):
@@ -38,8 +45,7 @@ def get_allergy_by_id(allergy_id):
     if coll is None:
         return None
     
-    allergy = coll.find_one({"_id": ObjectId(allergy_id)})
-    client.close()
+    allergy = coll.find_one({"_id": _object_id(allergy_id)})
     return allergy
 
 def update_allergy(allergy_id, patient_id, allergen, severity, date_added):
@@ -53,17 +59,32 @@ def update_allergy(allergy_id, patient_id, allergen, severity, date_added):
         "date_added": date_added
     }
     result = coll.update_one(
-        {"_id": ObjectId(allergy_id), "patient_id": int(patient_id)},
+        {"_id": _object_id(allergy_id), "patient_id": int(patient_id)},
         {"$set": updated_allergy}
     )
-    client.close()
+    if result.modified_count:
+        versions.bump(versions.ALLERGIES, versions.patient_scope(patient_id))
+        audit.record(audit.UPDATE, audit.ALLERGY, allergy_id, patient_id, updated_allergy)
     return result.modified_count > 0
 
-def delete_allergy(allergy_id):
+def delete_allergy(allergy_id, patient_id):
     client, coll = get_allergy_collection()
     if coll is None:
         return False
     
-    result = coll.delete_one({"_id": ObjectId(allergy_id)})
-    client.close()
-    return result.deleted_count > 0
\ No newline at end of file
+    result = coll.delete_one({"_id": _object_id(allergy_id), "patient_id": int(patient_id)})
+    if not result.deleted_count:
+        return False
+    versions.bump(versions.ALLERGIES, versions.patient_scope(patient_id))
+    audit.record(audit.DELETE, audit.ALLERGY, allergy_id, patient_id)
+    return True
+
+def delete_allergies_for_patients(patient_ids):
+    """Remove every allergy of ``patient_ids``; returns the number deleted."""
+    client, coll = get_allergy_collection()
+    if coll is None:
+        return 0
+    deleted = delete_by_patient(coll, patient_ids)
+    if deleted:
+        versions.bump(versions.ALLERGIES)
+    return deleted
\ No newline at end of file
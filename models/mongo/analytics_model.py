@@ -0,0 +1,189 @@
+import threading
+import time
+import numpy as np
+from config import Config
+from models import versions
+from models.mongo import assessment_model
+
+# Cohort analytics over the assessments collection.
+#
+# Assessments are read from MongoDB once into NumPy column arrays; every
+# aggregate below is then a handful of vectorised bincount/digitize calls
+# instead of a Mongo scan per chart. Results are cached until the
+# assessments data version changes (or ANALYTICS_CACHE_TTL passes). The
+# version lives in SQLite, so a write in any worker process invalidates
+# every worker's cache.
+
+CATEGORICAL_FIELDS = ('work_type', 'smoking_status', 'ever_married', 'residence_type')
+BINARY_FIELDS = ('hypertension', 'heart_disease')
+
+FIELD_LABELS = {
+    'hypertension': 'Hypertension',
+    'heart_disease': 'Heart disease',
+    'work_type': 'Work type',
+    'smoking_status': 'Smoking status',
+    'ever_married': 'Ever married',
+    'residence_type': 'Residence type',
+}
+
+# Band edges: ADA fasting glucose ranges and WHO BMI classes
+GLUCOSE_BANDS = (
+    [0, 70, 100, 126, 200],
+    ['< 70', '70 - 99', '100 - 125', '126 - 199', '200+'],
+)
+BMI_BANDS = (
+    [0, 18.5, 25, 30, 35, 40],
+    ['< 18.5', '18.5 - 24.9', '25 - 29.9', '30 - 34.9', '35 - 39.9', '40+'],
+)
+
+_PROJECTION = {'_id': 0, 'patient_id': 1, 'stroke': 1, 'avg_glucose_level': 1, 'bmi': 1,
+               **{f: 1 for f in BINARY_FIELDS + CATEGORICAL_FIELDS}}
+
+class AssessmentColumns:
+    """Column-oriented view of the assessments collection."""
+
+    def __init__(self, patient_id, stroke, glucose, bmi, binary, categorical):
+        self.patient_id = patient_id
+        self.stroke = stroke
+        self.glucose = glucose
+        self.bmi = bmi
+        self.binary = binary
+        # field -> (codes array, labels list)
+        self.categorical = categorical
+
+    def __len__(self):
+        return len(self.stroke)
+
+    @classmethod
+    def from_documents(cls, documents):
+        rows = {name: [] for name in ('patient_id', 'stroke', 'avg_glucose_level', 'bmi')
+                + BINARY_FIELDS + CATEGORICAL_FIELDS}
+        for doc in documents:
+            for name, values in rows.items():
+                values.append(doc.get(name))
+
+        def numeric(values, dtype):
+            return np.array([np.nan if v is None else v for v in values], dtype=dtype)
+
+        bmi = numeric(rows['bmi'], np.float64)
+        # The seeder stores missing BMI as 0.0; treat it as unknown
+        bmi[bmi <= 0] = np.nan
+
+        categorical = {}
+        for name in CATEGORICAL_FIELDS:
+            # The CSV uses lower case ("never smoked") where the form uses "Never smoked"
+            values = np.array([(v or 'Unknown').capitalize() for v in rows[name]], dtype=object)
+            labels, codes = np.unique(values, return_inverse=True)
+            categorical[name] = (codes.astype(np.intp), [str(label) for label in labels])
+
+        return cls(
+            patient_id=np.array([v or 0 for v in rows['patient_id']], dtype=np.int64),
+            stroke=numeric(rows['stroke'], np.float64),
+            glucose=numeric(rows['avg_glucose_level'], np.float64),
+            bmi=bmi,
+            binary={name: numeric(rows[name], np.float64) for name in BINARY_FIELDS},
+            categorical=categorical,
+        )
+
+    def codes(self, field):
+        """Return ``(codes, labels)`` for a categorical or 0/1 field."""
+        if field in self.categorical:
+            return self.categorical[field]
+        values = self.binary[field]
+        return np.where(values == 1, 1, 0).astype(np.intp), ['No', 'Yes']
+
+def _group_rows(labels, counts, strokes):
+    rates = np.divide(strokes, counts, out=np.zeros_like(strokes, dtype=np.float64), where=counts > 0)
+    return [
+        {'label': label, 'count': int(n), 'strokes': int(s), 'rate': float(r)}
+        for label, n, s, r in zip(labels, counts, strokes, rates)
+    ]
+
+def stroke_rate_by(columns, field):
+    """Stroke count and rate for each value of ``field``."""
+    codes, labels = columns.codes(field)
+    known = ~np.isnan(columns.stroke)
+    counts = np.bincount(codes[known], minlength=len(labels))
+    strokes = np.bincount(codes[known], weights=columns.stroke[known], minlength=len(labels))
+    return _group_rows(labels, counts, strokes)
+
+def band_histogram(values, stroke, bands):
+    """Counts and stroke rate per band; NaN values are left out."""
+    edges, labels = bands
+    known = ~np.isnan(values) & ~np.isnan(stroke)
+    band = np.digitize(values[known], edges[1:])
+    counts = np.bincount(band, minlength=len(labels))
+    strokes = np.bincount(band, weights=stroke[known], minlength=len(labels))
+    return _group_rows(labels, counts, strokes)
+
+def crosstab(columns, row_field, col_field):
+    """Counts and stroke rates for every (row value, column value) pair."""
+    row_codes, row_labels = columns.codes(row_field)
+    col_codes, col_labels = columns.codes(col_field)
+    known = ~np.isnan(columns.stroke)
+    cells = row_codes[known] * len(col_labels) + col_codes[known]
+    size = len(row_labels) * len(col_labels)
+    shape = (len(row_labels), len(col_labels))
+    counts = np.bincount(cells, minlength=size).reshape(shape)
+    strokes = np.bincount(cells, weights=columns.stroke[known], minlength=size).reshape(shape)
+    rates = np.divide(strokes, counts, out=np.zeros(shape), where=counts > 0)
+    return {
+        'rows': row_labels,
+        'columns': col_labels,
+        'counts': counts.tolist(),
+        'rates': rates.tolist(),
+    }
+
+def summarize(columns):
+    """Compute every dashboard aggregate from loaded columns."""
+    total = len(columns)
+    strokes = int(np.nansum(columns.stroke)) if total else 0
+    return {
+        'total': total,
+        'strokes': strokes,
+        'stroke_rate': strokes / total if total else 0.0,
+        'mean_glucose': float(np.nanmean(columns.glucose)) if total else 0.0,
+        'mean_bmi': float(np.nanmean(columns.bmi)) if np.any(~np.isnan(columns.bmi)) else 0.0,
+        'by_field': {field: stroke_rate_by(columns, field) for field in BINARY_FIELDS + CATEGORICAL_FIELDS},
+        'glucose_bands': band_histogram(columns.glucose, columns.stroke, GLUCOSE_BANDS),
+        'bmi_bands': band_histogram(columns.bmi, columns.stroke, BMI_BANDS),
+        'smoking_by_work': crosstab(columns, 'smoking_status', 'work_type'),
+        'hypertension_by_heart_disease': crosstab(columns, 'hypertension', 'heart_disease'),
+    }
+
+def load_columns(sort_by_id=False):
+    """Read every assessment from MongoDB into column arrays.
+
+    With ``sort_by_id`` rows come in _id (creation) order, so later rows are
+    newer; otherwise the order is whatever the server returns.
+    """
+    client, coll = assessment_model.get_assessment_collection()
+    if coll is None:
+        return AssessmentColumns.from_documents([])
+    cursor = coll.find({}, _PROJECTION, sort=[('_id', 1)] if sort_by_id else None, batch_size=10000)
+    return AssessmentColumns.from_documents(cursor)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_dashboard():
+    """Return cached aggregates, recomputing after an assessment write."""
+    global _cache
+    generation = versions.get_versions([versions.ASSESSMENTS])[versions.ASSESSMENTS]
+    now = time.monotonic()
+    cached = _cache
+    if cached and cached['generation'] == generation and now - cached['loaded_at'] < Config.ANALYTICS_CACHE_TTL:
+        return cached['summary']
+    with _cache_lock:
+        cached = _cache
+        if cached and cached['generation'] == generation and now - cached['loaded_at'] < Config.ANALYTICS_CACHE_TTL:
+            return cached['summary']
+        started = time.perf_counter()
+        summary = summarize(load_columns())
+        summary['computed_ms'] = (time.perf_counter() - started) * 1000
+        _cache = {'generation': generation, 'loaded_at': now, 'summary': summary}
+        return summary
+
+def invalidate_dashboard():
+    global _cache
+    _cache = None
@@ -1,6 +1,20 @@
 from config import Config
-from bson.objectid import ObjectId
-from models.mongo.connection import mongo_conn
+from models.mongo.connection import delete_by_patient, mongo_conn
+from models import audit, versions
+
+def _rescore(documents):
+    """Update the stored risk score of the patients these assessments belong to."""
+    # Imported here because the risk model reads assessments through this module
+    from models.risk_model import score_assessments
+    try:
+        score_assessments(documents)
+    except Exception as e:
+        print(f"[risk] Failed to re-score patients: {e}")
+
+def _audit_created(documents):
+    # insert_many has set each document's _id
+    audit.record_many(audit.CREATE, audit.ASSESSMENT,
+                      [(doc['_id'], doc['patient_id'], None) for doc in documents])
 
 def get_assessment_collection():
     client, mdb = mongo_conn()
@@ -14,17 +28,12 @@ def get_assessments_by_patient_id(patient_id):
     if coll is None:
         return []
     
-    assessments = list(coll.find({"patient_id": int(patient_id)}))
-    client.close()
+    assessments = list(coll.find({"patient_id": int(patient_id)}, {"patient_id": 0}))
     return assessments
 
-def create_assessment(patient_id, hypertension, heart_disease, ever_married, work_type, residence_type, 
+def build_assessment(patient_id, hypertension, heart_disease, ever_married, work_type, residence_type, 
                      avg_glucose_level, bmi, smoking_status, stroke):
-    client, coll = get_assessment_collection()
-    if coll is None:
-        return None
-    
-    new_assessment = {
+    return {
         "patient_id": int(patient_id),
         "hypertension": int(hypertension),
         "heart_disease": int(heart_disease),
@@ -36,6 +45,52 @@ def create_assessment(patient_id, hypertension, heart_disease, ever_married, wor
         "smoking_status": smoking_status,
         "stroke": int(stroke)
     }
+
+def create_assessment(patient_id, hypertension, heart_disease, ever_married, work_type, residence_type, 
+                     avg_glucose_level, bmi, smoking_status, stroke):
+    client, coll = get_assessment_collection()
+    if coll is None:
+        return None
+    
+    new_assessment = build_assessment(patient_id, hypertension, heart_disease, ever_married, work_type,
+                                      residence_type, avg_glucose_level, bmi, smoking_status, stroke)
     result = coll.insert_one(new_assessment)
-    client.close()
-    return str(result.inserted_id)
\ No newline at end of file
+    versions.bump(versions.ASSESSMENTS, versions.patient_scope(patient_id))
+    audit.record(audit.CREATE, audit.ASSESSMENT, result.inserted_id, patient_id)
+    _rescore([new_assessment])
+    return str(result.inserted_id)
+
+def bulk_create_assessments(assessments):
+    """Insert prepared assessment documents with one unordered insert_many.
+
+    Returns the number of documents written; with ordered=False a bad
+    document does not stop the rest of the batch.
+    """
+    from pymongo.errors import BulkWriteError
+    client, coll = get_assessment_collection()
+    if coll is None or not assessments:
+        return 0
+    try:
+        result = coll.insert_many(assessments, ordered=False)
+    except BulkWriteError as e:
+        # Only the documents that were written count as changes
+        failed = {error['index'] for error in e.details.get('writeErrors', [])}
+        written = [doc for i, doc in enumerate(assessments) if i not in failed]
+        inserted = e.details.get('nInserted', 0)
+    else:
+        written, inserted = assessments, len(result.inserted_ids)
+    if written:
+        versions.bump(versions.ASSESSMENTS, *(versions.patient_scope(doc['patient_id']) for doc in written))
+    _audit_created(written)
+    _rescore(written)
+    return inserted
+
+def delete_assessments_for_patients(patient_ids):
+    """Remove every assessment of ``patient_ids``; returns the number deleted."""
+    client, coll = get_assessment_collection()
+    if coll is None:
+        return 0
+    deleted = delete_by_patient(coll, patient_ids)
+    if deleted:
+        versions.bump(versions.ASSESSMENTS)
+    return deleted
\ No newline at end of file
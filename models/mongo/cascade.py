@@ -0,0 +1,108 @@
+import time
+from config import Config
+from models.db import get_db
+from models.mongo.allergy_model import delete_allergies_for_patients, get_allergy_collection
+from models.mongo.assessment_model import delete_assessments_for_patients, get_assessment_collection
+
+# Keeping MongoDB in step with the patients table.
+#
+# Deleting a patient removes their allergies and assessments with batched
+# delete_many calls once the SQLite delete has committed. If Mongo fails at
+# that point the documents are left behind as orphans rather than losing
+# clinical data for a patient that still exists, and sweep_orphans() picks
+# them up later.
+#
+# The sweeper never loads either side into memory: each collection's
+# distinct patient_ids come back sorted from an aggregate cursor and are
+# merge-walked against the patients table read in id order, a page at a
+# time. Orphan ids are deleted in MONGO_DELETE_BATCH_SIZE batches with a
+# pause between them so a sweep does not starve live traffic.
+
+SWEPT_COLLECTIONS = (
+    ('allergies', get_allergy_collection, delete_allergies_for_patients),
+    ('assessments', get_assessment_collection, delete_assessments_for_patients),
+)
+
+def delete_patient_documents(patient_ids):
+    """Remove the Mongo documents of deleted patients; returns counts per collection."""
+    return {name: delete(patient_ids) for name, _, delete in SWEPT_COLLECTIONS}
+
+def _patient_ids(page_size):
+    # Short keyset reads, so no SQLite transaction stays open during a sweep
+    after = 0
+    while True:
+        with get_db() as conn:
+            rows = conn.execute('SELECT id FROM patients WHERE id > ? ORDER BY id LIMIT ?',
+                                (after, page_size)).fetchall()
+        for (pid,) in rows:
+            yield pid
+        if len(rows) < page_size:
+            return
+        after = rows[-1][0]
+
+def _referenced_ids(coll, batch_size):
+    pipeline = [{'$group': {'_id': '$patient_id'}}, {'$sort': {'_id': 1}}]
+    for group in coll.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size):
+        if isinstance(group['_id'], int):
+            yield group['_id']
+
+def _missing(candidates, existing):
+    """Ascending ``candidates`` that are not in the ascending ``existing`` stream."""
+    existing = iter(existing)
+    current = next(existing, None)
+    for pid in candidates:
+        while current is not None and current < pid:
+            current = next(existing, None)
+        if current != pid:
+            yield pid
+
+def _batches(ids, size):
+    batch = []
+    for pid in ids:
+        batch.append(pid)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _still_missing(batch):
+    # A patient created after its page was read is not an orphan
+    placeholders = ', '.join('?' * len(batch))
+    with get_db() as conn:
+        found = {pid for (pid,) in conn.execute(
+            f'SELECT id FROM patients WHERE id IN ({placeholders})', batch)}
+    return [pid for pid in batch if pid not in found]
+
+def find_orphans(coll, batch_size=None):
+    """Yield lists of patient_ids referenced in ``coll`` that have no patients row."""
+    batch_size = batch_size or Config.MONGO_DELETE_BATCH_SIZE
+    orphans = _missing(_referenced_ids(coll, batch_size), _patient_ids(batch_size))
+    for batch in _batches(orphans, batch_size):
+        batch = _still_missing(batch)
+        if batch:
+            yield batch
+
+def sweep_orphans(dry_run=False, batch_size=None, pause=None):
+    """Delete (or with ``dry_run`` only count) orphaned allergies and assessments.
+
+    Returns ``{collection: {'patients': n, 'documents': n, 'batches': n}}``.
+    """
+    batch_size = batch_size or Config.MONGO_DELETE_BATCH_SIZE
+    pause = Config.ORPHAN_SWEEP_PAUSE if pause is None else pause
+    report = {}
+    for name, get_collection, delete in SWEPT_COLLECTIONS:
+        _, coll = get_collection()
+        stats = report[name] = {'patients': 0, 'documents': 0, 'batches': 0}
+        if coll is None:
+            continue
+        for batch in find_orphans(coll, batch_size):
+            if stats['batches'] and pause:
+                time.sleep(pause)
+            stats['patients'] += len(batch)
+            stats['batches'] += 1
+            if dry_run:
+                stats['documents'] += coll.count_documents({'patient_id': {'$in': batch}})
+            else:
+                stats['documents'] += delete(batch)
+    return report
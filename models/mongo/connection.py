@@ -1,12 +1,145 @@
+import os
+import threading
 from config import Config
-from pymongo import MongoClient
+from utils.metrics import observe_mongo
+
+# pymongo is imported with the first client rather than with this module, so
+# importing the app (or a script that never touches Mongo) does not pay for it.
+
+class _PoolCounts:
+    """Counts pool activity so we can confirm connections are being reused."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.connections_created = 0
+
+    def checked_out(self):
+        with self._lock:
+            self.checkouts += 1
+
+    def created(self):
+        with self._lock:
+            self.connections_created += 1
+
+_pool_counts = _PoolCounts()
+_listeners = None
+
+def _event_listeners():
+    global _listeners
+    if _listeners is None:
+        from pymongo import monitoring
+
+        class PoolCounter(monitoring.ConnectionPoolListener):
+            def connection_checked_out(self, event):
+                _pool_counts.checked_out()
+
+            def connection_created(self, event):
+                _pool_counts.created()
+
+            # Remaining pool events are not tracked
+            def pool_created(self, event): pass
+            def pool_ready(self, event): pass
+            def pool_cleared(self, event): pass
+            def pool_closed(self, event): pass
+            def connection_ready(self, event): pass
+            def connection_closed(self, event): pass
+            def connection_check_out_started(self, event): pass
+            def connection_check_out_failed(self, event): pass
+            def connection_checked_in(self, event): pass
+
+        class CommandTimer(monitoring.CommandListener):
+            """Reports the duration of every MongoDB command to /metrics."""
+
+            def started(self, event):
+                pass
+
+            def succeeded(self, event):
+                observe_mongo(event.command_name, event.duration_micros / 1e6)
+
+            def failed(self, event):
+                observe_mongo(event.command_name, event.duration_micros / 1e6)
+
+        _listeners = [PoolCounter(), CommandTimer()]
+    return _listeners
+
+_client = None
+_client_pid = None
+_clients_created = 0
+_lock = threading.Lock()
+
+def _reset_after_fork():
+    # A MongoClient must not be shared across fork(); the child builds its own
+    global _client, _client_pid, _lock
+    _client = None
+    _client_pid = None
+    _lock = threading.Lock()
+    _pool_counts.reset()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_client():
+    """Return the process-wide MongoClient, creating it on first use."""
+    global _client, _client_pid, _clients_created
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                from pymongo import MongoClient
+                _client = MongoClient(
+                    Config.MONGO_URI,
+                    maxPoolSize=Config.MONGO_POOL_SIZE,
+                    serverSelectionTimeoutMS=Config.MONGO_TIMEOUT_MS,
+                    event_listeners=_event_listeners(),
+                )
+                _client_pid = pid
+                _clients_created += 1
+    return _client
+
+def use_client(client):
+    """Install ``client`` as this process's shared client (benchmarks and tests)."""
+    global _client, _client_pid
+    with _lock:
+        _client = client
+        _client_pid = os.getpid()
 
 def mongo_conn():
     """Establish MongoDB connection"""
     try:
-        client = MongoClient(Config.MONGO_URI)
+        client = get_client()
         mdb = client[Config.MONGO_DB]
         return client, mdb
     except Exception as e:
         print(f"MongoDB connection error: {str(e)}")
-        return None, None
\ No newline at end of file
+        return None, None
+
+def delete_by_patient(coll, patient_ids, batch_size=None):
+    """delete_many every document of ``patient_ids`` in ``coll``, a batch of ids at a time."""
+    patient_ids = [int(pid) for pid in patient_ids]
+    batch_size = batch_size or Config.MONGO_DELETE_BATCH_SIZE
+    deleted = 0
+    for start in range(0, len(patient_ids), batch_size):
+        batch = patient_ids[start:start + batch_size]
+        deleted += coll.delete_many({'patient_id': {'$in': batch}}).deleted_count
+    return deleted
+
+def close_client():
+    """Close the shared client, e.g. on worker shutdown."""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _client_pid = None
+
+def mongo_pool_stats():
+    return {
+        'clients_created': _clients_created,
+        'checkouts': _pool_counts.checkouts,
+        'connections_created': _pool_counts.connections_created,
+        'pool_size': Config.MONGO_POOL_SIZE,
+    }
\ No newline at end of file
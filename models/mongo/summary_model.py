@@ -0,0 +1,84 @@
+from config import Config
+from models.mongo.assessment_model import get_assessment_collection
+from utils.mongo_validation import SEVERITIES
+
+# Per-patient clinical summary: assessment and allergy counts, the highest
+# allergy severity and the latest assessment.
+#
+# One aggregate command answers it for any number of patients: the
+# assessments matching the ids are projected down to the summary fields,
+# the patients' allergies are pulled into the same pipeline with
+# $unionWith (projected to a severity rank only), and a $group per patient
+# folds both into counts and maxima. No full documents leave the server and
+# a page of patients costs one round trip instead of two queries per row.
+# $unionWith needs MongoDB 4.4 or later.
+#
+# ObjectIds increase with insertion time, so "latest" is the highest _id.
+
+# Fields of the latest assessment carried into the summary
+LATEST_FIELDS = ('hypertension', 'heart_disease', 'avg_glucose_level', 'bmi', 'smoking_status', 'stroke')
+
+def empty_summary():
+    return {'assessment_count': 0, 'allergy_count': 0, 'max_allergy_severity': None,
+            'latest_assessment': None}
+
+def build_pipeline(patient_ids):
+    match = {'$match': {'patient_id': {'$in': patient_ids}}}
+    return [
+        match,
+        {'$project': {
+            'patient_id': 1,
+            'assessments': {'$literal': 1},
+            'assessment': {'_id': '$_id', **{f: f'${f}' for f in LATEST_FIELDS}},
+        }},
+        {'$unionWith': {'coll': Config.MONGO_ALLERGY_COL, 'pipeline': [
+            match,
+            {'$project': {
+                '_id': 0,
+                'patient_id': 1,
+                'allergies': {'$literal': 1},
+                # -1 for anything outside SEVERITIES, so it never wins $max
+                'severity_rank': {'$indexOfArray': [list(SEVERITIES), '$severity']},
+            }},
+        ]}},
+        # Assessments newest first, ahead of each patient's allergies, so
+        # $first picks the latest one
+        {'$sort': {'patient_id': 1, 'assessments': -1, '_id': -1}},
+        {'$group': {
+            '_id': '$patient_id',
+            'assessment_count': {'$sum': '$assessments'},
+            'allergy_count': {'$sum': '$allergies'},
+            'max_severity_rank': {'$max': '$severity_rank'},
+            'latest_assessment': {'$first': '$assessment'},
+        }},
+    ]
+
+def _summary(group):
+    rank = group.get('max_severity_rank')
+    latest = group.get('latest_assessment')
+    if latest:
+        latest['_id'] = str(latest['_id'])
+    return {
+        'assessment_count': group.get('assessment_count', 0),
+        'allergy_count': group.get('allergy_count', 0),
+        'max_allergy_severity': SEVERITIES[rank] if rank is not None and rank >= 0 else None,
+        'latest_assessment': latest,
+    }
+
+def get_clinical_summaries(patient_ids):
+    """Map each of ``patient_ids`` to its summary in one aggregate command.
+
+    Patients with no assessments or allergies get an empty summary; an
+    empty dict means Mongo is not available.
+    """
+    patient_ids = sorted({int(pid) for pid in patient_ids})
+    client, coll = get_assessment_collection()
+    if coll is None or not patient_ids:
+        return {}
+    summaries = {pid: empty_summary() for pid in patient_ids}
+    for group in coll.aggregate(build_pipeline(patient_ids)):
+        summaries[group['_id']] = _summary(group)
+    return summaries
+
+def get_clinical_summary(patient_id):
+    return get_clinical_summaries([patient_id]).get(int(patient_id), empty_summary())
@@ -1,7 +1,31 @@
-import sqlite3
+import re
+from models.db import get_db
+from models import audit, versions
+from models.mongo.cascade import delete_patient_documents
+from utils.pagination import encode_cursor, decode_cursor
+
+PATIENT_COLUMNS = 'id, first_name, last_name, email, gender, date_of_birth, created_by, risk_score'
+
+# Search terms shorter than this would match too much of the index to rank quickly
+MIN_SEARCH_TERM = 2
+_SEARCH_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# Columns the listing may be sorted by; each has an index on (column, id)
+SORTABLE_COLUMNS = ('id', 'first_name', 'last_name', 'email', 'risk_score')
+
+# Sort keys indexed as an expression; unscored patients sort as -1
+SORT_EXPRESSIONS = {'risk_score': 'IFNULL(risk_score, -1)'}
+
+def _delete_documents(patient_ids):
+    """Cascade a committed patient delete to Mongo; orphans are left for the sweeper on failure."""
+    try:
+        return delete_patient_documents(patient_ids)
+    except Exception as e:
+        print(f"[cascade] Failed to delete Mongo documents of {len(patient_ids)} patients: {e}")
+        return None
 
 class Patient:
-    def __init__(self, id, first_name, last_name, email, gender, date_of_birth, created_by):
+    def __init__(self, id, first_name, last_name, email, gender, date_of_birth, created_by, risk_score=None):
         self.id = id
         self.first_name = first_name
         self.last_name = last_name
@@ -9,44 +33,177 @@ class Patient:
         self.gender = gender
         self.date_of_birth = date_of_birth
         self.created_by = created_by
+        self.risk_score = risk_score
     
     # Create a Patient
     
     @staticmethod
     def create_patient(first_name, last_name, email, gender, date_of_birth, created_by):
-        conn = sqlite3.connect('stroke_project.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO patients (first_name, last_name, email, gender, date_of_birth, created_by)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (first_name, last_name, email, gender, date_of_birth, created_by))
-        conn.commit()
-        conn.close()
-        return True
+        with get_db() as conn:
+            cursor = conn.execute('''
+                INSERT INTO patients (first_name, last_name, email, gender, date_of_birth, created_by)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (first_name, last_name, email, gender, date_of_birth, created_by))
+            versions.bump(versions.PATIENTS, versions.patient_scope(cursor.lastrowid))
+        audit.record(audit.CREATE, audit.PATIENT, cursor.lastrowid, cursor.lastrowid, {
+            'first_name': first_name, 'last_name': last_name, 'email': email,
+            'gender': gender, 'date_of_birth': date_of_birth,
+        })
+        return cursor.lastrowid
+
+    # Create many Patients in one transaction
+
+    @staticmethod
+    def bulk_create_patients(rows):
+        """Insert ``(first_name, last_name, email, gender, date_of_birth, created_by)``
+        tuples with a single executemany and return the new ids in input order.
+        """
+        rows = list(rows)
+        if not rows:
+            return []
+        with get_db() as conn:
+            if not conn.in_transaction:
+                # Take the write lock up front so no other writer can interleave ids
+                conn.execute('BEGIN IMMEDIATE')
+            result = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'patients'").fetchone()
+            last_id = result[0] if result else 0
+            conn.executemany('''
+                INSERT INTO patients (first_name, last_name, email, gender, date_of_birth, created_by)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+            ids = [row[0] for row in conn.execute('SELECT id FROM patients WHERE id > ? ORDER BY id', (last_id,))]
+            if len(ids) != len(rows):
+                raise RuntimeError('Could not map generated patient ids')
+            versions.bump(versions.PATIENTS)
+        audit.record_many(audit.CREATE, audit.PATIENT, [(pid, pid, None) for pid in ids])
+        return ids
     
     # Retrieve all Patients
 
     @staticmethod
     def get_all_patients():
-        conn = sqlite3.connect('stroke_project.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, first_name, last_name, email, gender, date_of_birth, created_by FROM patients')
-        rows = cursor.fetchall()
-        conn.close()
+        with get_db() as conn:
+            rows = conn.execute(f'SELECT {PATIENT_COLUMNS} FROM patients').fetchall()
         patients = []
         for row in rows:
             patients.append(Patient(*row))
         return patients
     
+    # Retrieve Patients in id order, one batch at a time
+
+    @staticmethod
+    def get_patients_after(after_id, limit):
+        with get_db() as conn:
+            rows = conn.execute(f'''
+                SELECT {PATIENT_COLUMNS} FROM patients
+                WHERE id > ? ORDER BY id LIMIT ?
+            ''', (after_id, limit)).fetchall()
+        return [Patient(*row) for row in rows]
+
+    # Retrieve one page of Patients using keyset (seek) pagination
+
+    @staticmethod
+    def get_patients_page(sort='id', direction='asc', after=None, before=None, limit=25):
+        """Return ``(patients, next_cursor, prev_cursor)`` for one page.
+
+        Pages are addressed by the sort key of the boundary row rather than
+        an OFFSET, so every page costs one index seek regardless of depth.
+        """
+        if sort not in SORTABLE_COLUMNS:
+            raise ValueError('Invalid sort column')
+        if direction not in ('asc', 'desc'):
+            raise ValueError('Invalid sort direction')
+
+        key_columns = ('id',) if sort == 'id' else (sort, 'id')
+        key_exprs = [SORT_EXPRESSIONS.get(col, col) for col in key_columns]
+        key_sql = '(' + ', '.join(key_exprs) + ')'
+        placeholders = '(' + ', '.join('?' * len(key_columns)) + ')'
+        ascending = direction == 'asc'
+        backwards = before is not None
+        if backwards == ascending:
+            op, order = '<', 'DESC'
+        else:
+            op, order = '>', 'ASC'
+
+        params = []
+        where = ''
+        cursor = before if backwards else after
+        if cursor is not None:
+            params = decode_cursor(cursor, len(key_columns))
+            where = f'WHERE {key_sql} {op} {placeholders}'
+        order_by = ', '.join(f'{expr} {order}' for expr in key_exprs)
+
+        with get_db() as conn:
+            rows = conn.execute(
+                f'SELECT {PATIENT_COLUMNS} FROM patients {where} ORDER BY {order_by} LIMIT ?',
+                (*params, limit + 1),
+            ).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backwards:
+            rows.reverse()
+        patients = [Patient(*row) for row in rows]
+        if not patients:
+            return patients, None, None
+
+        def key(patient):
+            values = [getattr(patient, col) for col in key_columns]
+            if sort == 'risk_score' and values[0] is None:
+                values[0] = -1
+            return values
+
+        if backwards:
+            next_cursor = encode_cursor(key(patients[-1]))
+            prev_cursor = encode_cursor(key(patients[0])) if has_more else None
+        else:
+            next_cursor = encode_cursor(key(patients[-1])) if has_more else None
+            prev_cursor = encode_cursor(key(patients[0])) if cursor is not None else None
+        return patients, next_cursor, prev_cursor
+
+    # Search Patients by name or email
+
+    @staticmethod
+    def search_patients(query, limit=20, offset=0):
+        """Return ``(patients, has_more)`` ranked by relevance for a type-ahead query.
+
+        Every word in ``query`` is matched as a prefix against first name,
+        last name and email through the ``patients_fts`` index.
+        """
+        terms = [t for t in _SEARCH_TOKEN.findall(query.lower()) if len(t) >= MIN_SEARCH_TERM]
+        if not terms:
+            return [], False
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # Very short prefixes match a large slice of the index; return them in
+        # index order so the scan can stop at LIMIT instead of ranking every hit
+        order_by = 'patients_fts.rank' if max(len(t) for t in terms) > MIN_SEARCH_TERM else 'patients_fts.rowid'
+
+        columns = ', '.join(f'p.{col.strip()}' for col in PATIENT_COLUMNS.split(','))
+        with get_db() as conn:
+            rows = conn.execute(f'''
+                SELECT {columns}
+                FROM patients_fts
+                JOIN patients p ON p.id = patients_fts.rowid
+                WHERE patients_fts MATCH ?
+                ORDER BY {order_by}
+                LIMIT ? OFFSET ?
+            ''', (match, limit + 1, offset)).fetchall()
+        return [Patient(*row) for row in rows[:limit]], len(rows) > limit
+
+    # Count Patients from the trigger-maintained counter
+
+    @staticmethod
+    def count_patients():
+        with get_db() as conn:
+            result = conn.execute("SELECT row_count FROM table_stats WHERE table_name = 'patients'").fetchone()
+        return result[0] if result else 0
+    
     # Retrieve Patient by ID
 
     @staticmethod
     def get_patient_by_id(patient_id):
-        conn = sqlite3.connect('stroke_project.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, first_name, last_name, email, gender, date_of_birth, created_by FROM patients WHERE id = ?', (patient_id,))
-        result = cursor.fetchone()
-        conn.close()
+        with get_db() as conn:
+            result = conn.execute(f'SELECT {PATIENT_COLUMNS} FROM patients WHERE id = ?', (patient_id,)).fetchone()
         if result:
             return Patient(*result)
         return None
@@ -55,24 +212,49 @@ class Patient:
 
     @staticmethod
     def update_patient(patient_id, first_name, last_name, gender, date_of_birth):
-        conn = sqlite3.connect('stroke_project.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE patients 
-            SET first_name = ?, last_name = ?, gender = ?, date_of_birth = ?
-            WHERE id = ?
-        ''', (first_name, last_name, gender, date_of_birth, patient_id))
-        conn.commit()
-        conn.close()
+        with get_db() as conn:
+            conn.execute('''
+                UPDATE patients 
+                SET first_name = ?, last_name = ?, gender = ?, date_of_birth = ?
+                WHERE id = ?
+            ''', (first_name, last_name, gender, date_of_birth, patient_id))
+            versions.bump(versions.PATIENTS, versions.patient_scope(patient_id))
+        audit.record(audit.UPDATE, audit.PATIENT, patient_id, patient_id, {
+            'first_name': first_name, 'last_name': last_name,
+            'gender': gender, 'date_of_birth': date_of_birth,
+        })
         return True
     
     # Delete Patient 
 
     @staticmethod
     def delete_patient(patient_id):
-        conn = sqlite3.connect('stroke_project.db')
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM patients WHERE id = ?', (patient_id,))
-        conn.commit()
-        conn.close()
-        return True
\ No newline at end of file
+        with get_db() as conn:
+            conn.execute('DELETE FROM patients WHERE id = ?', (patient_id,))
+            versions.bump(versions.PATIENTS, versions.patient_scope(patient_id))
+        removed = _delete_documents([patient_id])
+        audit.record(audit.DELETE, audit.PATIENT, patient_id, patient_id, removed)
+        return True
+
+    # Delete many Patients in one transaction
+
+    @staticmethod
+    def delete_patients(patient_ids):
+        with get_db() as conn:
+            conn.executemany('DELETE FROM patients WHERE id = ?', [(pid,) for pid in patient_ids])
+            versions.bump(versions.PATIENTS, *(versions.patient_scope(pid) for pid in patient_ids))
+        _delete_documents(patient_ids)
+        audit.record_many(audit.DELETE, audit.PATIENT, [(pid, pid, None) for pid in patient_ids])
+        return True
+
+    # Store risk scores for many Patients in one transaction
+
+    @staticmethod
+    def update_risk_scores(scores):
+        """Write ``(patient_id, score)`` pairs."""
+        with get_db() as conn:
+            conn.executemany('UPDATE patients SET risk_score = ? WHERE id = ?',
+                             [(score, patient_id) for patient_id, score in scores])
+            # Only the listing shows scores
+            versions.bump(versions.PATIENTS)
+        return True
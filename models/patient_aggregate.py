@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from config import Config
+from models.patient import Patient
+from models.mongo.allergy_model import get_allergies_by_patient_id
+from models.mongo.assessment_model import get_assessments_by_patient_id
+
+# Loads everything the patient detail page needs from SQLite and MongoDB
+# at the same time, so page latency is the slowest source, not the sum.
+
+class PatientAggregate:
+    def __init__(self, patient, allergies, assessments, timings, errors):
+        self.patient = patient
+        self.allergies = allergies
+        self.assessments = assessments
+        # source -> milliseconds, plus 'total'
+        self.timings = timings
+        # source -> message, for sources that failed or timed out
+        self.errors = errors
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=Config.AGGREGATE_WORKERS,
+                                               thread_name_prefix='patient-loader')
+                _executor_pid = pid
+    return _executor
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+def _sources():
+    # name -> (loader, fallback, timeout in seconds)
+    return {
+        'patient': (Patient.get_patient_by_id, None, Config.AGGREGATE_SQLITE_TIMEOUT),
+        'allergies': (get_allergies_by_patient_id, [], Config.AGGREGATE_MONGO_TIMEOUT),
+        'assessments': (get_assessments_by_patient_id, [], Config.AGGREGATE_MONGO_TIMEOUT),
+    }
+
+def load_patient_aggregate(patient_id):
+    """Fetch the patient row, allergies and assessments concurrently.
+
+    Each source has its own timeout (``AGGREGATE_SQLITE_TIMEOUT`` /
+    ``AGGREGATE_MONGO_TIMEOUT`` seconds). A Mongo source that fails or
+    times out yields an empty list and an entry in ``errors`` so the page
+    can still render; a failing SQLite lookup is raised.
+    """
+    executor = _get_executor()
+    started = time.perf_counter()
+    sources = _sources()
+    futures = {name: executor.submit(_timed, fn, patient_id) for name, (fn, _, _) in sources.items()}
+
+    results, timings, errors = {}, {}, {}
+    for name, (_, fallback, timeout) in sources.items():
+        remaining = max(timeout - (time.perf_counter() - started), 0)
+        try:
+            results[name], timings[name] = futures[name].result(timeout=remaining)
+        except FutureTimeout:
+            if name == 'patient':
+                raise
+            results[name], timings[name] = fallback, timeout * 1000
+            errors[name] = 'timed out'
+        except Exception as e:
+            if name == 'patient':
+                raise
+            results[name], timings[name] = fallback, (time.perf_counter() - started) * 1000
+            errors[name] = str(e)
+    timings['total'] = (time.perf_counter() - started) * 1000
+
+    return PatientAggregate(results['patient'], results['allergies'], results['assessments'], timings, errors)
\ No newline at end of file
@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+from config import Config
+from models.patient import Patient
+from models.mongo.allergy_model import get_allergy_collection
+from models.mongo.assessment_model import get_assessment_collection
+
+# Streaming export of patients joined with their MongoDB documents.
+#
+# Patients are read from SQLite in id order, EXPORT_BATCH_SIZE at a time,
+# and each batch's assessments and allergies are fetched with one $in query
+# per collection. Only one batch is held in memory, so an export of the
+# whole cohort uses the same memory as an export of a single page.
+
+PATIENT_FIELDS = ('id', 'first_name', 'last_name', 'email', 'gender', 'date_of_birth', 'created_by')
+ASSESSMENT_FIELDS = ('hypertension', 'heart_disease', 'ever_married', 'work_type', 'residence_type',
+                     'avg_glucose_level', 'bmi', 'smoking_status', 'stroke')
+ALLERGY_FIELDS = ('allergen', 'severity', 'date_added')
+
+_ASSESSMENT_PROJECTION = {'_id': 0, 'patient_id': 1, **{f: 1 for f in ASSESSMENT_FIELDS}}
+_ALLERGY_PROJECTION = {'_id': 0, 'patient_id': 1, **{f: 1 for f in ALLERGY_FIELDS}}
+
+def _group_by_patient(coll, patient_ids, projection):
+    grouped = {}
+    cursor = coll.find({'patient_id': {'$in': patient_ids}}, projection, batch_size=Config.EXPORT_BATCH_SIZE)
+    for doc in cursor:
+        grouped.setdefault(doc.pop('patient_id'), []).append(doc)
+    return grouped
+
+def _iter_records(assessments, allergies, batch_size):
+    after_id = 0
+    while True:
+        patients = Patient.get_patients_after(after_id, batch_size)
+        if not patients:
+            return
+        ids = [p.id for p in patients]
+        assessments_by_id = _group_by_patient(assessments, ids, _ASSESSMENT_PROJECTION)
+        allergies_by_id = _group_by_patient(allergies, ids, _ALLERGY_PROJECTION)
+        for patient in patients:
+            record = {field: getattr(patient, field) for field in PATIENT_FIELDS}
+            record['assessments'] = assessments_by_id.get(patient.id, [])
+            record['allergies'] = allergies_by_id.get(patient.id, [])
+            yield record
+        after_id = ids[-1]
+
+def export_records(batch_size=None):
+    """Return a generator of patient dicts with ``assessments`` and ``allergies`` lists.
+
+    Raises RuntimeError up front when MongoDB is unavailable, rather than
+    part-way through a streamed response.
+    """
+    client, assessments = get_assessment_collection()
+    client, allergies = get_allergy_collection()
+    if assessments is None or allergies is None:
+        raise RuntimeError('MongoDB is not available')
+    # The shared client connects lazily, so a down server would otherwise
+    # only fail once the first batch is read, after the headers have gone out
+    try:
+        client.admin.command('ping')
+    except Exception as e:
+        raise RuntimeError(f'MongoDB is not available: {e}') from e
+    return _iter_records(assessments, allergies, batch_size or Config.EXPORT_BATCH_SIZE)
+
+def iter_ndjson(records):
+    """One JSON object per patient, with nested assessments and allergies."""
+    for record in records:
+        yield json.dumps(record, default=str) + '\n'
+
+CSV_COLUMNS = PATIENT_FIELDS + ASSESSMENT_FIELDS + ('allergies',)
+
+def _csv_rows(record):
+    patient = [record[field] for field in PATIENT_FIELDS]
+    allergies = '; '.join(f"{a.get('allergen')} ({a.get('severity')})" for a in record['allergies'])
+    if not record['assessments']:
+        return [patient + [''] * len(ASSESSMENT_FIELDS) + [allergies]]
+    return [patient + [a.get(field, '') for field in ASSESSMENT_FIELDS] + [allergies]
+            for a in record['assessments']]
+
+def iter_csv(records, rows_per_chunk=500):
+    """One row per assessment (patients without one get a single row), in text chunks."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    pending = 0
+    for record in records:
+        for row in _csv_rows(record):
+            writer.writerow(row)
+            pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+}
@@ -0,0 +1,172 @@
+import csv
+import io
+import time
+from datetime import datetime
+from itertools import islice
+from config import Config
+from models.patient import Patient
+from models.mongo.assessment_model import build_assessment, bulk_create_assessments
+from utils.patient_utils import PATIENT_SCHEMA
+from utils.mongo_validation import IMPORT_ASSESSMENT_SCHEMA, SMOKING_STATUSES, WORK_TYPES
+from utils.schema import Field, number
+
+# Chunked import of patients and assessments from an uploaded CSV.
+#
+# The file is read as a stream in chunks of IMPORT_CHUNK_SIZE rows. Each
+# chunk is checked in one batch against the same schemas as the add-patient
+# and add-assessment forms; its valid rows go to SQLite in one transaction
+# and to MongoDB in one insert_many. Invalid rows are reported by line number
+# (at most IMPORT_MAX_ERRORS of them) and skipped.
+
+REQUIRED_COLUMNS = ('first_name', 'last_name', 'email', 'gender', 'age', 'hypertension', 'heart_disease',
+                    'ever_married', 'work_type', 'avg_glucose_level', 'bmi', 'smoking_status', 'stroke')
+
+# Date of birth is derived from age, so rows are checked on age instead
+IMPORT_PATIENT_SCHEMA = PATIENT_SCHEMA.extend(
+    Field('date_of_birth', *PATIENT_SCHEMA.field('date_of_birth').rules, optional=True),
+    Field('age', number(0, 120, 'Invalid age', 'Invalid age')),
+)
+
+def _canonical(value, choices):
+    lowered = value.lower()
+    for choice in choices:
+        if choice.lower() == lowered:
+            return choice
+    return value
+
+def _field(row, name):
+    return (row.get(name) or '').strip()
+
+def _binary(value):
+    # The dataset writes flags as "0"/"1" or "0.0"/"1.0"
+    return value[:-2] if value in ('0.0', '1.0') else value
+
+def normalise_row(row, current_year):
+    """Map a CSV row onto ``(patient, assessment)`` records in the form vocabulary."""
+    age = _field(row, 'age')
+    try:
+        date_of_birth = f"{current_year - int(float(age))}-01-01"
+    except ValueError:
+        date_of_birth = None
+    patient = {
+        'first_name': _field(row, 'first_name'),
+        'last_name': _field(row, 'last_name'),
+        'email': _field(row, 'email'),
+        'gender': _field(row, 'gender'),
+        'age': age,
+        'date_of_birth': date_of_birth,
+    }
+    assessment = {
+        'hypertension': _binary(_field(row, 'hypertension')),
+        'heart_disease': _binary(_field(row, 'heart_disease')),
+        'ever_married': _field(row, 'ever_married'),
+        # The stroke dataset writes some values in lower case ("never smoked", "children")
+        'work_type': _canonical(_field(row, 'work_type'), WORK_TYPES),
+        # Some datasets use "Residence_type", others "residence_type"
+        'residence_type': _field(row, 'Residence_type') or _field(row, 'residence_type'),
+        'avg_glucose_level': _field(row, 'avg_glucose_level'),
+        'bmi': _field(row, 'bmi') or None,
+        'smoking_status': _canonical(_field(row, 'smoking_status'), SMOKING_STATUSES),
+        'stroke': _binary(_field(row, 'stroke')),
+    }
+    return patient, assessment
+
+def validate_rows(rows, current_year):
+    """Normalise and batch-validate CSV rows.
+
+    Returns ``(records, errors)``: a ``(patient, assessment)`` pair and a
+    list of error messages for every row.
+    """
+    records = [normalise_row(row, current_year) for row in rows]
+    patient_errors = IMPORT_PATIENT_SCHEMA.validate_many(patient for patient, _ in records)
+    assessment_errors = IMPORT_ASSESSMENT_SCHEMA.validate_many(assessment for _, assessment in records)
+    return records, [p + a for p, a in zip(patient_errors, assessment_errors)]
+
+def patient_tuple(patient, created_by):
+    return (patient['first_name'], patient['last_name'], patient['email'], patient['gender'],
+            patient['date_of_birth'], created_by)
+
+def assessment_document(patient_id, assessment):
+    # Unknown BMI is stored as 0.0
+    return build_assessment(patient_id, **dict(assessment, bmi=assessment['bmi'] or 0.0))
+
+class ImportReport:
+    def __init__(self, max_errors):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def error(self, line, messages, email=''):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'email': email, 'errors': messages})
+
+    def as_dict(self):
+        seconds = time.perf_counter() - self.started
+        return {
+            'rows': self.rows,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'seconds': seconds,
+            'rows_per_second': self.rows / seconds if seconds > 0 else 0.0,
+        }
+
+def _import_chunk(chunk, report, created_by, current_year):
+    records, errors = validate_rows([row for _, row in chunk], current_year)
+    valid = []
+    for (line, row), record, row_errors in zip(chunk, records, errors):
+        if row_errors:
+            report.error(line, row_errors, _field(row, 'email'))
+        else:
+            valid.append((line, row) + record)
+    if not valid:
+        return
+
+    try:
+        patient_ids = Patient.bulk_create_patients([patient_tuple(patient, created_by) for _, _, patient, _ in valid])
+    except Exception as e:
+        for line, row, _, _ in valid:
+            report.error(line, [f'Database error: {e}'], _field(row, 'email'))
+        return
+
+    assessments = [assessment_document(pid, assessment) for pid, (_, _, _, assessment) in zip(patient_ids, valid)]
+    try:
+        written = bulk_create_assessments(assessments)
+        if written != len(assessments):
+            raise RuntimeError(f'only {written} of {len(assessments)} assessments were written')
+    except Exception as e:
+        # Keep the stores consistent: drop the chunk's patients again
+        Patient.delete_patients(patient_ids)
+        for line, row, _, _ in valid:
+            report.error(line, [f'MongoDB error: {e}'], _field(row, 'email'))
+        return
+    report.imported += len(valid)
+
+def import_csv(stream, created_by, chunk_size=None, max_errors=None):
+    """Import a binary or text CSV stream; returns the report dict.
+
+    Raises ValueError when required columns are missing.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(stream)
+    missing = [col for col in REQUIRED_COLUMNS if col not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+
+    report = ImportReport(max_errors if max_errors is not None else Config.IMPORT_MAX_ERRORS)
+    current_year = datetime.now().year
+    # Line 1 is the header
+    rows = enumerate(reader, start=2)
+    while True:
+        chunk = list(islice(rows, chunk_size or Config.IMPORT_CHUNK_SIZE))
+        if not chunk:
+            break
+        report.rows += len(chunk)
+        _import_chunk(chunk, report, created_by, current_year)
+    return report.as_dict()
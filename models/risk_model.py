@@ -0,0 +1,238 @@
+import json
+from datetime import datetime, timezone
+import numpy as np
+from models.db import get_db
+from models.patient import Patient
+from models.mongo import analytics_model
+from models.mongo.analytics_model import AssessmentColumns
+from utils.mongo_validation import WORK_TYPES, SMOKING_STATUSES
+
+# Stroke risk model.
+#
+# A logistic regression over the stroke dataset features, fitted with
+# Newton's method in NumPy. Training reads every assessment once (through
+# the analytics column loader) and joins age and gender from SQLite.
+# Scores are the predicted probability for each patient's latest
+# assessment and are stored in patients.risk_score, which is indexed so
+# the listing can sort by it. A new assessment re-scores just its patient.
+
+# One-hot levels; the first of each group is the reference level
+_CATEGORIES = {
+    'work_type': WORK_TYPES,
+    'smoking_status': SMOKING_STATUSES,
+}
+
+FEATURES = (
+    ['age', 'male', 'hypertension', 'heart_disease', 'ever_married', 'urban',
+     'avg_glucose_level', 'bmi', 'bmi_missing']
+    + [f'work_type={level}' for level in WORK_TYPES[1:]]
+    + [f'smoking_status={level}' for level in SMOKING_STATUSES[1:]]
+)
+
+def _sigmoid(z):
+    return 0.5 * (1.0 + np.tanh(0.5 * z))
+
+# Ids per IN (...) lookup, well under SQLite's bound-variable limit
+_ID_BATCH_SIZE = 500
+
+def _demographics(patient_ids, whole_cohort=False):
+    """Return ``(found, age, male)`` arrays aligned with ``patient_ids``.
+
+    ``whole_cohort`` reads the table in one pass, for callers that need
+    every patient; otherwise only ``patient_ids`` are looked up.
+    """
+    ids = np.asarray(patient_ids, dtype=np.int64)
+    with get_db() as conn:
+        if whole_cohort:
+            rows = conn.execute('SELECT id, gender, date_of_birth FROM patients ORDER BY id').fetchall()
+        else:
+            unique = np.unique(ids).tolist()
+            rows = []
+            for start in range(0, len(unique), _ID_BATCH_SIZE):
+                batch = unique[start:start + _ID_BATCH_SIZE]
+                placeholders = ', '.join('?' * len(batch))
+                rows += conn.execute(f'SELECT id, gender, date_of_birth FROM patients WHERE id IN ({placeholders}) '
+                                     f'ORDER BY id', batch).fetchall()
+    if not rows:
+        return np.zeros(len(ids), dtype=bool), np.full(len(ids), np.nan), np.zeros(len(ids))
+
+    known_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    male = np.array([row[1] == 'Male' for row in rows], dtype=np.float64)
+    dob = np.array([row[2] for row in rows], dtype='datetime64[D]')
+    age = (np.datetime64('today', 'D') - dob).astype(np.float64) / 365.25
+
+    position = np.minimum(np.searchsorted(known_ids, ids), len(known_ids) - 1)
+    found = known_ids[position] == ids
+    return found, np.where(found, age[position], np.nan), np.where(found, male[position], 0.0)
+
+def _values(columns, field):
+    """Per-row labels of a categorical field."""
+    codes, labels = columns.codes(field)
+    return np.array(labels, dtype=object)[codes]
+
+def feature_matrix(columns, age, male):
+    """Raw (unscaled) feature matrix, one row per assessment, in FEATURES order."""
+    bmi_missing = np.isnan(columns.bmi)
+    parts = [
+        age,
+        male,
+        np.nan_to_num(columns.binary['hypertension']),
+        np.nan_to_num(columns.binary['heart_disease']),
+        (_values(columns, 'ever_married') == 'Yes').astype(np.float64),
+        (_values(columns, 'residence_type') == 'Urban').astype(np.float64),
+        columns.glucose,
+        columns.bmi,
+        bmi_missing.astype(np.float64),
+    ]
+    for field, levels in _CATEGORIES.items():
+        values = _values(columns, field)
+        parts += [(values == level).astype(np.float64) for level in levels[1:]]
+    return np.column_stack(parts).reshape(len(columns), len(FEATURES))
+
+class RiskModel:
+    def __init__(self, weights, means, scales, samples=0, trained_at=None, id=None):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.samples = samples
+        self.trained_at = trained_at
+        self.id = id
+
+    def _standardize(self, X):
+        X = (X - self.means) / self.scales
+        # Missing values (unknown BMI, age) sit at the mean
+        X = np.nan_to_num(X, nan=0.0)
+        return np.column_stack([np.ones(len(X)), X])
+
+    def predict(self, X):
+        """Stroke probability for each row of a raw feature matrix."""
+        return _sigmoid(self._standardize(X) @ self.weights)
+
+    @classmethod
+    def fit(cls, X, y, l2=1.0, iterations=50, tolerance=1e-8):
+        """Fit L2-regularised logistic regression with Newton's method."""
+        means = np.nanmean(X, axis=0) if len(X) else np.zeros(X.shape[1])
+        scales = np.nanstd(X, axis=0) if len(X) else np.ones(X.shape[1])
+        scales = np.where(np.isfinite(scales) & (scales > 0), scales, 1.0)
+        model = cls(np.zeros(X.shape[1] + 1), np.nan_to_num(means), scales, samples=len(X))
+        Z = model._standardize(X)
+        penalty = np.full(Z.shape[1], l2)
+        penalty[0] = 0.0  # the intercept is not shrunk
+        w = model.weights
+        for _ in range(iterations):
+            p = _sigmoid(Z @ w)
+            gradient = Z.T @ (p - y) + penalty * w
+            hessian = (Z.T * (p * (1 - p))) @ Z + np.diag(penalty) + 1e-9 * np.eye(len(w))
+            step = np.linalg.solve(hessian, gradient)
+            w = w - step
+            if np.max(np.abs(step)) < tolerance:
+                break
+        model.weights = w
+        return model
+
+    def save(self):
+        self.trained_at = datetime.now(timezone.utc).isoformat()
+        with get_db() as conn:
+            cursor = conn.execute('''
+                INSERT INTO risk_models (trained_at, samples, features, weights, means, scales)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (self.trained_at, self.samples, json.dumps(FEATURES), json.dumps(self.weights.tolist()),
+                  json.dumps(self.means.tolist()), json.dumps(self.scales.tolist())))
+        self.id = cursor.lastrowid
+        return self
+
+    @classmethod
+    def latest(cls):
+        """The most recently trained model, or None (also when its features are stale)."""
+        with get_db() as conn:
+            row = conn.execute('''
+                SELECT id, trained_at, samples, features, weights, means, scales
+                FROM risk_models ORDER BY id DESC LIMIT 1
+            ''').fetchone()
+        if row is None or json.loads(row[3]) != FEATURES:
+            return None
+        return cls(json.loads(row[4]), json.loads(row[5]), json.loads(row[6]),
+                   samples=row[2], trained_at=row[1], id=row[0])
+
+def _latest_per_patient(columns):
+    """Indices of the last row for each patient; rows must be oldest first (e.g. in _id order)."""
+    reversed_ids = columns.patient_id[::-1]
+    _, first = np.unique(reversed_ids, return_index=True)
+    return np.sort(len(reversed_ids) - 1 - first)
+
+def _subset(columns, index):
+    return AssessmentColumns(
+        patient_id=columns.patient_id[index],
+        stroke=columns.stroke[index],
+        glucose=columns.glucose[index],
+        bmi=columns.bmi[index],
+        binary={k: v[index] for k, v in columns.binary.items()},
+        categorical={k: (codes[index], labels) for k, (codes, labels) in columns.categorical.items()},
+    )
+
+def _scored_rows(columns, model, whole_cohort=False):
+    found, age, male = _demographics(columns.patient_id, whole_cohort)
+    if not np.any(found):
+        return []
+    index = np.flatnonzero(found)
+    columns = _subset(columns, index)
+    scores = model.predict(feature_matrix(columns, age[index], male[index]))
+    return list(zip(columns.patient_id.tolist(), scores.tolist()))
+
+def train_model(l2=1.0):
+    """Fit a model on every assessment with a known outcome and store it."""
+    columns = analytics_model.load_columns()
+    found, age, male = _demographics(columns.patient_id, whole_cohort=True)
+    known = found & ~np.isnan(columns.stroke)
+    index = np.flatnonzero(known)
+    if len(index) == 0:
+        raise ValueError('No assessments to train on')
+    subset = _subset(columns, index)
+    X = feature_matrix(subset, age[index], male[index])
+    return RiskModel.fit(X, subset.stroke, l2=l2).save()
+
+def score_cohort(model=None):
+    """Score every patient's latest assessment in one vectorised pass; returns the count."""
+    model = model or RiskModel.latest()
+    if model is None:
+        return 0
+    # Natural order is not insertion order once documents move, so sort by _id
+    columns = analytics_model.load_columns(sort_by_id=True)
+    if len(columns) == 0:
+        return 0
+    scores = _scored_rows(_subset(columns, _latest_per_patient(columns)), model, whole_cohort=True)
+    Patient.update_risk_scores(scores)
+    return len(scores)
+
+def score_assessments(documents, model=None):
+    """Re-score the patients of newly written assessments; returns the count.
+
+    Each document is taken to be its patient's latest assessment; of several
+    for the same patient the last one in ``documents`` wins.
+    """
+    documents = list(documents)
+    if not documents:
+        return 0
+    model = model or RiskModel.latest()
+    if model is None:
+        return 0
+    columns = AssessmentColumns.from_documents(documents)
+    scores = _scored_rows(_subset(columns, _latest_per_patient(columns)), model)
+    Patient.update_risk_scores(scores)
+    return len(scores)
+
+def roc_auc(scores, outcomes):
+    """Area under the ROC curve via the rank-sum statistic."""
+    scores = np.asarray(scores, dtype=np.float64)
+    outcomes = np.asarray(outcomes, dtype=bool)
+    positives, negatives = outcomes.sum(), (~outcomes).sum()
+    if positives == 0 or negatives == 0:
+        return float('nan')
+    order = np.argsort(scores, kind='mergesort')
+    ranks = np.empty(len(scores))
+    ranks[order] = np.arange(1, len(scores) + 1)
+    # Average the ranks of tied scores
+    _, inverse, counts = np.unique(scores, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    ranks = (sums / counts)[inverse]
+    return float((ranks[outcomes].sum() - positives * (positives + 1) / 2) / (positives * negatives))
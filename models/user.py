@@ -1,5 +1,5 @@
-import sqlite3
-from werkzeug.security import generate_password_hash, check_password_hash
+from models.db import get_db
+from utils.password_hashing import hash_password, verify_password, needs_rehash
 
 class User:
     def __init__(self, id, first_name, last_name, email, role, password_hash):
@@ -13,52 +13,51 @@ class User:
     @staticmethod
     def email_exists(email):
         
-        conn = sqlite3.connect('stroke_project.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT id FROM users WHERE email = ?', (email,))
-        result = cursor.fetchone()
-        conn.close()
+        with get_db() as conn:
+            result = conn.execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone()
         
         return result is not None
     
     @staticmethod
     def create_user(first_name, last_name, email, role, password):
         
-        password_hash = generate_password_hash(password)
-        
-        conn = sqlite3.connect('stroke_project.db')
-        cursor = conn.cursor()
+        password_hash = hash_password(password)
         
-        cursor.execute('''
-            INSERT INTO users (first_name, last_name, email, role, password_hash)
-            VALUES (?, ?, ?, ?, ?)
-            
-        ''', (first_name, last_name, email, role, password_hash))
-        conn.commit()
-        conn.close()
+        with get_db() as conn:
+            conn.execute('''
+                INSERT INTO users (first_name, last_name, email, role, password_hash)
+                VALUES (?, ?, ?, ?, ?)
+                
+            ''', (first_name, last_name, email, role, password_hash))
         return True
     
     @staticmethod
     def authenticate_user(email, password):
-        conn = sqlite3.connect('stroke_project.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT id, first_name, last_name, email, role, password_hash FROM users WHERE email = ?', (email,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result and check_password_hash(result[5], password):
-            return User(*result)
+        with get_db() as conn:
+            result = conn.execute('SELECT id, first_name, last_name, email, role, password_hash FROM users WHERE email = ?', (email,)).fetchone()
+        
+        if result and verify_password(result[5], password):
+            user = User(*result)
+            if needs_rehash(user.password_hash):
+                # Upgrade hashes made with older parameters while we have the plaintext
+                user.password_hash = hash_password(password)
+                User.update_password_hash(user.id, user.password_hash)
+            return user
         return None
+
+    @staticmethod
+    def update_password_hash(user_id, password_hash):
+        with get_db() as conn:
+            conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (password_hash, user_id))
+        # Imported here because utils.identity imports this module
+        from utils.identity import invalidate_user
+        invalidate_user(user_id)
+        return True
     
     @staticmethod
     def get_user_by_id(user_id):
-        conn = sqlite3.connect('stroke_project.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, first_name, last_name, email, role, password_hash FROM users WHERE id = ?', (user_id,))
-        result = cursor.fetchone()
-        conn.close()
+        with get_db() as conn:
+            result = conn.execute('SELECT id, first_name, last_name, email, role, password_hash FROM users WHERE id = ?', (user_id,)).fetchone()
         if result:
             return User(*result)
         return None
\ No newline at end of file
@@ -0,0 +1,38 @@
+import time
+from models.db import get_db
+
+# Change counters behind conditional GETs (ETag / Last-Modified).
+#
+# One row per scope: a table ('patients', 'allergies', 'assessments') or a
+# single patient ('patient:<id>'). Every create/update/delete bumps the
+# scopes it touches, and pages derive their validators from the versions of
+# the scopes they render. The counters live in SQLite so every worker
+# process sees the same values; MongoDB writers bump them too.
+
+PATIENTS = 'patients'
+ALLERGIES = 'allergies'
+ASSESSMENTS = 'assessments'
+
+def patient_scope(patient_id):
+    return f'patient:{int(patient_id)}'
+
+def bump(*scopes):
+    """Increment the given scopes; joins the caller's transaction when there is one."""
+    now = time.time()
+    with get_db() as conn:
+        conn.executemany('''
+            INSERT INTO data_versions (scope, version, updated_at) VALUES (?, 1, ?)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+        ''', [(scope, now) for scope in dict.fromkeys(scopes)])
+
+def get_versions(scopes):
+    """Return ``{scope: (version, updated_at)}``; unwritten scopes are ``(0, 0.0)``."""
+    scopes = list(scopes)
+    placeholders = ', '.join('?' * len(scopes))
+    with get_db() as conn:
+        rows = conn.execute(
+            f'SELECT scope, version, updated_at FROM data_versions WHERE scope IN ({placeholders})', scopes
+        ).fetchall()
+    versions = {scope: (0, 0.0) for scope in scopes}
+    versions.update({scope: (version, updated_at) for scope, version, updated_at in rows})
+    return versions
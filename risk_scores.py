@@ -0,0 +1,46 @@
+import argparse
+import time
+from models.risk_model import RiskModel, train_model, score_cohort, roc_auc, FEATURES
+
+# Train the stroke risk model and score the cohort.
+#
+#   python risk_scores.py --train   # fit on every assessment, then score all patients
+#   python risk_scores.py           # re-score all patients with the latest model
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train the stroke risk model and score every patient.')
+    parser.add_argument('--train', action='store_true', help='fit a new model before scoring')
+    parser.add_argument('--l2', type=float, default=1.0, help='L2 regularisation strength')
+    args = parser.parse_args(argv)
+
+    from init_db import init_database
+    init_database()
+
+    if args.train:
+        started = time.perf_counter()
+        model = train_model(l2=args.l2)
+        print(f"[risk] Trained model {model.id} on {model.samples} assessments "
+              f"in {time.perf_counter() - started:.2f}s")
+        for name, weight in sorted(zip(FEATURES, model.weights[1:]), key=lambda item: -abs(item[1])):
+            print(f"    {name:<30} {weight:+.3f}")
+    else:
+        model = RiskModel.latest()
+        if model is None:
+            print('[risk] No trained model; run with --train first')
+            return
+
+    started = time.perf_counter()
+    scored = score_cohort(model)
+    print(f"[risk] Scored {scored} patients in {time.perf_counter() - started:.2f}s")
+
+    from models.mongo import analytics_model
+    from models.patient import Patient
+    columns = analytics_model.load_columns()
+    scores = {p.id: p.risk_score for p in Patient.get_all_patients()}
+    pairs = [(scores.get(pid), stroke) for pid, stroke in zip(columns.patient_id.tolist(), columns.stroke.tolist())]
+    pairs = [(score, stroke) for score, stroke in pairs if score is not None and stroke == stroke]
+    if pairs:
+        print(f"[risk] In-sample ROC AUC: {roc_auc(*zip(*pairs)):.3f}")
+
+if __name__ == '__main__':
+    main()
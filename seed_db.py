@@ -1,11 +1,15 @@
 from init_db import init_database
+import argparse
 import csv
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
 from models.user import User
 from models.patient import Patient
-from models.mongo.assessment_model import create_assessment
+from models.mongo.assessment_model import bulk_create_assessments
+from models.patient_import import validate_rows, patient_tuple, assessment_document
 
 # Base directory 
 BASE_DIR = Path(__file__).resolve().parent
@@ -16,6 +20,9 @@ CSV_PATH = BASE_DIR / "seeded_dataset.csv"
 # Marker file so the seed only runs once
 SEED_MARKER = BASE_DIR / ".seed_has_run"
 
+# Rows per SQLite transaction / MongoDB insert_many batch
+DEFAULT_CHUNK_SIZE = 2000
+
 
 def seed_admin_and_doctor_users():
     """
@@ -46,145 +53,118 @@ def seed_admin_and_doctor_users():
         print("[seed_data] Created default doctor user")
 
 
-def _parse_int(value, default=0):
-    """
-    Safely parse an int from CSV data.
-    Accepts '1', '0', '1.0', etc. Returns default on error/blank.
-    """
-    if value is None:
-        return default
-    s = str(value).strip()
-    if s == "":
-        return default
-    try:
-        return int(float(s))
-    except (ValueError, TypeError):
-        return default
-
-
-def _parse_float(value, default=0.0):
-    """
-    Safely parse a float from CSV data.
-    """
-    if value is None:
-        return default
-    s = str(value).strip()
-    if s == "":
-        return default
-    try:
-        return float(s)
-    except (ValueError, TypeError):
-        return default
+def _chunks(reader, size):
+    """Yield lists of at most ``size`` rows without reading the whole file."""
+    chunk = []
+    for row in reader:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
-def seed_patients_and_assessments_from_csv():
+def seed_patients_and_assessments_from_csv(csv_path=CSV_PATH, chunk_size=DEFAULT_CHUNK_SIZE):
     """
     Seed patients (SQLite) and stroke assessments (MongoDB) from CSV.
 
-    Adjust the column names in row.get(...) below to match your CSV header.
-    Common stroke dataset headers look like:
+    The file is streamed in chunks of ``chunk_size`` rows. Each chunk is
+    validated in batch mode and rows that fail are skipped; the rest are
+    inserted into SQLite with one executemany in one transaction, and their
+    assessments go to MongoDB with one unordered insert_many, tagged with
+    the generated patient ids. The MongoDB write for a chunk runs in the
+    background while the next chunk is parsed and written to SQLite.
+
+    Expected CSV header (stroke dataset layout):
       first_name, last_name, email, gender, age,
-      hypertension, ever_married, work_type, Residence_type (or residence_type),
+      hypertension, heart_disease, ever_married, work_type, Residence_type,
       avg_glucose_level, bmi, smoking_status, stroke
+
+    Returns a dict with the patient/assessment counts and rows per second.
     """
-    if not CSV_PATH.exists():
-        print(f"[seed_data] CSV not found at {CSV_PATH}, skipping patient seeding.")
-        return
+    csv_path = Path(csv_path)
+    if not csv_path.exists():
+        print(f"[seed_data] CSV not found at {csv_path}, skipping patient seeding.")
+        return None
 
-    print(f"[seed_data] Seeding patients & assessments from {CSV_PATH}")
+    print(f"[seed_data] Seeding patients & assessments from {csv_path}")
 
     # Use admin user (created above) - should have ID 1 in fresh DB
     # Verify admin exists before proceeding
     if not User.email_exists("admin@example.com"):
         print("[seed_data] Admin user not found, cannot seed patients.")
-        return
-    created_by_user_id = 1  
+        return None
+    created_by_user_id = 1
 
-    with CSV_PATH.open(newline="", encoding="utf-8") as f:
+    current_year = datetime.now().year
+    patients_created = 0
+    assessments_created = 0
+    rejected = 0
+    started = time.perf_counter()
+
+    with csv_path.open(newline="", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=1) as mongo_writer:
         reader = csv.DictReader(f)
 
         # Validate required CSV columns
         required_cols = ['first_name', 'last_name', 'email', 'gender', 'age']
-        if not all(col in reader.fieldnames for col in required_cols):
+        if not all(col in (reader.fieldnames or []) for col in required_cols):
             print(f"[seed_data] ERROR: CSV missing required columns. Found: {reader.fieldnames}")
             print(f"[seed_data] Required: {required_cols}")
-            return
-
-        for row in reader:
-            # PATIENT FIELDS (SQLite)
-            first_name = (row.get("first_name") or "").strip()
-            last_name = (row.get("last_name") or "").strip()
-            email = (row.get("email") or "").strip()
-            gender = (row.get("gender") or "").strip()
-
-            # Convert age to an approximate DOB.
-            age_str = (row.get("age") or "").strip()
-            date_of_birth = "1970-01-01"  #
-
-            if age_str:
-                try:
-                    age = int(float(age_str))
-                    # Rough DOB: current_year - age 
-                    approx_year = datetime.now().year - age
-                    date_of_birth = f"{approx_year}-01-01"
-                except ValueError:
-                    # If age can't be parsed, we just keep the default DOB
-                    pass
-
-            # Create patient and get its auto-incremented ID from SQLite
+            return None
+
+        pending = None
+        for chunk in _chunks(reader, chunk_size):
+            # Batch-validate with the same schemas as the forms; skip bad rows
+            records, errors = validate_rows(chunk, current_year)
+            valid = [record for record, row_errors in zip(records, errors) if not row_errors]
+            rejected += len(chunk) - len(valid)
+            if not valid:
+                continue
+
+            patient_rows = [patient_tuple(patient, created_by_user_id) for patient, _ in valid]
             try:
-                patient_id = Patient.create_patient(
-                    first_name,
-                    last_name,
-                    email,
-                    gender,
-                    date_of_birth,
-                    created_by_user_id
-                )
+                patient_ids = Patient.bulk_create_patients(patient_rows)
             except Exception as e:
-                print(f"[seed_data] Failed to create patient {email}: {e}")
+                print(f"[seed_data] Failed to create {len(chunk)} patients: {e}")
                 continue
+            patients_created += len(patient_ids)
+
+            assessments = [assessment_document(pid, assessment) for pid, (_, assessment) in zip(patient_ids, valid)]
+
+            # Keep at most one Mongo batch in flight
+            if pending is not None:
+                assessments_created += _collect(pending)
+            pending = mongo_writer.submit(bulk_create_assessments, assessments)
+
+        if pending is not None:
+            assessments_created += _collect(pending)
+
+    elapsed = time.perf_counter() - started
+    rate = patients_created / elapsed if elapsed > 0 else 0.0
+    if rejected:
+        print(f"[seed_data] Skipped {rejected} rows that failed validation.")
+    print(f"[seed_data] Finished seeding {patients_created} patients and {assessments_created} "
+          f"assessments in {elapsed:.2f}s ({rate:,.0f} rows/s).")
+    return {
+        "patients": patients_created,
+        "assessments": assessments_created,
+        "rejected": rejected,
+        "seconds": elapsed,
+        "rows_per_second": rate,
+    }
+
+
+def _collect(future):
+    """Return the number of assessments a background batch wrote."""
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"[seed_data] Failed to write assessment batch: {e}")
+        return 0
 
-            # ASSESSMENT FIELDS (MongoDB) 
-            hypertension = _parse_int(row.get("hypertension"), default=0)
-            heart_disease = _parse_int(row.get("heart_disease"), default=0)
-            ever_married = (row.get("ever_married") or "").strip()
-            work_type = (row.get("work_type") or "").strip()
-
-            # Some datasets use "Residence_type", others "residence_type"
-            residence_type = (
-                (row.get("Residence_type")
-                 or row.get("residence_type")
-                 or "").strip()
-            )
-
-            avg_glucose_level = _parse_float(row.get("avg_glucose_level"), default=0.0)
-            bmi = _parse_float(row.get("bmi"), default=0.0)
-            smoking_status = (row.get("smoking_status") or "").strip()
-            stroke = _parse_int(row.get("stroke"), default=0)
-
-            
-            if patient_id:  
-                try:
-                    create_assessment(
-                        patient_id,
-                        hypertension,
-                        heart_disease,
-                        ever_married,
-                        work_type,
-                        residence_type,
-                        avg_glucose_level,
-                        bmi,
-                        smoking_status,
-                        stroke,
-                    )
-                except Exception as e:
-                    print(f"[seed_data] Failed to create assessment for patient {patient_id}: {e}")
-
-    print("[seed_data] Finished seeding patients and assessments.")
-
-
-def run_seed_if_needed():
+
+def run_seed_if_needed(csv_path=CSV_PATH, chunk_size=DEFAULT_CHUNK_SIZE):
     """
     Public function to run seeding exactly once.
     - Call this from app.py after init_database()
@@ -200,7 +180,7 @@ def run_seed_if_needed():
     seed_admin_and_doctor_users()
 
     # Seed patients in SQLite + assessments in MongoDB from CSV
-    seed_patients_and_assessments_from_csv()
+    seed_patients_and_assessments_from_csv(csv_path, chunk_size)
 
     # Create marker so this doesn't run again
     SEED_MARKER.write_text("done\n")
@@ -208,5 +188,11 @@ def run_seed_if_needed():
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Seed the stroke project databases from CSV.")
+    parser.add_argument("--csv", default=str(CSV_PATH), help="CSV file to load")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="rows per SQLite transaction and MongoDB batch")
+    args = parser.parse_args()
+
     init_database()
-    run_seed_if_needed()
\ No newline at end of file
+    run_seed_if_needed(args.csv, args.chunk_size)
\ No newline at end of file
@@ -0,0 +1,161 @@
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from config import Config
+
+# Production entry point: one master process and N pre-forked workers.
+#
+#   python serve.py --workers 4 --port 8080
+#
+# The master builds the app, runs the migrations once, binds the listening
+# socket and closes its own SQLite and MongoDB connections before forking.
+# Every worker opens its own connections after the fork (the pools and
+# clients reset themselves in the child), warms up, and only then starts
+# accepting from the shared socket, so no request waits on a cold worker.
+#
+# SIGTERM or SIGINT stops the server gracefully: each worker stops
+# accepting, finishes its in-flight requests, flushes the audit queue and
+# exits. Workers still running after SHUTDOWN_TIMEOUT are killed. A worker
+# that dies on its own is replaced.
+
+def log(message):
+    # One write per line: workers share stdout, and print() writes the text
+    # and the newline separately, so their lines could interleave
+    sys.stdout.write(f"[serve] {message}\n")
+    sys.stdout.flush()
+
+def release_connections():
+    """Close this process's SQLite and MongoDB connections (before fork and at exit)."""
+    from models import audit
+    from models.db import get_pool
+    from models.mongo import connection
+    audit.flush(Config.AUDIT_FLUSH_TIMEOUT)
+    get_pool().close_all()
+    connection.close_client()
+
+def warm_up(app):
+    """Open a pooled connection and compile every template; returns the seconds taken."""
+    from models.db import get_db
+    from models.mongo.connection import mongo_conn
+    started = time.perf_counter()
+    with get_db() as conn:
+        conn.execute('SELECT COUNT(*) FROM patients').fetchone()
+    # Creates the client; it connects in the background
+    mongo_conn()
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+    return time.perf_counter() - started
+
+def run_worker(app, listener, number):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class Handler(WSGIRequestHandler):
+        # Idle keep-alive connections would otherwise hold a stopping worker open
+        timeout = Config.SERVE_KEEPALIVE_TIMEOUT
+
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, request_handler=Handler, fd=listener.fileno())
+    # Let server_close() wait for in-flight requests instead of abandoning them
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so it cannot run on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    log(f"Worker {number} (pid {os.getpid()}) ready in {warm_up(app):.2f}s")
+    server.serve_forever()
+    server.server_close()
+    release_connections()
+    log(f"Worker {number} (pid {os.getpid()}) stopped")
+
+def spawn(app, listener, number):
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        run_worker(app, listener, number)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        os._exit(code)
+
+def serve(host, port, workers):
+    from app import create_app
+    from init_db import init_database
+    app = create_app()
+    # Workers inherit the initialised flag and do not migrate again
+    init_database()
+
+    listener = socket.create_server((host, port), backlog=socket.SOMAXCONN)
+    release_connections()
+    master = os.getpid()
+    children = {}
+    stopping = threading.Event()
+
+    def kill_remaining():
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def stop(signum, frame):
+        # A worker that has not installed its own handlers yet must not act as the master
+        if os.getpid() != master or stopping.is_set():
+            return
+        stopping.set()
+        log(f"Stopping {len(children)} workers")
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        timer = threading.Timer(Config.SHUTDOWN_TIMEOUT, kill_remaining)
+        timer.daemon = True
+        timer.start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    log(f"Listening on http://{host}:{listener.getsockname()[1]} with {workers} workers")
+    for number in range(workers):
+        children[spawn(app, listener, number)] = number
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        number = children.pop(pid, None)
+        if number is None or stopping.is_set():
+            continue
+        log(f"Worker {number} (pid {pid}) exited with code {os.waitstatus_to_exitcode(status)}; restarting")
+        # Do not spin if the worker fails straight away
+        time.sleep(1)
+        if not stopping.is_set():
+            children[spawn(app, listener, number)] = number
+
+    listener.close()
+    log('Stopped')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the app with pre-forked worker processes.')
+    parser.add_argument('--host', default=Config.SERVE_HOST)
+    parser.add_argument('--port', type=int, default=Config.SERVE_PORT, help='0 picks a free port')
+    parser.add_argument('--workers', type=int, default=Config.SERVE_WORKERS, help='worker processes (default: CPU count)')
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, max(1, args.workers))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+import argparse
+import time
+from models.mongo.cascade import sweep_orphans
+
+# Remove allergies and assessments whose patient no longer exists.
+#
+#   python sweep_orphans.py --dry-run          # report what would be removed
+#   python sweep_orphans.py --batch-size 500 --pause 0.2
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Delete MongoDB documents of patients missing from SQLite.')
+    parser.add_argument('--dry-run', action='store_true', help='count orphans without deleting them')
+    parser.add_argument('--batch-size', type=int, help='patient ids per delete_many (default: MONGO_DELETE_BATCH_SIZE)')
+    parser.add_argument('--pause', type=float, help='seconds to wait between batches (default: ORPHAN_SWEEP_PAUSE)')
+    args = parser.parse_args(argv)
+
+    from init_db import init_database
+    init_database()
+
+    started = time.perf_counter()
+    report = sweep_orphans(dry_run=args.dry_run, batch_size=args.batch_size, pause=args.pause)
+    verb = 'Would delete' if args.dry_run else 'Deleted'
+    for name, stats in report.items():
+        print(f"[sweep] {verb} {stats['documents']} {name} of {stats['patients']} missing patients "
+              f"in {stats['batches']} batches")
+    print(f"[sweep] Finished in {time.perf_counter() - started:.2f}s")
+
+if __name__ == '__main__':
+    main()
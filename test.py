@@ -1,7 +1,41 @@
 import unittest
-from app import app
+from app import app, create_app
+from flask import url_for
+from config import Config
 import sqlite3
+import datetime
+import io
+import json
 import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import zlib
+from unittest import mock
+import numpy as np
+from models.db import ConnectionPool, get_db, get_pool, init_pool
+from models.patient import Patient
+from models.user import User
+from utils import compression, identity, password_hashing
+from utils.patient_utils import PATIENT_SCHEMA, validate_patient
+from utils.mongo_validation import ASSESSMENT_SCHEMA, validate_assessment
+from werkzeug.security import generate_password_hash
+import seed_db
+import migrations
+from models.mongo import allergy_model, analytics_model, assessment_model, cascade, summary_model
+from models import audit, patient_aggregate, patient_export, patient_import, risk_model, versions
+from models.mongo.allergy_model import create_allergy, delete_allergy
+from benchmarks import routes as route_bench
+from benchmarks import startup as startup_bench
+from benchmarks.mongo_standin import FakeMongoClient
+import init_db
+from init_db import init_database
+from models.mongo import connection as mongo_connection
 
 TEST_DB = 'test_stroke_project.db'  
 
@@ -52,6 +86,9 @@ class StrokePredictionTest(unittest.TestCase):
     def setUp(self):
         """Set up test client and database"""
         create_test_database()  
+        # Pages initialise the app database on first use; keep it out of the working directory
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'app.db'))
         
         self.email = "rhaj@example.com"
         app.config['TESTING'] = True
@@ -59,6 +96,8 @@ class StrokePredictionTest(unittest.TestCase):
     
     def tearDown(self):
         """Clean up after each test"""
+        init_pool()
+        self.tmpdir.cleanup()
         if os.path.exists(TEST_DB):
             os.remove(TEST_DB)
     
@@ -82,5 +121,1623 @@ class StrokePredictionTest(unittest.TestCase):
         )
 
 
+class ConnectionPoolTest(unittest.TestCase):
+    """Test cases for the pooled SQLite connection layer"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmpdir.name, 'pool.db'), size=2, timeout=1)
+        with self.pool.connection() as conn:
+            conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+
+    def tearDown(self):
+        self.pool.close_all()
+        self.tmpdir.cleanup()
+
+    def test_connections_are_reused(self):
+        """Test that repeated checkouts reuse one connection"""
+        for i in range(10):
+            with self.pool.connection() as conn:
+                conn.execute('INSERT INTO items (name) VALUES (?)', (f'item{i}',))
+        stats = self.pool.stats()
+        self.assertEqual(stats['checkouts'], 11)
+        self.assertEqual(stats['open_connections'], 1)
+
+    def test_wal_mode_enabled(self):
+        """Test that pooled connections use WAL journaling"""
+        with self.pool.connection() as conn:
+            mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+
+    def test_nested_checkout_shares_transaction(self):
+        """Test that a nested block reuses the outer connection"""
+        with self.pool.connection() as outer:
+            with self.pool.connection() as inner:
+                self.assertIs(outer, inner)
+
+    def test_rollback_on_error(self):
+        """Test that a failing block does not commit"""
+        with self.assertRaises(RuntimeError):
+            with self.pool.connection() as conn:
+                conn.execute("INSERT INTO items (name) VALUES ('lost')")
+                raise RuntimeError('boom')
+        with self.pool.connection() as conn:
+            count = conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+        self.assertEqual(count, 0)
+
+    def test_pool_is_bounded_across_threads(self):
+        """Test that concurrent threads never open more than the pool size"""
+        def worker():
+            for _ in range(20):
+                with self.pool.connection() as conn:
+                    conn.execute("INSERT INTO items (name) VALUES ('t')")
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertLessEqual(self.pool.stats()['open_connections'], 2)
+        with self.pool.connection() as conn:
+            count = conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+        self.assertEqual(count, 120)
+
+
+class MongoClientReuseTest(unittest.TestCase):
+    """Test cases for the shared MongoClient"""
+
+    def test_client_is_shared(self):
+        """Test that mongo_conn returns the same client on every call"""
+        first, _ = mongo_connection.mongo_conn()
+        second, mdb = mongo_connection.mongo_conn()
+        self.assertIs(first, second)
+        self.assertEqual(mdb.name, mongo_connection.Config.MONGO_DB)
+
+    def test_client_rebuilt_after_fork(self):
+        """Test that a forked child does not reuse the parent's client"""
+        parent, _ = mongo_connection.mongo_conn()
+        mongo_connection._reset_after_fork()
+        child, _ = mongo_connection.mongo_conn()
+        self.assertIsNot(parent, child)
+        parent.close()
+
+
+class PatientPaginationTest(unittest.TestCase):
+    """Test cases for keyset pagination of the patient listing"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'patients.db'))
+        init_database()
+        mongo_connection.use_client(FakeMongoClient())
+        names = ['Cole', 'Adams', 'Baker', 'Evans', 'Dunn']
+        for i in range(12):
+            Patient.create_patient(f'First{i}', names[i % 5], f'p{i}@example.com',
+                                   'Female', '1980-01-01', 1)
+
+    def tearDown(self):
+        mongo_connection.close_client()
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def collect(self, **kwargs):
+        seen = []
+        patients, next_cursor, prev_cursor = Patient.get_patients_page(limit=5, **kwargs)
+        self.assertIsNone(prev_cursor)
+        seen.extend(patients)
+        while next_cursor:
+            patients, next_cursor, prev_cursor = Patient.get_patients_page(limit=5, after=next_cursor, **kwargs)
+            self.assertIsNotNone(prev_cursor)
+            seen.extend(patients)
+        return seen
+
+    def test_pages_cover_every_patient_once(self):
+        """Test that following next cursors visits each row exactly once"""
+        ids = [p.id for p in self.collect()]
+        self.assertEqual(ids, list(range(1, 13)))
+
+    def test_sort_by_last_name_descending(self):
+        """Test that a non-unique sort column pages stably with id as tiebreaker"""
+        patients = self.collect(sort='last_name', direction='desc')
+        keys = [(p.last_name, p.id) for p in patients]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        self.assertEqual(len(keys), 12)
+
+    def test_previous_cursor_returns_prior_page(self):
+        """Test that the previous cursor leads back to the first page"""
+        first, next_cursor, _ = Patient.get_patients_page(limit=5)
+        second, _, prev_cursor = Patient.get_patients_page(limit=5, after=next_cursor)
+        back, _, _ = Patient.get_patients_page(limit=5, before=prev_cursor)
+        self.assertEqual([p.id for p in back], [p.id for p in first])
+
+    def test_count_tracks_inserts_and_deletes(self):
+        """Test that the trigger-maintained count stays accurate"""
+        self.assertEqual(Patient.count_patients(), 12)
+        Patient.delete_patient(1)
+        self.assertEqual(Patient.count_patients(), 11)
+
+    def test_invalid_cursor_rejected(self):
+        """Test that a tampered cursor raises ValueError"""
+        with self.assertRaises(ValueError):
+            Patient.get_patients_page(after='not-a-cursor')
+        with self.assertRaises(ValueError):
+            Patient.get_patients_page(sort='password_hash')
+
+
+class IdentityCacheTest(unittest.TestCase):
+    """Test cases for request-scoped and process-wide identity caching"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'identity.db'))
+        init_database()
+        User.create_user('Ada', 'Admin', 'ada@example.com', 'admin', 'Admin123!')
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 1
+        identity.invalidate_user()
+
+    def tearDown(self):
+        identity.invalidate_user()
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def test_user_loaded_once_per_request(self):
+        """Test that decorators, routes and templates share one user lookup"""
+        with mock.patch.object(User, 'get_user_by_id', wraps=User.get_user_by_id) as lookup:
+            response = self.client.get('/patient-management')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(lookup.call_count, 1)
+
+    def test_process_cache_serves_repeat_requests(self):
+        """Test that an enabled TTL cache removes lookups on later requests"""
+        with mock.patch.object(identity, '_user_cache', identity.TTLCache(60)):
+            with mock.patch.object(User, 'get_user_by_id', wraps=User.get_user_by_id) as lookup:
+                self.client.get('/patient-management')
+                self.client.get('/patient-management')
+                self.assertEqual(lookup.call_count, 1)
+                identity.invalidate_user(1)
+                self.client.get('/patient-management')
+                self.assertEqual(lookup.call_count, 2)
+
+    def test_ttl_cache_expires(self):
+        """Test that cache entries expire after the TTL"""
+        cache = identity.TTLCache(0.01)
+        cache.set(1, 'user')
+        self.assertEqual(cache.get(1), 'user')
+        time.sleep(0.02)
+        self.assertIsNone(cache.get(1))
+
+
+class BulkSeedTest(unittest.TestCase):
+    """Test cases for the chunked CSV seeding pipeline"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'seed.db'))
+        init_database()
+        User.create_user('Ada', 'Admin', 'admin@example.com', 'admin', 'Admin123!')
+        Patient.create_patient('Existing', 'Patient', 'e@example.com', 'Male', '1970-01-01', 1)
+
+    def tearDown(self):
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def test_create_patient_returns_new_id(self):
+        """Test that create_patient returns the generated row id"""
+        new_id = Patient.create_patient('New', 'Patient', 'n@example.com', 'Male', '1970-01-01', 1)
+        self.assertEqual(new_id, 2)
+
+    def test_assessments_attached_to_generated_ids(self):
+        """Test that each assessment carries its own patient's new id"""
+        written = []
+        def fake_bulk(docs):
+            written.extend(docs)
+            return len(docs)
+        with mock.patch.object(seed_db, 'bulk_create_assessments', side_effect=fake_bulk):
+            report = seed_db.seed_patients_and_assessments_from_csv(chunk_size=700)
+
+        with open(seed_db.CSV_PATH, newline='', encoding='utf-8') as f:
+            expected_rows = sum(1 for _ in f) - 1
+        self.assertEqual(report['patients'], expected_rows)
+        self.assertEqual(report['assessments'], expected_rows)
+        self.assertEqual(Patient.count_patients(), expected_rows + 1)
+        self.assertEqual([d['patient_id'] for d in written], list(range(2, expected_rows + 2)))
+
+        last = Patient.get_patient_by_id(expected_rows + 1)
+        self.assertEqual(last.email, seed_db.CSV_PATH.read_text().strip().splitlines()[-1].split(',')[2])
+
+
+class MigrationTest(unittest.TestCase):
+    """Test cases for versioned schema migrations"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'migrations.db'))
+
+    def tearDown(self):
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def test_migrations_apply_once_in_order(self):
+        """Test that each step runs once and is recorded"""
+        init_database(migrate=False)
+        applied = migrations.run_sqlite_migrations()
+        self.assertEqual(applied, sorted(v for v, _, _ in migrations.SQLITE_MIGRATIONS))
+        self.assertEqual(migrations.run_sqlite_migrations(), [])
+        self.assertEqual(migrations.applied_versions('sqlite'), set(applied))
+
+    def test_created_by_lookup_uses_index(self):
+        """Test that the creator lookup no longer scans the table"""
+        init_database()
+        plans = dict(migrations.sqlite_query_plans())
+        self.assertIn('idx_patients_created_by', plans['patients by creator'])
+
+    def test_explain_on_unmigrated_database(self):
+        """Test that --explain reports plans for columns a pending migration adds"""
+        output = io.StringIO()
+        with mock.patch('sys.stdout', output):
+            migrations.main(['--skip-mongo', '--explain'])
+        before, after = output.getvalue().split('SQLite plans after')
+        self.assertIn('patients sorted by risk: n/a (not migrated)', before)
+        self.assertIn('idx_patients_risk_score', after)
+
+    def test_explain_before_audit_log_migration(self):
+        """Test that audit log plans are skipped until the audit_log table exists"""
+        init_database(migrate=False)
+        pending = [m for m in migrations.SQLITE_MIGRATIONS if 'audit' in m[1].lower()]
+        with mock.patch.object(migrations, 'SQLITE_MIGRATIONS',
+                               [m for m in migrations.SQLITE_MIGRATIONS if m not in pending]):
+            migrations.run_sqlite_migrations()
+        plans = dict(migrations.sqlite_query_plans())
+        self.assertEqual(plans['audit log by patient'], 'n/a (not migrated)')
+        self.assertEqual(plans['audit log by user'], 'n/a (not migrated)')
+        self.assertIn('idx_patients_risk_score', plans['patients sorted by risk'])
+
+        migrations.run_sqlite_migrations()
+        plans = dict(migrations.sqlite_query_plans())
+        self.assertIn('idx_audit_log_patient', plans['audit log by patient'])
+        self.assertIn('idx_audit_log_user', plans['audit log by user'])
+
+
+class PatientSearchTest(unittest.TestCase):
+    """Test cases for full-text patient search"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'search.db'))
+        init_database()
+        mongo_connection.use_client(FakeMongoClient())
+        self.avery = Patient.create_patient('Avery', 'Wilson', 'avery.wilson@mail.com', 'Male', '1960-01-01', 1)
+        Patient.create_patient('Jamie', 'Davis', 'jamie.davis@test.com', 'Female', '1970-01-01', 1)
+        self.avril = Patient.create_patient('Avril', 'Davies', 'avril@test.com', 'Female', '1980-01-01', 1)
+
+    def tearDown(self):
+        mongo_connection.close_client()
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def search(self, query, **kwargs):
+        patients, _ = Patient.search_patients(query, **kwargs)
+        return [p.id for p in patients]
+
+    def test_prefix_matching(self):
+        """Test that partial words match names and email"""
+        self.assertEqual(len(self.search('av')), 2)
+        self.assertEqual(self.search('avery wil'), [self.avery])
+        self.assertEqual(self.search('mail'), [self.avery])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test that triggers keep the index in sync with patients"""
+        Patient.update_patient(self.avril, 'Avril', 'Evans', 'Female', '1980-01-01')
+        self.assertEqual(self.search('davies'), [])
+        self.assertEqual(self.search('evans'), [self.avril])
+        Patient.delete_patient(self.avery)
+        self.assertEqual(self.search('wilson'), [])
+
+    def test_paginated_results(self):
+        """Test that has_more and offset page through ranked results"""
+        first, has_more = Patient.search_patients('da', limit=1)
+        second, has_more_after = Patient.search_patients('da', limit=1, offset=1)
+        self.assertTrue(has_more)
+        self.assertFalse(has_more_after)
+        self.assertNotEqual(first[0].id, second[0].id)
+
+    def test_query_syntax_is_not_injected(self):
+        """Test that FTS operators in user input are treated as text"""
+        self.assertEqual(self.search('"'), [])
+        self.assertEqual(self.search('wilson OR NEAR(*'), [])
+
+    def test_search_endpoint(self):
+        """Test the JSON search route"""
+        User.create_user('Dee', 'Doctor', 'dee@example.com', 'doctor', 'Doctor123!')
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        response = client.get('/search-patients?q=jam')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['email'] for r in response.get_json()['results']], ['jamie.davis@test.com'])
+
+
+class AnalyticsTest(unittest.TestCase):
+    """Test cases for the vectorised assessment analytics"""
+
+    DOCS = [
+        {'patient_id': 1, 'hypertension': 1, 'heart_disease': 0, 'work_type': 'Private',
+         'smoking_status': 'smokes', 'ever_married': 'Yes', 'residence_type': 'Urban',
+         'avg_glucose_level': 210.0, 'bmi': 31.0, 'stroke': 1},
+        {'patient_id': 2, 'hypertension': 0, 'heart_disease': 0, 'work_type': 'Private',
+         'smoking_status': 'Never smoked', 'ever_married': 'No', 'residence_type': 'Rural',
+         'avg_glucose_level': 85.0, 'bmi': 0.0, 'stroke': 0},
+        {'patient_id': 3, 'hypertension': 1, 'heart_disease': 1, 'work_type': 'Govt_job',
+         'smoking_status': 'Smokes', 'ever_married': 'Yes', 'residence_type': 'Urban',
+         'avg_glucose_level': 110.0, 'bmi': 22.0, 'stroke': 0},
+    ]
+
+    def setUp(self):
+        analytics_model.invalidate_dashboard()
+        self.columns = analytics_model.AssessmentColumns.from_documents(self.DOCS)
+
+    def test_stroke_rate_by_category(self):
+        """Test per-category counts and rates, with case-normalised labels"""
+        rows = {r['label']: r for r in analytics_model.stroke_rate_by(self.columns, 'smoking_status')}
+        self.assertEqual(set(rows), {'Smokes', 'Never smoked'})
+        self.assertEqual(rows['Smokes']['count'], 2)
+        self.assertAlmostEqual(rows['Smokes']['rate'], 0.5)
+
+    def test_bands_skip_missing_bmi(self):
+        """Test that the 0.0 placeholder BMI is left out of the histogram"""
+        bands = analytics_model.band_histogram(self.columns.bmi, self.columns.stroke, analytics_model.BMI_BANDS)
+        self.assertEqual(sum(b['count'] for b in bands), 2)
+        glucose = analytics_model.band_histogram(self.columns.glucose, self.columns.stroke,
+                                                 analytics_model.GLUCOSE_BANDS)
+        self.assertEqual([b['count'] for b in glucose], [0, 1, 1, 0, 1])
+
+    def test_crosstab(self):
+        """Test the hypertension by heart disease contingency table"""
+        table = analytics_model.crosstab(self.columns, 'hypertension', 'heart_disease')
+        self.assertEqual(table['counts'], [[1, 0], [1, 1]])
+        self.assertEqual(table['rates'][1][0], 1.0)
+
+    def test_dashboard_cached_until_write(self):
+        """Test that aggregates are recomputed only after an assessment write"""
+        tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(tmpdir.name, 'analytics.db'))
+        try:
+            init_database()
+            with mock.patch.object(analytics_model, 'load_columns', return_value=self.columns) as load:
+                analytics_model.get_dashboard()
+                analytics_model.get_dashboard()
+                self.assertEqual(load.call_count, 1)
+                # A write in any process bumps the shared version
+                versions.bump(versions.ASSESSMENTS)
+                summary = analytics_model.get_dashboard()
+                self.assertEqual(load.call_count, 2)
+        finally:
+            init_pool()
+            tmpdir.cleanup()
+        self.assertEqual(summary['total'], 3)
+        self.assertEqual(summary['strokes'], 1)
+
+    def test_dashboard_route(self):
+        """Test that admins can render the analytics page"""
+        tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(tmpdir.name, 'analytics.db'))
+        try:
+            init_database()
+            User.create_user('Ada', 'Admin', 'ada@example.com', 'admin', 'Admin123!')
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = 1
+            with mock.patch.object(analytics_model, 'load_columns', return_value=self.columns):
+                response = client.get('/analytics')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'Stroke Rate by Smoking status', response.data)
+        finally:
+            init_pool()
+            tmpdir.cleanup()
+
+
+class PatientAggregateTest(unittest.TestCase):
+    """Test cases for concurrent loading of the patient detail page"""
+
+    def slow(self, seconds, value):
+        def fetch(patient_id):
+            time.sleep(seconds)
+            return value
+        return fetch
+
+    def test_sources_load_concurrently(self):
+        """Test that latency tracks the slowest source rather than the sum"""
+        patient = Patient(7, 'A', 'B', 'a@b.com', 'Male', '1970-01-01', 1)
+        with mock.patch.object(Patient, 'get_patient_by_id', self.slow(0.2, patient)), \
+             mock.patch.object(patient_aggregate, 'get_allergies_by_patient_id', self.slow(0.2, ['a'])), \
+             mock.patch.object(patient_aggregate, 'get_assessments_by_patient_id', self.slow(0.2, ['b'])):
+            aggregate = patient_aggregate.load_patient_aggregate(7)
+        self.assertIs(aggregate.patient, patient)
+        self.assertEqual((aggregate.allergies, aggregate.assessments), (['a'], ['b']))
+        self.assertLess(aggregate.timings['total'], 450)
+        self.assertEqual(aggregate.errors, {})
+
+    def test_slow_mongo_source_times_out(self):
+        """Test that a slow Mongo source falls back to an empty list"""
+        patient = Patient(7, 'A', 'B', 'a@b.com', 'Male', '1970-01-01', 1)
+        with mock.patch.object(patient_aggregate.Config, 'AGGREGATE_MONGO_TIMEOUT', 0.05), \
+             mock.patch.object(Patient, 'get_patient_by_id', self.slow(0, patient)), \
+             mock.patch.object(patient_aggregate, 'get_allergies_by_patient_id', self.slow(0.3, ['late'])), \
+             mock.patch.object(patient_aggregate, 'get_assessments_by_patient_id', self.slow(0, [])):
+            aggregate = patient_aggregate.load_patient_aggregate(7)
+        self.assertEqual(aggregate.allergies, [])
+        self.assertEqual(aggregate.errors, {'allergies': 'timed out'})
+
+    def test_patient_lookup_failure_redirects(self):
+        """Test that a failed or slow patient row flashes an error instead of a 500"""
+        tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(tmpdir.name, 'aggregate.db'))
+        try:
+            init_database()
+            User.create_user('Doc', 'Tor', 'doc@example.com', 'doctor', 'Doctor123!')
+            identity.invalidate_user()
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = 1
+            with mock.patch.object(patient_aggregate.Config, 'AGGREGATE_SQLITE_TIMEOUT', 0.05), \
+                 mock.patch.object(Patient, 'get_patient_by_id', self.slow(0.3, None)), \
+                 mock.patch.object(patient_aggregate, 'get_allergies_by_patient_id', self.slow(0, [])), \
+                 mock.patch.object(patient_aggregate, 'get_assessments_by_patient_id', self.slow(0, [])):
+                response = client.get('/edit-patient/7')
+            self.assertEqual(response.status_code, 302)
+            with client.session_transaction() as sess:
+                self.assertIn(('danger', 'Failed to load patient: timed out'), sess['_flashes'])
+        finally:
+            identity.invalidate_user()
+            init_pool()
+            tmpdir.cleanup()
+
+
+class BenchmarkHarnessTest(unittest.TestCase):
+    """Test cases for the route benchmark harness and Mongo stand-in"""
+
+    def test_standin_queries(self):
+        """Test the stand-in's filters, projections and indexed lookups"""
+        coll = FakeMongoClient()['db']['allergies']
+        coll.create_index('patient_id')
+        coll.insert_many([{'patient_id': i % 3, 'severity': s} for i, s in enumerate('abcdef')])
+        self.assertEqual(len(list(coll.find({'patient_id': 1}))), 2)
+        self.assertEqual(coll.count_documents({'patient_id': {'$in': [0, 2]}}), 4)
+        self.assertEqual(list(coll.find({'severity': 'a'}, {'_id': 0, 'severity': 1})), [{'severity': 'a'}])
+        self.assertEqual(coll.delete_many({'patient_id': 0}).deleted_count, 2)
+        self.assertEqual(coll.count_documents({}), 4)
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(route_bench.percentile(values, 50), 50)
+        self.assertEqual(route_bench.percentile(values, 99), 99)
+
+    def test_run_reports_every_route(self):
+        """Test a tiny end-to-end benchmark run"""
+        results = route_bench.run(scale=0.01, requests=2,
+                                  only=['GET /patient-management', 'GET /edit-patient/<id>'])
+        self.assertEqual(set(results['routes']), {'GET /patient-management', 'GET /edit-patient/<id>'})
+        for stats in results['routes'].values():
+            self.assertEqual(stats['requests'], 2)
+            self.assertEqual(stats['errors'], 0)
+        self.assertEqual(results['meta']['patients'], 51)
+
+
+class MetricsTest(unittest.TestCase):
+    """Test cases for the /metrics endpoint and instrumentation"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'metrics.db'))
+        init_database()
+        User.create_user('Ada', 'Admin', 'ada@example.com', 'admin', 'Admin123!')
+        User.create_user('Dee', 'Doctor', 'dee@example.com', 'doctor', 'Doctor123!')
+        self.client = app.test_client()
+
+    def tearDown(self):
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def login(self, user_id):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = user_id
+
+    def test_metrics_report_routes_sql_and_templates(self):
+        """Test that a page view shows up per route, per source and per template"""
+        self.login(1)
+        self.client.get('/patient-management')
+        mongo_connection._event_listeners()[1].succeeded(mock.Mock(command_name='find', duration_micros=1500))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        body = response.get_data(as_text=True)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/patient-management",status="200"}', body)
+        self.assertIn('data_source_duration_seconds_count{source="sqlite",operation="SELECT"}', body)
+        self.assertIn('data_source_duration_seconds_count{source="mongo",operation="find"}', body)
+        self.assertIn('template_render_duration_seconds_count{template="patient_management.html"}', body)
+        self.assertIn('sqlite_pool_checkouts_total', body)
+
+    def test_metrics_admin_only(self):
+        """Test that non-admins cannot read metrics"""
+        self.login(2)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 302)
+
+
+class PasswordHashingTest(unittest.TestCase):
+    """Test cases for the bounded hashing pool and rehash on login"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'hashing.db'))
+        init_database()
+        identity.invalidate_user()
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+
+    def tearDown(self):
+        app.config['WTF_CSRF_ENABLED'] = True
+        identity.invalidate_user()
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def test_full_queue_rejects(self):
+        """Test that work beyond workers plus queue limit fails fast"""
+        pool = password_hashing.HashingPool(workers=1, max_queue=1, timeout=5)
+        release = threading.Event()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(pool.run(release.wait))) for _ in range(2)]
+        for t in threads:
+            t.start()
+        while pool.in_flight < 2:
+            time.sleep(0.001)
+        with self.assertRaises(password_hashing.HashingBusy):
+            pool.run(lambda: None)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [True, True])
+        self.assertEqual(pool.rejected, 1)
+        self.assertEqual(pool.in_flight, 0)
+        pool.shutdown()
+
+    def test_login_rehashes_outdated_hash(self):
+        """Test that a hash made with old parameters is upgraded on login"""
+        User.create_user('Old', 'Hash', 'old@example.com', 'doctor', 'Doctor123!')
+        old_hash = generate_password_hash('Doctor123!', method='pbkdf2:sha256:1000')
+        with get_db() as conn:
+            conn.execute('UPDATE users SET password_hash = ? WHERE email = ?', (old_hash, 'old@example.com'))
+
+        user = User.authenticate_user('old@example.com', 'Doctor123!')
+        self.assertIsNotNone(user)
+        stored = User.get_user_by_id(user.id).password_hash
+        self.assertNotEqual(stored, old_hash)
+        self.assertFalse(password_hashing.needs_rehash(stored))
+        self.assertIsNotNone(User.authenticate_user('old@example.com', 'Doctor123!'))
+        self.assertIsNone(User.authenticate_user('old@example.com', 'wrong'))
+
+    def test_login_busy_returns_503(self):
+        """Test that the login page reports a full hashing queue"""
+        User.create_user('Doc', 'Tor', 'doc@example.com', 'doctor', 'Doctor123!')
+        client = app.test_client()
+        with mock.patch.object(password_hashing, 'get_hashing_pool') as get_pool:
+            get_pool.return_value.run.side_effect = password_hashing.HashingBusy('busy')
+            response = client.post('/login', data={'email': 'doc@example.com', 'password': 'Doctor123!'})
+        self.assertEqual(response.status_code, 503)
+
+    def test_timeout_raises_busy(self):
+        """Test that a hash slower than the timeout is reported as busy"""
+        pool = password_hashing.HashingPool(workers=1, max_queue=0, timeout=0.05)
+        with self.assertRaises(password_hashing.HashingBusy):
+            pool.run(time.sleep, 0.3)
+        pool.shutdown()
+        self.assertEqual(pool.in_flight, 0)
+
+    def test_login_timeout_returns_503(self):
+        """Test that a timed-out hash takes the busy path on the login page"""
+        User.create_user('Doc', 'Tor', 'doc@example.com', 'doctor', 'Doctor123!')
+        pool = password_hashing.HashingPool(workers=1, max_queue=0, timeout=0.05)
+        slow_check = lambda *args: time.sleep(0.3) or False
+        with mock.patch.object(password_hashing, 'get_hashing_pool', return_value=pool), \
+                mock.patch.object(password_hashing, 'check_password_hash', slow_check):
+            response = app.test_client().post('/login', data={'email': 'doc@example.com', 'password': 'Doctor123!'})
+        pool.shutdown()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn(b'try again shortly', response.data)
+
+    def test_hash_prefix_computed_once_on_pool(self):
+        """Test that concurrent first callers share one prefix hash run on the pool"""
+        threads_used = []
+
+        def recording_hash(password, method):
+            threads_used.append(threading.current_thread().name)
+            return generate_password_hash(password, method=method)
+
+        with mock.patch.object(password_hashing, 'generate_password_hash', recording_hash):
+            pool = password_hashing.HashingPool(workers=2, max_queue=2, timeout=5, method='pbkdf2:sha256:1000')
+            prefixes = []
+            callers = [threading.Thread(target=lambda: prefixes.append(pool.hash_prefix())) for _ in range(4)]
+            for t in callers:
+                t.start()
+            for t in callers:
+                t.join()
+        pool.shutdown()
+        self.assertEqual(prefixes, ['pbkdf2:sha256:1000'] * 4)
+        self.assertEqual(len(threads_used), 1)
+        self.assertTrue(threads_used[0].startswith('password-hash'))
+
+
+class PatientExportTest(unittest.TestCase):
+    """Test cases for the streaming patient export"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'export.db'))
+        init_database()
+        mongo_connection.use_client(FakeMongoClient())
+        migrations.run_mongo_migrations()
+        User.create_user('Ada', 'Admin', 'ada@example.com', 'admin', 'Admin123!')
+        for i in range(5):
+            Patient.create_patient(f'First{i}', f'Last{i}', f'p{i}@example.com', 'Female', '1980-01-01', 1)
+        assessment_model.create_assessment(1, 1, 0, 'Yes', 'Private', 'Urban', 120.5, 28.0, 'never smoked', 0)
+        assessment_model.create_assessment(1, 1, 1, 'Yes', 'Private', 'Urban', 180.0, 31.0, 'smokes', 1)
+        create_allergy(3, 'Latex', 'Severe', '2024-01-01')
+        identity.invalidate_user()
+
+    def tearDown(self):
+        identity.invalidate_user()
+        mongo_connection.close_client()
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def test_records_join_mongo_documents_in_batches(self):
+        """Test that each batch issues one $in query per collection"""
+        _, coll = assessment_model.get_assessment_collection()
+        with mock.patch.object(type(coll), 'find', autospec=True, side_effect=type(coll).find) as find:
+            records = list(patient_export.export_records(batch_size=2))
+        self.assertEqual([r['id'] for r in records], [1, 2, 3, 4, 5])
+        self.assertEqual(len(records[0]['assessments']), 2)
+        self.assertEqual(records[2]['allergies'], [{'allergen': 'Latex', 'severity': 'Severe', 'date_added': '2024-01-01'}])
+        # Three patient batches, each with one assessments and one allergies lookup
+        self.assertEqual(find.call_count, 6)
+        self.assertEqual(find.call_args_list[0].args[1], {'patient_id': {'$in': [1, 2]}})
+
+    def test_csv_has_one_row_per_assessment(self):
+        """Test that CSV rows repeat the patient for each assessment"""
+        lines = ''.join(patient_export.iter_csv(patient_export.export_records())).splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'first_name', 'last_name'])
+        self.assertEqual(len(lines), 1 + 2 + 4)
+        self.assertTrue(lines[3].startswith('2,First1'))
+        self.assertTrue(lines[4].endswith('Latex (Severe)'))
+
+    def test_export_route_streams_ndjson(self):
+        """Test that admins get a streamed NDJSON download"""
+        app.config['TESTING'] = True
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        response = client.get('/export-patients?format=ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['assessments'][1]['stroke'], 1)
+
+    def test_unreachable_mongo_fails_before_streaming(self):
+        """Test that the export checks MongoDB before any of the download is sent"""
+        app.config['TESTING'] = True
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        _, mdb = mongo_connection.mongo_conn()
+        with mock.patch.object(type(mdb), 'command', side_effect=ConnectionError('connection refused')):
+            response = client.get('/export-patients?format=ndjson')
+        self.assertEqual(response.status_code, 302)
+        with client.session_transaction() as sess:
+            self.assertIn('connection refused', sess['_flashes'][-1][1])
+
+
+class PatientImportTest(unittest.TestCase):
+    """Test cases for the chunked CSV import"""
+
+    HEADER = ('first_name,last_name,email,id,gender,age,hypertension,heart_disease,ever_married,'
+              'work_type,Residence_type,avg_glucose_level,bmi,smoking_status,stroke\n')
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'import.db'))
+        init_database()
+        mongo_connection.use_client(FakeMongoClient())
+        User.create_user('Ada', 'Admin', 'ada@example.com', 'admin', 'Admin123!')
+        identity.invalidate_user()
+
+    def tearDown(self):
+        identity.invalidate_user()
+        mongo_connection.close_client()
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def csv_bytes(self, *rows):
+        return io.BytesIO((self.HEADER + ''.join(row + '\n' for row in rows)).encode('utf-8'))
+
+    def test_valid_rows_import_and_invalid_rows_are_reported(self):
+        """Test that bad rows are skipped with their line numbers"""
+        data = self.csv_bytes(
+            'Avery,Wilson,avery@mail.com,1,Male,67.0,0,1,Yes,Private,Urban,228.69,36.6,formerly smoked,1',
+            'Jamie,Davis,jamie@mail.com,2,Female,61.0,0,0,Yes,children,Rural,202.21,,never smoked,0',
+            ',Nobody,bad@mail.com,3,Male,40,0,0,No,Private,Urban,100,25,smokes,0',
+            'Sam,Lee,sam@mail.com,4,Male,40,0,0,No,Private,Urban,100,250,smokes,0',
+            'Kim,Park,kim@mail.com,5,Female,30,0,0,No,Govt_job,Urban,90,22,Unknown,0',
+        )
+        report = patient_import.import_csv(data, created_by=1, chunk_size=2)
+        self.assertEqual((report['rows'], report['imported'], report['failed']), (5, 3, 2))
+        self.assertEqual([e['line'] for e in report['errors']], [4, 5])
+        self.assertEqual(report['errors'][0]['errors'], ['First name and last name are required'])
+        self.assertEqual(report['errors'][1]['errors'], ['BMI must be between 10 and 100'])
+        patients = Patient.get_all_patients()
+        self.assertEqual([p.email for p in patients], ['avery@mail.com', 'jamie@mail.com', 'kim@mail.com'])
+        jamie = assessment_model.get_assessments_by_patient_id(patients[1].id)[0]
+        self.assertEqual((jamie['work_type'], jamie['smoking_status'], jamie['bmi']), ('Children', 'Never smoked', 0.0))
+
+    def test_mongo_failure_rolls_back_chunk(self):
+        """Test that a failed assessment write removes the chunk's patients"""
+        data = self.csv_bytes('Kim,Park,kim@mail.com,5,Female,30,0,0,No,Govt_job,Urban,90,22,Unknown,0')
+        with mock.patch.object(patient_import, 'bulk_create_assessments', side_effect=RuntimeError('down')):
+            report = patient_import.import_csv(data, created_by=1)
+        self.assertEqual((report['imported'], report['failed']), (0, 1))
+        self.assertEqual(Patient.get_all_patients(), [])
+
+    def test_add_assessment_stores_heart_disease(self):
+        """Test that the assessment form's heart disease answer is saved"""
+        User.create_user('Doc', 'Tor', 'doc@example.com', 'doctor', 'Doctor123!')
+        patient_id = Patient.create_patient('Kim', 'Park', 'kim@mail.com', 'Female', '1990-01-01', 1)
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 2
+        try:
+            client.post(f'/add-assessment/{patient_id}', data=dict(ValidationSchemaTest.ASSESSMENT))
+        finally:
+            app.config['WTF_CSRF_ENABLED'] = True
+        saved = assessment_model.get_assessments_by_patient_id(patient_id)
+        self.assertEqual([a['heart_disease'] for a in saved], [1])
+
+    def test_import_route_reports_missing_columns(self):
+        """Test that the upload endpoint rejects a CSV in the wrong layout"""
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        try:
+            bad = client.post('/import-patients', data={'file': (io.BytesIO(b'name\nx\n'), 'p.csv')})
+            good = client.post('/import-patients', data={'file': (self.csv_bytes(
+                'Kim,Park,kim@mail.com,5,Female,30,0,0,No,Govt_job,Urban,90,22,Unknown,0'), 'p.csv')})
+        finally:
+            app.config['WTF_CSRF_ENABLED'] = True
+        self.assertEqual(bad.status_code, 400)
+        self.assertIn('first_name', bad.get_json()['error'])
+        self.assertEqual(good.get_json()['imported'], 1)
+
+
+class ValidationSchemaTest(unittest.TestCase):
+    """Test cases for the declarative validation schemas"""
+
+    ASSESSMENT = {
+        'hypertension': '0', 'heart_disease': '1', 'ever_married': 'Yes', 'work_type': 'Private',
+        'residence_type': 'Urban', 'avg_glucose_level': '105.5', 'bmi': '27.1',
+        'smoking_status': 'Never smoked', 'stroke': '0',
+    }
+
+    def test_range_errors_are_reported(self):
+        """Test that out-of-range numbers keep their own message"""
+        with self.assertRaisesRegex(ValueError, 'between 0 and 300'):
+            validate_assessment(**dict(self.ASSESSMENT, avg_glucose_level='450'))
+        with self.assertRaisesRegex(ValueError, 'Invalid BMI'):
+            validate_assessment(**dict(self.ASSESSMENT, bmi='abc'))
+
+    def test_validate_returns_converted_values(self):
+        """Test that numeric and date fields come back parsed"""
+        cleaned = ASSESSMENT_SCHEMA.validate(self.ASSESSMENT)
+        self.assertEqual(cleaned['bmi'], 27.1)
+        patient = PATIENT_SCHEMA.validate({'first_name': 'A', 'last_name': 'B', 'gender': 'Male',
+                                           'date_of_birth': '1980-02-01'})
+        self.assertEqual(patient['date_of_birth'].year, 1980)
+        self.assertNotIn('email', patient)
+
+    def test_batch_mode_returns_errors_per_row(self):
+        """Test that validate_many collects every error for every row"""
+        rows = [
+            dict(self.ASSESSMENT),
+            dict(self.ASSESSMENT, heart_disease='2', bmi='5'),
+            {},
+        ]
+        errors = ASSESSMENT_SCHEMA.validate_many(rows)
+        self.assertEqual(errors[0], [])
+        self.assertEqual(errors[1], ['Heart disease must be 0 or 1', 'BMI must be between 10 and 100'])
+        self.assertEqual(len(errors[2]), 9)
+
+    def test_patient_rules_unchanged(self):
+        """Test the patient messages users already see"""
+        cases = [
+            (('', 'B', 'Male', '1980-01-01', 'a@b.com'), 'First name and last name are required'),
+            (('A', 'B', 'Male', '1980-01-01', 'not-an-email'), 'Invalid email format'),
+            (('A', 'B', 'Robot', '1980-01-01', None), 'Invalid gender selection'),
+            (('A', 'B', 'Male', '01/01/1980', None), 'Invalid date format'),
+            (('A', 'B', 'Male', '2999-01-01', None), 'Date of birth cannot be in the future'),
+            (('A', 'B', 'Male', '1800-01-01', None), 'Invalid age'),
+        ]
+        for args, message in cases:
+            with self.assertRaisesRegex(ValueError, message):
+                validate_patient(*args)
+        self.assertTrue(validate_patient('A', 'B', 'Female', '1980-01-01', 'a@b.com'))
+
+
+class RiskModelTest(unittest.TestCase):
+    """Test cases for stroke risk training and scoring"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'risk.db'))
+        init_database()
+        mongo_connection.use_client(FakeMongoClient())
+        User.create_user('Ada', 'Admin', 'ada@example.com', 'admin', 'Admin123!')
+        rng = np.random.default_rng(7)
+        docs = []
+        for i in range(400):
+            age = int(rng.integers(20, 90))
+            patient_id = Patient.create_patient(f'P{i}', 'Test', f'p{i}@example.com', 'Female',
+                                                f'{datetime.date.today().year - age}-01-01', 1)
+            hypertension = int(rng.random() < 0.3)
+            stroke = int(rng.random() < 1 / (1 + np.exp(-(age - 75) / 6 - 1.5 * hypertension)))
+            docs.append(assessment_model.build_assessment(
+                patient_id, hypertension, 0, 'Yes', 'Private', 'Urban', 100.0, 25.0, 'never smoked', stroke))
+        assessment_model.bulk_create_assessments(docs)
+        identity.invalidate_user()
+
+    def tearDown(self):
+        identity.invalidate_user()
+        mongo_connection.close_client()
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def test_model_learns_and_cohort_is_scored(self):
+        """Test that training finds the age effect and scores every patient"""
+        model = risk_model.train_model()
+        self.assertEqual(risk_model.RiskModel.latest().id, model.id)
+        weights = dict(zip(risk_model.FEATURES, model.weights[1:]))
+        self.assertGreater(weights['age'], 1)
+        self.assertGreater(weights['hypertension'], 0)
+        self.assertEqual(risk_model.score_cohort(), 400)
+
+        patients, _, _ = Patient.get_patients_page(sort='risk_score', direction='desc', limit=400)
+        scores = [p.risk_score for p in patients]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        columns = analytics_model.load_columns()
+        by_id = {p.id: p.risk_score for p in patients}
+        self.assertGreater(risk_model.roc_auc([by_id[i] for i in columns.patient_id.tolist()], columns.stroke == 1), 0.8)
+
+    def test_new_assessment_rescores_only_its_patient(self):
+        """Test that create_assessment updates one patient's score"""
+        risk_model.train_model()
+        risk_model.score_cohort()
+        before = {p.id: p.risk_score for p in Patient.get_all_patients()}
+        # Flip hypertension, the feature the synthetic outcomes depend on besides age
+        hypertension = 1 - assessment_model.get_assessments_by_patient_id(5)[0]['hypertension']
+        with mock.patch.object(Patient, 'update_risk_scores', wraps=Patient.update_risk_scores) as update:
+            assessment_model.create_assessment(5, hypertension, 0, 'Yes', 'Private', 'Urban', 100.0, 25.0,
+                                               'never smoked', 0)
+        self.assertEqual([pid for pid, _ in update.call_args.args[0]], [5])
+        after = {p.id: p.risk_score for p in Patient.get_all_patients()}
+        self.assertEqual(after[5] > before[5], bool(hypertension))
+        del before[5], after[5]
+        self.assertEqual(before, after)
+
+    def test_unscored_patients_sort_last_and_paginate(self):
+        """Test keyset pages over risk with some patients unscored"""
+        risk_model.train_model()
+        risk_model.score_cohort()
+        Patient.update_risk_scores([(pid, None) for pid in range(1, 401, 2)])
+        seen, after = [], None
+        while True:
+            page, after, _ = Patient.get_patients_page(sort='risk_score', direction='desc', after=after, limit=64)
+            seen += page
+            if after is None:
+                break
+        self.assertEqual(len({p.id for p in seen}), 400)
+        self.assertTrue(all(p.risk_score is None for p in seen[200:]))
+
+    def test_demographics_are_looked_up_in_batches(self):
+        """Test that incremental scoring reads only the given patients, in batches"""
+        ids = [7, 3, 400, 3, 12, 999, 150, 1]
+        with mock.patch.object(risk_model, '_ID_BATCH_SIZE', 3):
+            batched = risk_model._demographics(ids)
+        whole = risk_model._demographics(ids, whole_cohort=True)
+        for got, expected in zip(batched, whole):
+            np.testing.assert_array_equal(got, expected)
+        self.assertEqual(batched[0].tolist(), [True] * 5 + [False, True, True])
+
+    def test_cohort_scores_latest_assessment_by_id(self):
+        """Test that the newest _id wins even when it is not the last document stored"""
+        from bson.objectid import ObjectId
+        risk_model.train_model()
+        risk_model.score_cohort()
+        original = assessment_model.get_assessments_by_patient_id(5)[0]
+        baseline = Patient.get_patient_by_id(5).risk_score
+        _, coll = assessment_model.get_assessment_collection()
+        coll.insert_one(dict(original, _id=ObjectId(), patient_id=5, hypertension=1 - original['hypertension']))
+        # Stored last, but older than both
+        coll.insert_one(dict(original, _id=ObjectId.from_datetime(datetime.datetime(2001, 1, 1)), patient_id=5))
+        risk_model.score_cohort()
+        self.assertNotEqual(Patient.get_patient_by_id(5).risk_score, baseline)
+
+    def test_partial_bulk_insert_rescores_written_documents(self):
+        """Test that documents written before a BulkWriteError still update scores"""
+        from pymongo.errors import BulkWriteError
+        risk_model.train_model()
+        _, coll = assessment_model.get_assessment_collection()
+        docs = [assessment_model.build_assessment(pid, 1, 0, 'Yes', 'Private', 'Urban', 100.0, 25.0,
+                                                  'never smoked', 0) for pid in (5, 6)]
+
+        def partial_insert(documents, ordered=True):
+            coll.insert_one(documents[0])
+            raise BulkWriteError({'writeErrors': [{'index': 1, 'code': 121}], 'nInserted': 1})
+
+        with mock.patch.object(coll, 'insert_many', side_effect=partial_insert), \
+                mock.patch.object(Patient, 'update_risk_scores') as update:
+            self.assertEqual(assessment_model.bulk_create_assessments(docs), 1)
+        self.assertEqual([pid for pid, _ in update.call_args.args[0]], [5])
+
+
+class ConditionalGetTest(unittest.TestCase):
+    """Test cases for ETag/Last-Modified revalidation of pages"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'conditional.db'))
+        init_database()
+        mongo_connection.use_client(FakeMongoClient())
+        User.create_user('Doc', 'Tor', 'doc@example.com', 'doctor', 'Doctor123!')
+        self.first = Patient.create_patient('Ann', 'Lee', 'ann@example.com', 'Female', '1980-01-01', 1)
+        self.second = Patient.create_patient('Bob', 'Ray', 'bob@example.com', 'Male', '1970-01-01', 1)
+        identity.invalidate_user()
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 1
+
+    def tearDown(self):
+        identity.invalidate_user()
+        mongo_connection.close_client()
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, headers={'If-None-Match': etag})
+
+    def test_unchanged_listing_is_not_rerendered(self):
+        """Test that a matching ETag skips the page queries"""
+        first = self.client.get('/patient-management')
+        etag = first.headers['ETag'].strip('"')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first.headers['Cache-Control'])
+        self.assertIsNotNone(first.last_modified)
+        with mock.patch.object(Patient, 'get_patients_page') as page:
+            second = self.revalidate('/patient-management', etag)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.headers['ETag'].strip('"'), etag)
+        page.assert_not_called()
+
+        Patient.update_patient(self.second, 'Bob', 'Ray', 'Male', '1971-01-01')
+        self.assertEqual(self.revalidate('/patient-management', etag).status_code, 200)
+
+    def test_patient_page_tracks_its_own_writes(self):
+        """Test that only writes for the same patient change the edit page"""
+        url = f'/edit-patient/{self.first}'
+        etag = self.client.get(url).headers['ETag'].strip('"')
+        create_allergy(self.second, 'Latex', 'Mild', '2024-01-01')
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+
+        allergy_id = create_allergy(self.first, 'Latex', 'Mild', '2024-01-01')
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag'].strip('"')
+        delete_allergy(allergy_id, self.first)
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_pending_flash_forces_render(self):
+        """Test that a page carrying a flashed message is always rendered"""
+        etag = self.client.get('/patient-management').headers['ETag'].strip('"')
+        with self.client.session_transaction() as sess:
+            sess['_flashes'] = [('success', 'Saved')]
+        response = self.revalidate('/patient-management', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Saved', response.data)
+
+    def test_static_files_are_versioned_and_long_cached(self):
+        """Test the static cache-buster and max-age"""
+        with tempfile.TemporaryDirectory() as static:
+            with open(os.path.join(static, 'app.css'), 'w') as f:
+                f.write('body {}')
+            original, app.static_folder = app.static_folder, static
+            try:
+                with app.test_request_context():
+                    url = url_for('static', filename='app.css')
+                response = self.client.get(url)
+                response.close()
+            finally:
+                app.static_folder = original
+        self.assertIn('v=', url)
+        self.assertIn(f'max-age={Config.STATIC_MAX_AGE}', response.headers['Cache-Control'])
+
+    def test_failed_bulk_insert_keeps_versions(self):
+        """Test that an insert_many that raises bumps no versions"""
+        scopes = [versions.ASSESSMENTS, versions.patient_scope(self.first)]
+        before = versions.get_versions(scopes)
+        doc = assessment_model.build_assessment(self.first, 0, 0, 'Yes', 'Private', 'Urban', 90.0, 24.0,
+                                                'never smoked', 0)
+        _, coll = assessment_model.get_assessment_collection()
+        with mock.patch.object(coll, 'insert_many', side_effect=ConnectionError('down')):
+            with self.assertRaises(ConnectionError):
+                assessment_model.bulk_create_assessments([doc])
+        self.assertEqual(versions.get_versions(scopes), before)
+
+
+class LazyModalTest(unittest.TestCase):
+    """Test cases for the shared, lazily loaded row modals"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'modals.db'))
+        init_database()
+        mongo_connection.use_client(FakeMongoClient())
+        User.create_user('Ad', 'Min', 'admin@example.com', 'admin', 'Admin123!')
+        User.create_user('Doc', 'Tor', 'doc@example.com', 'doctor', 'Doctor123!')
+        self.patients = [
+            Patient.create_patient('Ann', f'Lee{i}', f'ann{i}@example.com', 'Female', '1980-01-01', 1)
+            for i in range(30)
+        ]
+        identity.invalidate_user()
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app.test_client()
+
+    def tearDown(self):
+        app.config['WTF_CSRF_ENABLED'] = True
+        identity.invalidate_user()
+        mongo_connection.close_client()
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def login(self, user_id):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = user_id
+
+    def test_listing_renders_one_modal(self):
+        """Test that the listing carries one shared modal, not one per row"""
+        self.login(1)
+        html = self.client.get('/patient-management?per_page=25').get_data(as_text=True)
+        self.assertEqual(html.count('class="modal fade"'), 3)
+        self.assertEqual(html.count('data-bs-target="#sharedModal"'), 25)
+        self.assertNotIn('Confirm Delete', html)
+
+    def test_patient_delete_fragment(self):
+        """Test that the delete fragment posts to the patient's delete route"""
+        self.login(1)
+        patient_id = self.patients[3]
+        response = self.client.get(f'/patient-modal/{patient_id}/delete')
+        html = response.get_data(as_text=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('<html', html)
+        self.assertIn(f'action="/delete-patient/{patient_id}"', html)
+        self.assertIn('Lee3', html)
+        self.assertEqual(self.client.get('/patient-modal/9999/delete').status_code, 404)
+        self.assertEqual(self.client.get(f'/patient-modal/{patient_id}/rename').status_code, 404)
+
+        self.login(2)
+        self.assertEqual(self.client.get(f'/patient-modal/{patient_id}/delete').status_code, 302)
+
+    def test_allergy_fragments(self):
+        """Test the allergy edit/delete fragments and their ownership check"""
+        self.login(2)
+        patient_id, other_id = self.patients[0], self.patients[1]
+        allergy_id = create_allergy(patient_id, 'Latex', 'Moderate', '2024-01-01')
+        page = self.client.get(f'/edit-patient/{patient_id}').get_data(as_text=True)
+        self.assertEqual(page.count('class="modal fade"'), 3)
+        self.assertNotIn('Edit Allergy', page)
+
+        edit = self.client.get(f'/allergy-modal/{patient_id}/{allergy_id}/edit').get_data(as_text=True)
+        self.assertIn(f'action="/update-allergy/{patient_id}/{allergy_id}"', edit)
+        self.assertIn('value="Moderate" selected', edit)
+        delete = self.client.get(f'/allergy-modal/{patient_id}/{allergy_id}/delete').get_data(as_text=True)
+        self.assertIn(f'action="/delete-allergy/{patient_id}/{allergy_id}"', delete)
+
+        self.assertEqual(self.client.get(f'/allergy-modal/{other_id}/{allergy_id}/edit').status_code, 404)
+        self.assertEqual(self.client.get(f'/allergy-modal/{patient_id}/not-an-id/edit').status_code, 404)
+
+
+class StreamingCompressionTest(unittest.TestCase):
+    """Test cases for streamed page rendering and gzip compression"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'streaming.db'))
+        init_database()
+        mongo_connection.use_client(FakeMongoClient())
+        User.create_user('Ad', 'Min', 'admin@example.com', 'admin', 'Admin123!')
+        for i in range(60):
+            Patient.create_patient('Ann', f'Lee{i}', f'ann{i}@example.com', 'Female', '1980-01-01', 1)
+        identity.invalidate_user()
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 1
+
+    def tearDown(self):
+        identity.invalidate_user()
+        mongo_connection.close_client()
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def test_listing_is_streamed_in_chunks(self):
+        """Test that the listing is sent in several chunks of STREAM_CHUNK_SIZE"""
+        response = self.client.get('/patient-management?per_page=60', buffered=False)
+        chunks = list(response.response)
+        response.close()
+        self.assertGreater(len(chunks), 2)
+        self.assertTrue(all(len(c) >= Config.STREAM_CHUNK_SIZE for c in chunks[:-1]))
+        self.assertIn(b'Lee59', b''.join(chunks))
+
+        with mock.patch.object(Config, 'STREAM_TEMPLATES', False):
+            response = self.client.get('/patient-management?per_page=60', buffered=False)
+            self.assertEqual(len(list(response.response)), 1)
+            response.close()
+
+    def test_session_writes_happen_before_streaming(self):
+        """Test that flashes are consumed and the CSRF token is kept"""
+        with self.client.session_transaction() as sess:
+            sess['_flashes'] = [('success', 'Saved the patient')]
+        self.assertIn(b'Saved the patient', self.client.get('/patient-management').data)
+        self.assertNotIn(b'Saved the patient', self.client.get('/patient-management').data)
+        with self.client.session_transaction() as sess:
+            self.assertIn('csrf_token', sess)
+
+    def test_gzip_round_trip_and_revalidation(self):
+        """Test that a gzipped page decodes to the plain page and still revalidates"""
+        plain = self.client.get('/patient-management?per_page=60')
+        gzipped = self.client.get('/patient-management?per_page=60', headers={'Accept-Encoding': 'gzip'})
+        self.assertIsNone(plain.content_encoding)
+        self.assertEqual(gzipped.content_encoding, 'gzip')
+        self.assertIn('Accept-Encoding', gzipped.headers['Vary'])
+        self.assertEqual(zlib.decompress(gzipped.data, compression.GZIP_WBITS), plain.data)
+        self.assertLess(len(gzipped.data), len(plain.data) / 4)
+
+        etag = gzipped.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        again = self.client.get('/patient-management?per_page=60',
+                                headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(again.status_code, 304)
+
+    def test_threshold_and_excluded_types(self):
+        """Test that small bodies and already compressed types are sent as is"""
+        with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+            small = compression.compress_response(app.response_class('x' * 100, mimetype='application/json'))
+            large = compression.compress_response(app.response_class('x' * 5000, mimetype='application/json'))
+            image = compression.compress_response(app.response_class(b'x' * 5000, mimetype='image/png'))
+        self.assertNotIn('Content-Encoding', small.headers)
+        self.assertEqual(large.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(int(large.headers['Content-Length']), len(large.get_data()))
+        self.assertNotIn('Content-Encoding', image.headers)
+
+    def test_first_streamed_chunk_is_flushed(self):
+        """Test that the first chunk decodes on its own and small chunks are batched"""
+        chunks = ['<html>' + 'a' * 100] + ['<tr></tr>'] * 20
+        out = list(compression._gzip_chunks(iter(chunks), 6, 16384))
+        decoder = zlib.decompressobj(compression.GZIP_WBITS)
+        self.assertEqual(decoder.decompress(out[0]), chunks[0].encode())
+        self.assertLessEqual(len(out), 3)
+        self.assertEqual(zlib.decompress(b''.join(out), compression.GZIP_WBITS), ''.join(chunks).encode())
+
+
+class AuditTrailTest(unittest.TestCase):
+    """Test cases for the group-committed audit trail"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'audit.db'))
+        init_database()
+        mongo_connection.use_client(FakeMongoClient())
+        User.create_user('Ad', 'Min', 'admin@example.com', 'admin', 'Admin123!')
+        User.create_user('Doc', 'Tor', 'doc@example.com', 'doctor', 'Doctor123!')
+        identity.invalidate_user()
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app.test_client()
+
+    def tearDown(self):
+        app.config['WTF_CSRF_ENABLED'] = True
+        identity.invalidate_user()
+        mongo_connection.close_client()
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def blocked_writer(self, max_queue, batch_size):
+        """A writer whose background commits wait until the returned event is set."""
+        release, calls = threading.Event(), []
+
+        def write(rows):
+            if threading.current_thread().name == 'audit-writer':
+                calls.append(len(rows))
+                release.wait(5)
+            audit.write_rows(rows)
+
+        writer = audit.AuditWriter(max_queue, batch_size)
+        writer._write = lambda rows: write(rows) or True
+        return writer, release, calls
+
+    def row(self, n):
+        return audit._row(audit._now(), 1, audit.UPDATE, audit.PATIENT, n, n, None)
+
+    def test_model_writes_are_recorded(self):
+        """Test that patient and allergy changes land in the patient's history"""
+        patient_id = Patient.create_patient('Ann', 'Lee', 'ann@example.com', 'Female', '1980-01-01', 1)
+        Patient.update_patient(patient_id, 'Ann', 'Lee', 'Female', '1981-01-01')
+        allergy_id = create_allergy(patient_id, 'Latex', 'Mild', '2024-01-01')
+        delete_allergy(allergy_id, patient_id)
+        Patient.delete_patient(patient_id)
+        self.assertTrue(audit.flush(5))
+
+        history = audit.history_for_patient(patient_id)
+        self.assertEqual([(e['action'], e['entity']) for e in history], [
+            ('delete', 'patient'), ('delete', 'allergy'), ('create', 'allergy'),
+            ('update', 'patient'), ('create', 'patient'),
+        ])
+        self.assertEqual(history[3]['details']['date_of_birth'], '1981-01-01')
+        self.assertEqual(history[1]['entity_id'], allergy_id)
+        self.assertIsNone(history[0]['user_id'])
+        self.assertEqual([e['id'] for e in audit.history_for_patient(patient_id, limit=2, before=history[1]['id'])],
+                         [history[2]['id'], history[3]['id']])
+
+    def test_requests_record_the_signed_in_user(self):
+        """Test that changes made through routes are attributed to the user"""
+        patient_id = Patient.create_patient('Ann', 'Lee', 'ann@example.com', 'Female', '1980-01-01', 1)
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 2
+        self.client.post(f'/add-allergy/{patient_id}',
+                         data={'allergen': 'Latex', 'severity': 'Mild', 'date_added': '2024-01-01'})
+        self.client.post(f'/add-assessment/{patient_id}', data={
+            'hypertension': '0', 'heart_disease': '0', 'ever_married': 'Yes', 'work_type': 'Private',
+            'residence_type': 'Urban', 'avg_glucose_level': '105.5', 'bmi': '27.1',
+            'smoking_status': 'Never smoked', 'stroke': '0',
+        })
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 1
+        events = self.client.get('/audit-log?user_id=2').get_json()['events']
+        self.assertEqual([(e['action'], e['entity'], e['patient_id']) for e in events],
+                         [('create', 'assessment', patient_id), ('create', 'allergy', patient_id)])
+        self.assertEqual(self.client.get('/audit-log').status_code, 400)
+
+    def test_queued_events_are_group_committed(self):
+        """Test that events queued during a commit go out together in the next one"""
+        writer, release, calls = self.blocked_writer(100, 500)
+        writer.submit([self.row(0)])
+        while not calls:
+            time.sleep(0.001)
+        for n in range(1, 50):
+            writer.submit([self.row(n)])
+        release.set()
+        self.assertTrue(writer.flush(5))
+        self.assertEqual(calls, [1, 49])
+        self.assertEqual((writer.written, writer.batches, writer.inline_writes), (50, 2, 0))
+        writer.close(5)
+
+    def test_full_queue_writes_inline(self):
+        """Test that a full queue costs the caller a write instead of losing events"""
+        writer, release, calls = self.blocked_writer(2, 500)
+        writer.submit([self.row(0)])
+        while not calls:
+            time.sleep(0.001)
+        for n in range(1, 6):
+            writer.submit([self.row(n)])
+        self.assertEqual(writer.inline_writes, 3)
+        release.set()
+        self.assertTrue(writer.flush(5))
+        writer.close(5)
+        with get_db() as conn:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM audit_log').fetchone()[0], 6)
+
+    def test_log_is_append_only_and_indexed(self):
+        """Test that rows cannot be changed and history lookups use the indexes"""
+        audit.write_rows([self.row(1)])
+        with get_db() as conn:
+            with self.assertRaises(sqlite3.DatabaseError):
+                conn.execute("UPDATE audit_log SET action = 'create'")
+            with self.assertRaises(sqlite3.DatabaseError):
+                conn.execute('DELETE FROM audit_log')
+        plans = dict(migrations.sqlite_query_plans())
+        self.assertIn('idx_audit_log_patient', plans['audit log by patient'])
+        self.assertIn('idx_audit_log_user', plans['audit log by user'])
+
+    def test_pending_events_flush_before_pool_swap(self):
+        """Test that init_pool writes queued events to the old database first"""
+        path = os.path.join(self.tmpdir.name, 'audit.db')
+        Patient.create_patient('Ann', 'Lee', 'ann@example.com', 'Female', '1980-01-01', 1)
+        init_pool(os.path.join(self.tmpdir.name, 'other.db'))
+        conn = sqlite3.connect(path)
+        try:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM audit_log').fetchone()[0], 1)
+        finally:
+            conn.close()
+
+
+class ClinicalSummaryTest(unittest.TestCase):
+    """Test cases for the aggregated per-patient clinical summary"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'summary.db'))
+        init_database()
+        mongo_connection.use_client(FakeMongoClient())
+        migrations.run_mongo_migrations()
+        User.create_user('Ada', 'Admin', 'ada@example.com', 'admin', 'Admin123!')
+        for i in range(3):
+            Patient.create_patient(f'First{i}', f'Last{i}', f'p{i}@example.com', 'Female', '1980-01-01', 1)
+        assessment_model.create_assessment(1, 1, 0, 'Yes', 'Private', 'Urban', 120.5, 28.0, 'Never smoked', 0)
+        self.latest = assessment_model.create_assessment(1, 1, 1, 'Yes', 'Private', 'Urban', 180.0, 31.0, 'Smokes', 1)
+        create_allergy(1, 'Latex', 'Mild', '2024-01-01')
+        create_allergy(1, 'Penicillin', 'Severe', '2024-02-01')
+        create_allergy(2, 'Dust', 'Moderate', '2024-03-01')
+        identity.invalidate_user()
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 1
+
+    def tearDown(self):
+        identity.invalidate_user()
+        mongo_connection.close_client()
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def test_batch_summary_is_one_aggregate(self):
+        """Test that counts, highest severity and latest assessment come from one command"""
+        _, coll = assessment_model.get_assessment_collection()
+        with mock.patch.object(type(coll), 'aggregate', autospec=True, side_effect=type(coll).aggregate) as aggregate, \
+             mock.patch.object(type(coll), 'find', autospec=True) as find:
+            summaries = summary_model.get_clinical_summaries([1, 2, 3])
+        self.assertEqual(aggregate.call_count, 1)
+        find.assert_not_called()
+        first = summaries[1]
+        self.assertEqual((first['assessment_count'], first['allergy_count']), (2, 2))
+        self.assertEqual(first['max_allergy_severity'], 'Severe')
+        self.assertEqual(first['latest_assessment']['_id'], self.latest)
+        self.assertEqual(set(first['latest_assessment']), {'_id', *summary_model.LATEST_FIELDS})
+        self.assertEqual(first['latest_assessment']['stroke'], 1)
+        self.assertEqual(summaries[2]['max_allergy_severity'], 'Moderate')
+        self.assertIsNone(summaries[2]['latest_assessment'])
+        self.assertEqual(summaries[3], summary_model.empty_summary())
+
+    def test_per_patient_reads_omit_patient_id(self):
+        """Test that the edit-page reads do not send the repeated patient_id back"""
+        allergies = allergy_model.get_allergies_by_patient_id(1)
+        self.assertEqual(len(allergies), 2)
+        self.assertTrue(all('patient_id' not in a and '_id' in a for a in allergies))
+        self.assertTrue(all('patient_id' not in a for a in assessment_model.get_assessments_by_patient_id(1)))
+
+    def test_listing_shows_badges_with_one_aggregate(self):
+        """Test that the patient list renders clinical badges without per-row queries"""
+        _, coll = assessment_model.get_assessment_collection()
+        with mock.patch.object(type(coll), 'aggregate', autospec=True, side_effect=type(coll).aggregate) as aggregate:
+            response = self.client.get('/patient-management')
+        body = response.get_data(as_text=True)
+        self.assertEqual(aggregate.call_count, 1)
+        self.assertIn('2 allergies', body)
+        self.assertIn('bg-danger" title="Highest allergy severity: Severe"', ' '.join(body.split()))
+        self.assertIn('2 assessments', body)
+
+        etag = response.headers['ETag'].strip('"')
+        create_allergy(3, 'Nuts', 'Mild', '2024-04-01')
+        self.assertEqual(self.client.get('/patient-management', headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_listing_survives_mongo_failure(self):
+        """Test that a Mongo error drops the badges and disables caching"""
+        with mock.patch.object(summary_model, 'get_assessment_collection', side_effect=RuntimeError('down')):
+            response = self.client.get('/patient-management')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-store', response.headers['Cache-Control'])
+        self.assertNotIn('allergies', response.get_data(as_text=True))
+
+    def test_summary_route(self):
+        """Test the JSON summary endpoint and its id validation"""
+        data = self.client.get('/clinical-summary?ids=1,3').get_json()
+        self.assertEqual(sorted(data['summaries']), ['1', '3'])
+        self.assertEqual(data['summaries']['1']['allergy_count'], 2)
+        self.assertEqual(self.client.get('/clinical-summary?ids=1,x').status_code, 400)
+        self.assertEqual(self.client.get('/clinical-summary').status_code, 400)
+
+
+class CascadeDeleteTest(unittest.TestCase):
+    """Test cases for cascading patient deletes and the orphan sweeper"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'cascade.db'))
+        init_database()
+        mongo_connection.use_client(FakeMongoClient())
+        migrations.run_mongo_migrations()
+        self.ids = [Patient.create_patient(f'First{i}', f'Last{i}', f'p{i}@example.com', 'Female', '1980-01-01', 1)
+                    for i in range(5)]
+        for pid in self.ids:
+            create_allergy(pid, 'Latex', 'Mild', '2024-01-01')
+            assessment_model.create_assessment(pid, 1, 0, 'Yes', 'Private', 'Urban', 120.5, 28.0, 'Never smoked', 0)
+        _, self.allergies = allergy_model.get_allergy_collection()
+        _, self.assessments = assessment_model.get_assessment_collection()
+
+    def tearDown(self):
+        audit.flush(5)
+        mongo_connection.close_client()
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def remaining(self, coll):
+        return sorted(doc['patient_id'] for doc in coll.find({}))
+
+    def test_delete_patient_removes_documents(self):
+        """Test that deleting a patient deletes only their allergies and assessments"""
+        Patient.delete_patient(self.ids[0])
+        self.assertEqual(self.remaining(self.allergies), self.ids[1:])
+        self.assertEqual(self.remaining(self.assessments), self.ids[1:])
+        audit.flush(5)
+        self.assertEqual(audit.history_for_patient(self.ids[0])[0]['details'], {'allergies': 1, 'assessments': 1})
+
+    def test_bulk_delete_batches_delete_many(self):
+        """Test that many patients are removed with one delete_many per id batch"""
+        with mock.patch.object(Config, 'MONGO_DELETE_BATCH_SIZE', 2), \
+             mock.patch.object(type(self.allergies), 'delete_many', autospec=True,
+                               side_effect=type(self.allergies).delete_many) as delete_many:
+            Patient.delete_patients(self.ids)
+        # Three batches of ids for each of the two collections
+        self.assertEqual(delete_many.call_count, 6)
+        self.assertEqual(delete_many.call_args_list[0].args[1], {'patient_id': {'$in': self.ids[:2]}})
+        self.assertEqual(self.remaining(self.allergies), [])
+
+    def test_mongo_failure_keeps_patient_delete(self):
+        """Test that a failed cascade leaves orphans instead of failing the delete"""
+        with mock.patch.object(type(self.allergies), 'delete_many', side_effect=RuntimeError('down')):
+            Patient.delete_patient(self.ids[0])
+        self.assertIsNone(Patient.get_patient_by_id(self.ids[0]))
+        self.assertIn(self.ids[0], self.remaining(self.allergies))
+
+    def test_delete_allergy_checks_patient(self):
+        """Test that an allergy is only deleted through its own patient"""
+        allergy_id = str(self.allergies.find_one({'patient_id': self.ids[0]})['_id'])
+        self.assertFalse(delete_allergy(allergy_id, self.ids[1]))
+        self.assertTrue(delete_allergy(allergy_id, self.ids[0]))
+        self.assertNotIn(self.ids[0], self.remaining(self.allergies))
+
+    def test_sweeper_dry_run_then_delete(self):
+        """Test that the sweeper reports, then removes, documents of missing patients"""
+        with get_db() as conn:
+            conn.execute('DELETE FROM patients WHERE id IN (?, ?, ?)', (self.ids[0], self.ids[2], self.ids[4]))
+        self.allergies.insert_one({'patient_id': 999, 'allergen': 'Dust', 'severity': 'Mild'})
+
+        report = cascade.sweep_orphans(dry_run=True, batch_size=2, pause=0)
+        self.assertEqual(report['allergies'], {'patients': 4, 'documents': 4, 'batches': 2})
+        self.assertEqual(report['assessments'], {'patients': 3, 'documents': 3, 'batches': 2})
+        self.assertEqual(len(self.remaining(self.allergies)), 6)
+
+        with mock.patch.object(cascade.time, 'sleep') as sleep:
+            report = cascade.sweep_orphans(batch_size=2, pause=0.5)
+        self.assertEqual(report['allergies']['documents'], 4)
+        self.assertEqual(sleep.call_args_list, [mock.call(0.5)] * 2)
+        self.assertEqual(self.remaining(self.allergies), [self.ids[1], self.ids[3]])
+        self.assertEqual(self.remaining(self.assessments), [self.ids[1], self.ids[3]])
+        self.assertEqual(cascade.sweep_orphans(pause=0)['allergies']['patients'], 0)
+
+    def test_sweeper_rechecks_new_patients(self):
+        """Test that ids created after their page was read are not treated as orphans"""
+        with mock.patch.object(cascade, '_patient_ids', return_value=iter([])):
+            report = cascade.sweep_orphans(dry_run=True, pause=0)
+        self.assertEqual(report['allergies']['patients'], 0)
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'pre-forked serving needs fork()')
+class PreforkServeTest(unittest.TestCase):
+    """Test cases for the pre-forked production entry point"""
+
+    def test_pool_is_reopened_after_fork(self):
+        """Test that a forked child opens its own pool for the same database"""
+        parent = get_pool()
+        pid = os.fork()
+        if pid == 0:
+            child = get_pool()
+            os._exit(0 if child is not parent and child.path == parent.path else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+    def test_workers_serve_and_stop_gracefully(self):
+        """Test that workers share the socket, use DB_PATH and exit cleanly on SIGTERM"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, 'served.db')
+            env = dict(os.environ, DB_PATH=db_path, SHUTDOWN_TIMEOUT='10')
+            process = subprocess.Popen(
+                [sys.executable, 'serve.py', '--workers', '2', '--host', '127.0.0.1', '--port', '0'],
+                cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            try:
+                lines = []
+                while sum('ready in' in line for line in lines) < 2:
+                    line = process.stdout.readline()
+                    self.assertTrue(line, ''.join(lines))
+                    lines.append(line)
+                port = int(re.search(r':(\d+) with 2 workers', ''.join(lines)).group(1))
+                for _ in range(4):
+                    with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5) as response:
+                        self.assertEqual(response.status, 200)
+                self.assertTrue(os.path.exists(db_path))
+                process.send_signal(signal.SIGTERM)
+                output = process.communicate(timeout=15)[0]
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.communicate()
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(output.count('stopped'), 2)
+        self.assertIn('[serve] Stopped', output)
+
+
+class AppFactoryTest(unittest.TestCase):
+    """Test cases for create_app() and the import-time budget"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        init_pool(os.path.join(self.tmpdir.name, 'factory.db'))
+
+    def tearDown(self):
+        init_pool()
+        self.tmpdir.cleanup()
+
+    def test_import_defers_heavy_modules(self):
+        """Test that importing the app leaves Mongo and NumPy unloaded"""
+        result = startup_bench.measure_import('app', runs=1)
+        self.assertEqual(result['deferred_loaded'], [])
+
+    @unittest.skipUnless(os.environ.get('IMPORT_BUDGET_SECONDS'),
+                         'wall-clock check; set IMPORT_BUDGET_SECONDS to enforce it')
+    def test_import_stays_within_budget(self):
+        """Test that importing the app stays within IMPORT_BUDGET_SECONDS"""
+        result = startup_bench.measure_import('app', runs=3)
+        self.assertLess(result['best_seconds'], startup_bench.IMPORT_BUDGET_SECONDS, result['runs'])
+
+    def test_import_creates_no_database(self):
+        """Test that importing the app does not touch the working directory"""
+        with tempfile.TemporaryDirectory() as cwd:
+            startup_bench.import_once('app', cwd=cwd)
+            self.assertEqual(os.listdir(cwd), [])
+
+    def test_database_is_initialised_on_first_request(self):
+        """Test that create_app() defers init_database() to the first request, once"""
+        class TestConfig(Config):
+            TESTING = True
+
+        with mock.patch.object(init_db, 'init_database', wraps=init_db.init_database) as init:
+            factory_app = create_app(TestConfig)
+            self.assertTrue(factory_app.testing)
+            self.assertIsNot(factory_app, create_app(TestConfig))
+            init.assert_not_called()
+            client = factory_app.test_client()
+            self.assertEqual(client.get('/login').status_code, 200)
+            self.assertEqual(client.get('/register').status_code, 200)
+        init.assert_called_once()
+        with get_db() as conn:
+            self.assertIsNotNone(conn.execute(
+                "SELECT name FROM sqlite_master WHERE name = 'patients'").fetchone())
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
\ No newline at end of file
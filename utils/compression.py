@@ -0,0 +1,82 @@
+import zlib
+from flask import request
+from config import Config
+
+# gzip response compression.
+#
+# Buffered responses are compressed in one go once they reach
+# COMPRESS_MIN_SIZE. Streamed responses (pages from stream_page, exports)
+# cannot be measured up front, so they are always compressed, chunk by
+# chunk: every chunk is sync-flushed once COMPRESS_FLUSH_SIZE bytes have
+# gone in since the last flush, and the first chunk is flushed at once, so
+# compression does not hold back the first bytes of the page.
+#
+# Content types in COMPRESS_EXCLUDED_TYPES (prefix match) are already
+# compressed and are left alone, as are file responses, which are sent
+# with direct passthrough.
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+def _accepts_gzip():
+    return request.accept_encodings.quality('gzip') > 0
+
+def _should_compress(response):
+    if not Config.COMPRESS_RESPONSES or request.method == 'HEAD':
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return False
+    if response.cache_control.no_transform:
+        return False
+    mimetype = response.mimetype or ''
+    if any(mimetype.startswith(prefix) for prefix in Config.COMPRESS_EXCLUDED_TYPES):
+        return False
+    return True
+
+def _gzip_chunks(chunks, level, flush_size):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    pending = None
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        out = compressor.compress(chunk)
+        if pending is None or pending + len(chunk) >= flush_size:
+            out += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        else:
+            pending += len(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+def _mark_encoded(response):
+    response.headers['Content-Encoding'] = 'gzip'
+    # The gzip body differs from the identity body, so a strong validator
+    # no longer identifies it byte for byte
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+def compress_response(response):
+    """gzip ``response`` in place when the client accepts it and it qualifies."""
+    if not _should_compress(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not _accepts_gzip():
+        return response
+
+    if response.is_streamed:
+        response.response = _gzip_chunks(response.response, Config.COMPRESS_LEVEL, Config.COMPRESS_FLUSH_SIZE)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < Config.COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(zlib.compress(data, Config.COMPRESS_LEVEL, GZIP_WBITS))
+    _mark_encoded(response)
+    return response
+
+def init_compression(app):
+    """Compress every qualifying response the app returns."""
+    app.after_request(compress_response)
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, make_response, request, session
+from flask_wtf.csrf import generate_csrf
+from models.versions import get_versions
+
+# HTTP caching helpers.
+#
+# conditional() gives a page an ETag and Last-Modified derived from the data
+# versions it renders (see models/versions.py) and answers a matching
+# If-None-Match / If-Modified-Since with 304 before the view runs, so an
+# unchanged page costs one primary-key lookup instead of the page's queries
+# and template render.
+
+def _validators(versions):
+    # The page embeds a CSRF token that expires after WTF_CSRF_TIME_LIMIT, so
+    # the ETag also rolls over every half limit to keep served tokens valid.
+    # generate_csrf creates the session's token now if the render would.
+    generate_csrf()
+    time_limit = current_app.config.get('WTF_CSRF_TIME_LIMIT') or 0
+    token_window = int(time.time() // (time_limit / 2)) if time_limit else 0
+    parts = [repr(sorted(versions.items())), str(session.get('user_id')),
+             str(session.get('csrf_token')), str(token_window)]
+    etag = hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+    updated = max((updated_at for _, updated_at in versions.values()), default=0)
+    last_modified = datetime.fromtimestamp(int(updated), timezone.utc) if updated else None
+    return etag, last_modified
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        # Weak comparison: compressed responses carry a weak ETag
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+def conditional(scopes_for):
+    """Serve 304 Not Modified while the page's data versions are unchanged.
+
+    ``scopes_for`` receives the view's keyword arguments and returns the
+    version scopes the page renders. Views can opt a response out (e.g. a
+    partial page after a failed source) by setting ``Cache-Control: no-store``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Flashed messages are shown once, so those pages are always rendered
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+            etag, last_modified = _validators(get_versions(scopes_for(**kwargs)))
+            if _not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.cache_control.no_store:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+def init_static_caching(app, max_age):
+    """Serve static files with a long max-age and version their URLs by mtime."""
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = max_age
+
+    @app.url_defaults
+    def _static_version(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values and app.static_folder:
+            try:
+                values['v'] = int(os.stat(os.path.join(app.static_folder, values['filename'])).st_mtime)
+            except OSError:
+                pass
@@ -0,0 +1,84 @@
+import threading
+import time
+from flask import g, has_app_context
+from config import Config
+from models.user import User
+
+# Identity lookups shared by the context processor, decorators and routes
+
+class TTLCache:
+    """Small thread-safe cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                # Evict the oldest entry (dicts keep insertion order)
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_user_cache = TTLCache(Config.IDENTITY_CACHE_TTL, Config.IDENTITY_CACHE_SIZE)
+
+def load_user(user_id):
+    """Return the User for ``user_id``, querying SQLite at most once per request.
+
+    Inside a request the result is kept on ``flask.g``; across requests the
+    optional process cache (``IDENTITY_CACHE_TTL``) can serve it without a query.
+    """
+    if user_id is None:
+        return None
+    request_cache = g.setdefault('_identity', {}) if has_app_context() else None
+    if request_cache is not None and user_id in request_cache:
+        return request_cache[user_id]
+
+    user = _user_cache.get(user_id)
+    if user is None:
+        user = User.get_user_by_id(user_id)
+        if user is not None:
+            _user_cache.set(user_id, user)
+
+    if request_cache is not None:
+        request_cache[user_id] = user
+    return user
+
+def invalidate_user(user_id=None):
+    """Drop a cached user (or every user) after the users table changes."""
+    if user_id is None:
+        _user_cache.clear()
+    else:
+        _user_cache.invalidate(user_id)
+    if has_app_context():
+        request_cache = g.get('_identity')
+        if request_cache is not None:
+            if user_id is None:
+                request_cache.clear()
+            else:
+                request_cache.pop(user_id, None)
\ No newline at end of file
@@ -0,0 +1,154 @@
+import bisect
+import threading
+import time
+
+# In-process metrics exposed in Prometheus text format at /metrics.
+#
+# Counts are per process; when running several workers each one reports
+# its own series.
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def samples(self):
+        with self._lock:
+            return {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labelvalues, (bucket_counts, count, total) in sorted(self.samples().items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, bucket_counts):
+                cumulative += n
+                labels = _format_labels(self.labelnames, labelvalues, [f'le="{bound}"'])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, labelvalues, ['le="+Inf"'])
+            lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+class Gauge:
+    """A value read from a callback at scrape time."""
+
+    def __init__(self, name, documentation, read, kind='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.kind = kind
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}',
+                f'{self.name} {value}']
+
+REGISTRY = []
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+# Shared metrics
+
+REQUEST_DURATION = register(Histogram(
+    'http_request_duration_seconds', 'Time spent handling a request, by route.',
+    ('method', 'route', 'status')))
+
+DATA_SOURCE_DURATION = register(Histogram(
+    'data_source_duration_seconds', 'Time spent in SQLite statements and MongoDB commands.',
+    ('source', 'operation')))
+
+TEMPLATE_RENDER_DURATION = register(Histogram(
+    'template_render_duration_seconds', 'Time spent rendering Jinja templates.',
+    ('template',)))
+
+def observe_sql(sql, seconds):
+    operation = sql.lstrip().split(None, 1)[0].upper() if sql and sql.strip() else 'OTHER'
+    DATA_SOURCE_DURATION.observe(seconds, 'sqlite', operation)
+
+def observe_mongo(command, seconds):
+    DATA_SOURCE_DURATION.observe(seconds, 'mongo', command)
+
+# Flask integration
+
+_render_state = threading.local()
+
+def instrument_app(app):
+    """Time every request and template render, and expose pool gauges."""
+    from flask import g, request, before_render_template, template_rendered
+    from models.db import pool_stats
+    from models.mongo.connection import mongo_pool_stats
+
+    @app.before_request
+    def _start_request_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request_timing(response):
+        started = g.pop('_request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_DURATION.observe(time.perf_counter() - started,
+                                     request.method, route, str(response.status_code))
+        return response
+
+    def _template_started(sender, template, context, **extra):
+        stack = getattr(_render_state, 'stack', None)
+        if stack is None:
+            stack = _render_state.stack = []
+        stack.append(time.perf_counter())
+
+    def _template_finished(sender, template, context, **extra):
+        stack = getattr(_render_state, 'stack', None)
+        if stack:
+            TEMPLATE_RENDER_DURATION.observe(time.perf_counter() - stack.pop(), template.name or 'string')
+
+    before_render_template.connect(_template_started, app, weak=False)
+    template_rendered.connect(_template_finished, app, weak=False)
+
+    if not getattr(instrument_app, '_gauges_registered', False):
+        instrument_app._gauges_registered = True
+        register(Gauge('sqlite_pool_checkouts_total', 'Connections checked out of the SQLite pool.',
+                       lambda: pool_stats()['checkouts'], kind='counter'))
+        register(Gauge('sqlite_pool_wait_seconds_total', 'Time spent waiting for a SQLite connection.',
+                       lambda: pool_stats()['wait_seconds'], kind='counter'))
+        register(Gauge('sqlite_pool_open_connections', 'Open SQLite connections.',
+                       lambda: pool_stats()['open_connections']))
+        register(Gauge('mongo_pool_checkouts_total', 'Connections checked out of the MongoDB pool.',
+                       lambda: mongo_pool_stats()['checkouts'], kind='counter'))
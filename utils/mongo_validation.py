@@ -1,57 +1,48 @@
-from datetime import datetime
+from utils.schema import Schema, Field, required, one_of, number, parse_date
+
+SEVERITIES = ('Mild', 'Moderate', 'Severe')
+WORK_TYPES = ('Children', 'Govt_job', 'Never_worked', 'Private', 'Self-employed')
+SMOKING_STATUSES = ('Formerly smoked', 'Never smoked', 'Smokes', 'Unknown')
+
+ALLERGY_SCHEMA = Schema(
+    Field('allergen', required('Allergen is required')),
+    Field('severity', one_of(SEVERITIES, 'Invalid severity selection')),
+    Field('date_added', required('Date added is required'), parse_date('%Y-%m-%d', 'Invalid date format')),
+)
+
+ASSESSMENT_SCHEMA = Schema(
+    Field('hypertension', one_of(('0', '1'), 'Hypertension must be 0 or 1')),
+    Field('heart_disease', one_of(('0', '1'), 'Heart disease must be 0 or 1')),
+    Field('ever_married', one_of(('No', 'Yes'), 'Ever married must be No or Yes')),
+    Field('work_type', one_of(WORK_TYPES, 'Invalid work type')),
+    Field('residence_type', one_of(('Rural', 'Urban'), 'Residence type must be Rural or Urban')),
+    Field('avg_glucose_level', number(0, 300, 'Invalid glucose level',
+                                      'Average glucose level must be between 0 and 300')),
+    Field('bmi', number(10, 100, 'Invalid BMI', 'BMI must be between 10 and 100')),
+    Field('smoking_status', one_of(SMOKING_STATUSES, 'Invalid smoking status')),
+    Field('stroke', one_of(('0', '1'), 'Stroke must be 0 or 1')),
+)
+
+# Imported datasets may leave BMI blank (unknown)
+IMPORT_ASSESSMENT_SCHEMA = ASSESSMENT_SCHEMA.extend(
+    Field('bmi', number(10, 100, 'Invalid BMI', 'BMI must be between 10 and 100'), optional=True),
+)
 
 def validate_allergy(allergen, severity, date_added):
-    if not allergen or not allergen.strip():
-        raise ValueError('Allergen is required')
-    
-    valid_severities = ['Mild', 'Moderate', 'Severe']
-    if not severity or severity not in valid_severities:
-        raise ValueError('Invalid severity selection')
-    
-    if not date_added:
-        raise ValueError('Date added is required')
-    
-    try:
-        datetime.strptime(date_added, '%Y-%m-%d')
-    except ValueError:
-        raise ValueError('Invalid date format')
-    
+    ALLERGY_SCHEMA.validate({'allergen': allergen, 'severity': severity, 'date_added': date_added})
     return True
 
-def validate_assessment(hypertension, ever_married, work_type, residence_type, 
-                       avg_glucose_level, bmi, smoking_status, stroke):
-    if hypertension not in ['0', '1']:
-        raise ValueError('Hypertension must be 0 or 1')
-    
-    if ever_married not in ['No', 'Yes']:
-        raise ValueError('Ever married must be No or Yes')
-    
-    valid_work_types = ['Children', 'Govt_job', 'Never_worked', 'Private', 'Self-employed']
-    if work_type not in valid_work_types:
-        raise ValueError('Invalid work type')
-    
-    if residence_type not in ['Rural', 'Urban']:
-        raise ValueError('Residence type must be Rural or Urban')
-    
-    try:
-        glucose = float(avg_glucose_level)
-        if glucose < 0 or glucose > 300:
-            raise ValueError('Average glucose level must be between 0 and 300')
-    except ValueError:
-        raise ValueError('Invalid glucose level')
-    
-    try:
-        bmi_val = float(bmi)
-        if bmi_val < 10 or bmi_val > 100:
-            raise ValueError('BMI must be between 10 and 100')
-    except ValueError:
-        raise ValueError('Invalid BMI')
-    
-    valid_smoking = ['Formerly smoked', 'Never smoked', 'Smokes', 'Unknown']
-    if smoking_status not in valid_smoking:
-        raise ValueError('Invalid smoking status')
-    
-    if stroke not in ['0', '1']:
-        raise ValueError('Stroke must be 0 or 1')
-    
+def validate_assessment(hypertension, heart_disease, ever_married, work_type, residence_type,
+                        avg_glucose_level, bmi, smoking_status, stroke):
+    ASSESSMENT_SCHEMA.validate({
+        'hypertension': hypertension,
+        'heart_disease': heart_disease,
+        'ever_married': ever_married,
+        'work_type': work_type,
+        'residence_type': residence_type,
+        'avg_glucose_level': avg_glucose_level,
+        'bmi': bmi,
+        'smoking_status': smoking_status,
+        'stroke': stroke,
+    })
     return True
\ No newline at end of file
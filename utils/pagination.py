@@ -0,0 +1,20 @@
+import base64
+import json
+
+# Opaque keyset cursors for paginated listings
+
+def encode_cursor(values):
+    """Encode the sort key of a boundary row as a URL-safe token."""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token, length):
+    """Decode a cursor token back into its sort key values."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid page cursor')
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError('Invalid page cursor')
+    return values
\ No newline at end of file
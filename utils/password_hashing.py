@@ -0,0 +1,103 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
+from utils.metrics import Gauge, register
+
+# Password hashing runs on a small dedicated pool instead of the request
+# thread. scrypt is deliberately slow and memory hungry; capping how many
+# run at once (HASH_WORKERS) and how many may wait (HASH_MAX_QUEUE) keeps a
+# burst of logins from tying up every worker. Requests beyond the queue
+# limit fail fast with HashingBusy rather than piling up, and so do those
+# that wait longer than HASH_TIMEOUT for their result.
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full or a hash times out."""
+
+class HashingPool:
+    def __init__(self, workers, max_queue, timeout, method=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        # One throwaway hash tells us the parameters new hashes get; it runs
+        # here once, and every caller waits on the same future
+        self._prefix = self._executor.submit(generate_password_hash, '', method) if method else None
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def run(self, fn, *args):
+        """Run ``fn(*args)`` on the pool and wait for the result."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy('Too many sign-in attempts in progress, please try again shortly')
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # The hash keeps its slot until it finishes
+            raise HashingBusy('Sign-in is taking longer than usual, please try again shortly') from None
+
+    def hash_prefix(self):
+        """Method and parameters of the hashes this pool creates."""
+        try:
+            return _hash_prefix(self._prefix.result(timeout=self.timeout))
+        except FutureTimeout:
+            raise HashingBusy('Sign-in is taking longer than usual, please try again shortly') from None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_hashing_pool():
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = HashingPool(Config.HASH_WORKERS, Config.HASH_MAX_QUEUE, Config.HASH_TIMEOUT,
+                                    method=Config.PASSWORD_HASH_METHOD)
+                _pool_pid = pid
+    return _pool
+
+def _hash_prefix(password_hash):
+    # Werkzeug hashes look like "scrypt:32768:8:1$salt$digest"
+    return password_hash.split('$', 1)[0]
+
+def current_hash_prefix():
+    """Method and parameters new hashes are created with."""
+    return get_hashing_pool().hash_prefix()
+
+def hash_password(password):
+    return get_hashing_pool().run(generate_password_hash, password, Config.PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    return get_hashing_pool().run(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    """True when a stored hash was made with different method or parameters."""
+    return _hash_prefix(password_hash) != current_hash_prefix()
+
+register(Gauge('password_hash_in_flight', 'Password hashes running or queued.',
+               lambda: _pool.in_flight if _pool else 0))
+register(Gauge('password_hash_rejected_total', 'Password hashes rejected because the queue was full.',
+               lambda: _pool.rejected if _pool else 0, kind='counter'))
\ No newline at end of file
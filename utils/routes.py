@@ -0,0 +1,37 @@
+# Views declared at import time, registered on the app create_app() builds.
+#
+# RouteTable mirrors the app.route / errorhandler / context_processor
+# decorators, so app.py reads as before, but no Flask app has to exist
+# while it is imported. Unlike a Blueprint it keeps endpoint names as they
+# are ('login', not 'views.login').
+
+class RouteTable:
+    def __init__(self):
+        self._routes = []
+        self._error_handlers = []
+        self._context_processors = []
+
+    def route(self, rule, **options):
+        def decorator(view):
+            self._routes.append((rule, options, view))
+            return view
+        return decorator
+
+    def errorhandler(self, code):
+        def decorator(handler):
+            self._error_handlers.append((code, handler))
+            return handler
+        return decorator
+
+    def context_processor(self, fn):
+        self._context_processors.append(fn)
+        return fn
+
+    def init_app(self, app):
+        for rule, options, view in self._routes:
+            options = dict(options)
+            app.add_url_rule(rule, options.pop('endpoint', None), view, **options)
+        for code, handler in self._error_handlers:
+            app.register_error_handler(code, handler)
+        for fn in self._context_processors:
+            app.context_processor(fn)
@@ -0,0 +1,129 @@
+import re
+from datetime import datetime, date
+
+# Declarative validation schemas.
+#
+# A Schema is an ordered list of Fields and each Field a chain of rules.
+# Rules do their set-up once (choice sets, compiled patterns, bounds) and
+# return a check that takes a value and returns it, possibly converted
+# ("27.1" -> 27.1), or raises ValueError with the message shown to users.
+#
+# Schema.validate checks one record and raises the first error, in field
+# order. Schema.validate_many checks a batch column by column and returns
+# the list of error messages for every row (empty when the row is valid).
+
+# Rules
+
+def required(message):
+    def check(value):
+        if value is None or not str(value).strip():
+            raise ValueError(message)
+        return value
+    return check
+
+def one_of(choices, message):
+    allowed = frozenset(choices)
+    def check(value):
+        if value not in allowed:
+            raise ValueError(message)
+        return value
+    return check
+
+def pattern(regex, message):
+    match = re.compile(regex).match
+    def check(value):
+        if not isinstance(value, str) or not match(value):
+            raise ValueError(message)
+        return value
+    return check
+
+def number(minimum, maximum, invalid_message, range_message):
+    def check(value):
+        try:
+            parsed = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(invalid_message) from None
+        if not minimum <= parsed <= maximum:
+            raise ValueError(range_message)
+        return parsed
+    return check
+
+def parse_date(fmt, message):
+    def check(value):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except (TypeError, ValueError):
+            raise ValueError(message) from None
+    return check
+
+def age_at_most(maximum, future_message, range_message):
+    """Check a parsed date of birth: not in the future and at most ``maximum`` years ago."""
+    def check(dob):
+        today = date.today()
+        age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+        if age < 0:
+            raise ValueError(future_message)
+        if age > maximum:
+            raise ValueError(range_message)
+        return dob
+    return check
+
+# Schemas
+
+class Field:
+    def __init__(self, name, *rules, optional=False):
+        self.name = name
+        self.rules = rules
+        # Optional fields are skipped when the value is missing (None)
+        self.optional = optional
+
+    def compile(self):
+        rules = self.rules
+        if len(rules) == 1:
+            return rules[0]
+        def check(value):
+            for rule in rules:
+                value = rule(value)
+            return value
+        return check
+
+class Schema:
+    def __init__(self, *fields):
+        self.fields = fields
+        self._checks = [(f.name, f.compile(), f.optional) for f in fields]
+
+    def field(self, name):
+        return next(f for f in self.fields if f.name == name)
+
+    def extend(self, *fields):
+        """Return a copy with ``fields`` replacing same-named fields or appended."""
+        overrides = {f.name: f for f in fields}
+        merged = [overrides.pop(f.name, f) for f in self.fields]
+        return Schema(*merged, *overrides.values())
+
+    def validate(self, record):
+        """Return the converted values of a valid record; raise ValueError otherwise."""
+        cleaned = {}
+        for name, check, optional in self._checks:
+            value = record.get(name)
+            if value is None and optional:
+                continue
+            cleaned[name] = check(value)
+        return cleaned
+
+    def validate_many(self, records):
+        """Return a list of error messages for each record."""
+        records = list(records)
+        errors = [[] for _ in records]
+        for name, check, optional in self._checks:
+            for row_errors, record in zip(errors, records):
+                value = record.get(name)
+                if value is None and optional:
+                    continue
+                try:
+                    check(value)
+                except ValueError as e:
+                    message = str(e)
+                    if message not in row_errors:
+                        row_errors.append(message)
+        return errors
@@ -0,0 +1,36 @@
+from flask import Response, get_flashed_messages, render_template, stream_template
+from flask_wtf.csrf import generate_csrf
+from config import Config
+
+# Streamed page rendering.
+#
+# stream_page() sends a template as it renders instead of building the whole
+# page first, so the head and sidebar reach the browser while the table rows
+# are still being rendered. Jinja yields many tiny strings; they are joined
+# into STREAM_CHUNK_SIZE pieces so each write (and each gzip flush) carries
+# a useful amount of markup.
+#
+# The session cookie is written with the response headers, before the body
+# is generated, so anything the template would store in the session has to
+# happen up front: the CSRF token is created and flashed messages are popped
+# (Flask keeps them on the request for the template to read).
+
+def _coalesce(chunks, size):
+    buffer, buffered = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def stream_page(template_name, **context):
+    """Render ``template_name`` as a streamed response (or in one piece if disabled)."""
+    if not Config.STREAM_TEMPLATES:
+        return Response(render_template(template_name, **context), mimetype='text/html')
+    generate_csrf()
+    get_flashed_messages()
+    chunks = _coalesce(stream_template(template_name, **context), Config.STREAM_CHUNK_SIZE)
+    return Response(chunks, mimetype='text/html')